@@ -1,7 +1,10 @@
 # backend.py
 from pathlib import Path
-from core import db, image_utils, card_index
+from core import db, image_utils, card_index, scryfall_cache
 from core import collection_sql as csql
+from core.precon_catalog import PreconCatalog
+from core.user_databases import UserDatabaseManager
+from concurrent.futures import ThreadPoolExecutor
 import json
 import urllib.parse
 import urllib.request
@@ -11,22 +14,74 @@ import time
 import os
 import httpx
 
+# Seconds a collection change may wait before cards_db.json is rewritten
+CARD_NAMES_FLUSH_DELAY = 2.0
+# How often change logs are trimmed, and what each trim keeps
+CHANGE_LOG_COMPACT_INTERVAL = 3600.0
+CHANGE_LOG_MAX_AGE = 7 * 24 * 3600.0
+# Scryfall's /cards/collection accepts at most 75 identifiers per request; a couple of
+# requests in flight stays within its rate limits
+SCRYFALL_COLLECTION_BATCH = 75
+SCRYFALL_FETCH_WORKERS = 2
+
+
+def _flag(value) -> bool:
+    """Boolean API argument; GET query strings arrive as text ('1', 'true', 'false', ...)."""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
 class Api:
+    # Read methods whose result depends only on their arguments and these data sources.
+    # version_token() combines the sources' versions so the web layer can answer with ETags.
+    VERSIONED_READS = {
+        'get_card_names': ('collection',),
+        'get_collection_count': ('collection',),
+        'get_collection_items': ('collection',),
+        'get_collection_summary': ('collection',),
+        'list_collection': ('collection',),
+        'search_collection': ('collection',),
+        'list_decks': ('collection',),
+        'list_deck_headers': ('collection',),
+        'get_deck': ('collection',),
+        'get_user_collection_count': ('user',),
+        'get_user_collection_items': ('user',),
+        'list_user_collection': ('user',),
+        'search_user_collection': ('user',),
+        'get_user_decks': ('user',),
+        'list_precon_decks': ('decklist',),
+        'search_decklist_db': ('decklist',),
+        'get_decklist_deck_cards': ('decklist',),
+        'find_precons_with_card': ('decklist',),
+    }
+
     def __init__(self):
         # Store as plain strings and keep them private so pywebview doesn't introspect internals
         self._db_path = 'cards_db.json'
+        # cards_db.json is kept for compatibility and rewritten by a debounced background flush
+        self._card_names_lock = threading.Lock()
+        self._card_names_timer = None
         self._image_dir = 'assets/Card Images'
         self._allprintings_sql = 'assets/AllPrintings.sql'
         # External images directory requested by user
         self._external_images_dir = 'G:/PyWeb/Images'
         # Structured collection database (SQLite)
         self._collection_db_path = 'collection.db'
+        # Shared card metadata for all per-user collections (attached read-only)
+        self._catalog_db_path = 'card_catalog.db'
+        # Per-user collection databases (users/user_<id>_collection.db), provisioned lazily
+        self._user_dbs = UserDatabaseManager('users', catalog_path=self._catalog_db_path)
         # Deck persistence (simple JSON)
         self._decks_db_path = 'decks_db.json'
         # External decklist database (from convert.py)
         self._decklist_db_path = 'decklist_cards.db'
+        # Cached deck list, card counts and name search over decklist_cards.db
+        self._precons = PreconCatalog(self._decklist_db_path)
         # Local index built from AllPrintings.sql for fast, structured lookups
         self._index_db_path = 'assets/allprintings_index.sqlite'
+        # Scryfall card objects already fetched, by Scryfall id
+        self._scryfall_cache_path = 'scryfall_cache.db'
         # Preconstructed decks directory
         self._precon_dir = 'assets/AllDeckFiles'
         # Build state
@@ -35,6 +90,7 @@ class Api:
         self._build_cancel = False
         self._build_inserted = 0
         self._build_running = False
+        self._build_stats = card_index.BuildStats()
         # App state file
         self._app_state_path = 'app_state.json'
         # Repair (Scryfall enrichment) progress state
@@ -49,6 +105,7 @@ class Api:
         self._import_running = False
         self._import_current = 0
         self._import_total = 0
+        self._import_inserted = 0
         # PreCon deck import progress state
         self._precon_lock = threading.Lock()
         self._precon_running = False
@@ -60,18 +117,29 @@ class Api:
         
         # Multi-user support: current user ID (set by main.py from session)
         self._current_user_id = 1  # Default to user 1 for backward compatibility
+
+        # Periodically trim the change feed (get_changes) so the log stays bounded
+        self._schedule_change_log_compaction()
         
 
     def get_card_names(self):
-        return db.load_cards_db(Path(self._db_path))
+        """Distinct names in the collection, served from the trigger-maintained summary table."""
+        try:
+            return csql.card_names(Path(self._collection_db_path))
+        except Exception:
+            return db.load_cards_db(Path(self._db_path))
 
     def add_card(self, name):
-        cards = db.load_cards_db(Path(self._db_path))
-        if name not in cards:
-            cards.append(name)
-            db.save_cards_db(Path(self._db_path), cards)
-            return True
-        return False
+        """Add a card by name to the collection, which get_card_names and cards_db.json are built from.
+        Returns False if a card of that name is already held.
+        """
+        try:
+            added = csql.add_name(Path(self._collection_db_path), name, source='manual')
+        except Exception:
+            return False
+        if added:
+            self._sync_card_names_from_collection()
+        return added
 
     def import_images(self, paths):
         return [str(p) for p in image_utils.import_images_to_folder(paths, Path(self._image_dir))]
@@ -107,6 +175,108 @@ class Api:
                     return { 'data': [] }
             raise
 
+    def _http_post_json(self, url: str, payload: dict):
+        req = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), method='POST', headers={
+            'User-Agent': 'PyWeb-Client/1.0 (+https://scryfall.com/docs/api)',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+        })
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}")
+            return json.loads(resp.read().decode('utf-8', errors='ignore'))
+
+    def _fetch_scryfall_collection(self, identifiers: list[dict]) -> list[dict]:
+        """Card objects for Scryfall identifiers ({'id': ...}), SCRYFALL_COLLECTION_BATCH per
+        /cards/collection request, with up to SCRYFALL_FETCH_WORKERS requests in flight.
+        A failed batch raises; identifiers Scryfall does not know are simply missing from the result.
+        """
+        batches = [identifiers[i:i + SCRYFALL_COLLECTION_BATCH] for i in range(0, len(identifiers), SCRYFALL_COLLECTION_BATCH)]
+        if not batches:
+            return []
+
+        def fetch(batch):
+            data = self._http_post_json('https://api.scryfall.com/cards/collection', { 'identifiers': batch })
+            found = data.get('data') if isinstance(data, dict) else None
+            return [c for c in (found or []) if isinstance(c, dict) and c.get('object') == 'card']
+
+        with ThreadPoolExecutor(max_workers=min(SCRYFALL_FETCH_WORKERS, len(batches))) as pool:
+            return [c for cards in pool.map(fetch, batches) for c in cards]
+
+    def _resolve_decklist_cards(self, rows, errors: list[str]) -> list[dict]:
+        """Card data for decklist_cards.db rows, in row order, resolved from local sources first:
+        the Scryfall response cache by id, then the AllPrintings index by set and collector
+        number. Only the remaining ids go to Scryfall, in batched /cards/collection requests,
+        and the answers are cached. Rows nothing resolves keep their decklist name and set.
+        Updates the precon import progress as rows are resolved.
+        """
+        cache_path = Path(self._scryfall_cache_path)
+        ids = [str(r['scryfall_id'] or '').strip().lower() for r in rows]
+        resolved: list[dict | None] = [None] * len(rows)
+
+        def settle():
+            with self._precon_lock:
+                self._precon_current = sum(1 for x in resolved if x is not None)
+
+        try:
+            cached = scryfall_cache.get_many(cache_path, ids)
+        except Exception:
+            cached = {}
+        for i, sid in enumerate(ids):
+            if sid in cached:
+                resolved[i] = self._map_scryfall_card(cached[sid])
+        settle()
+
+        # The index has no image URLs: Scryfall serves a printing's image by id, so link that
+        pending = [i for i, x in enumerate(resolved) if x is None]
+        if pending and Path(self._index_db_path).exists():
+            try:
+                idx_conn = card_index.open_db(Path(self._index_db_path))
+                try:
+                    hits = card_index.lookup_by_set_number(idx_conn, [(rows[i]['set_code'], rows[i]['collector_number']) for i in pending])
+                finally:
+                    idx_conn.close()
+            except Exception:
+                hits = {}
+            for i in pending:
+                hit = hits.get((str(rows[i]['set_code'] or '').lower(), str(rows[i]['collector_number'] or '')))
+                # Guard against renumbered printings: the index row must be the same card
+                if hit and str(hit.get('name') or '').lower() == str(rows[i]['name'] or '').strip().lower():
+                    image_url = f"https://api.scryfall.com/cards/{urllib.parse.quote(ids[i])}?format=image" if ids[i] else ''
+                    # Lower-case set codes, as Scryfall-resolved rows store them
+                    resolved[i] = db.normalize_item(dict(hit, set=str(hit.get('set') or '').lower(), image_url=image_url))
+            settle()
+
+        pending = [i for i, x in enumerate(resolved) if x is None]
+        misses = list(dict.fromkeys(ids[i] for i in pending if ids[i]))
+        if misses:
+            try:
+                fetched = self._fetch_scryfall_collection([{ 'id': sid } for sid in misses])
+            except Exception as e:
+                fetched = None
+                errors.append(f"Scryfall lookup failed for {len(misses)} cards: {e}")
+            if fetched is not None:
+                try:
+                    scryfall_cache.put_many(cache_path, fetched)
+                except Exception:
+                    pass
+                by_id = {str(c.get('id') or '').lower(): c for c in fetched}
+                for i in pending:
+                    if ids[i] in by_id:
+                        resolved[i] = self._map_scryfall_card(by_id[ids[i]])
+                    elif ids[i]:
+                        errors.append(f"{rows[i]['name']} ({ids[i]}): not found on Scryfall")
+
+        for i, r in enumerate(rows):
+            if resolved[i] is None:
+                name = str(r['name'] or '').strip()
+                resolved[i] = db.normalize_item({
+                    'name': name, 'set': str(r['set_code'] or '').lower(), 'number': str(r['collector_number'] or ''),
+                    'types': (str(r['type_line'] or '')).split(' — ')[0].split(),
+                })
+        settle()
+        return resolved
+
     def _map_scryfall_card(self, c: dict) -> dict:
         # Prefer normal image_uris; fallback to first face
         img = ''
@@ -308,52 +478,36 @@ class Api:
     def search_decklist_db(self, query: str | None = None):
         """Search decks in decklist_cards.db by fuzzy name contains across words.
         Returns a list of { deck_id, deck_name, deck_type, card_count }.
+        Served from the cached precon catalog, which reloads when the file changes.
         """
-        import sqlite3
-        q = (query or '').strip().lower()
-        words = [w for w in q.split() if w]
-        p = Path(self._decklist_db_path)
-        if not p.exists():
-            return []
         try:
-            conn = sqlite3.connect(str(p))
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
-            cur.execute("SELECT deck_id, deck_name, deck_type FROM decks")
-            decks = cur.fetchall()
-            out = []
-            for d in decks:
-                name = str(d['deck_name'] or '')
-                target = (name + ' ' + str(d['deck_type'] or '')).lower()
-                if words and not all(w in target for w in words):
-                    continue
-                try:
-                    row = conn.execute("SELECT SUM(COALESCE(quantity,1)) FROM cards WHERE deck_id=?", (d['deck_id'],)).fetchone()
-                    cnt = int(row[0] or 0)
-                except Exception:
-                    cnt = 0
-                out.append({
-                    'deck_id': d['deck_id'],
-                    'deck_name': name,
-                    'deck_type': d['deck_type'] or '',
-                    'card_count': cnt,
-                })
-            conn.close()
-            out.sort(key=lambda x: x['deck_name'])
-            return out
+            return self._precons.search(query)
         except Exception:
             return []
 
+    def find_precons_with_card(self, name: str | list[str]):
+        """Which precons contain a card. Accepts one name (returns a list) or a list of names
+        (returns { name: list }); each entry is { deck_id, deck_name, deck_type, quantity }.
+        """
+        names = [name] if isinstance(name, str) else list(name or [])
+        try:
+            found = self._precons.find_card(names)
+        except Exception:
+            found = {str(n): [] for n in names}
+        return found.get(name, []) if isinstance(name, str) else found
+
     def import_deck_from_db(self, deck_id: str):
         """Import a deck from decklist.db by deck_id into collection.db and create a deck with the same name.
-        Fetches card data from Scryfall using scryfall_id for accurate metadata.
+        Card data comes from the local Scryfall cache and card index where possible; only the
+        rest is fetched from Scryfall, in batches. Cards and deck are written in one transaction.
         Returns { added, total, errors, deck_name }.
         """
-        import sqlite3, time
+        import sqlite3
         p = Path(self._decklist_db_path)
         if not p.exists():
             return { 'added': 0, 'total': self.get_collection_count(), 'errors': [f'decklist.db not found'] }
         deck_name = ''
+        deck_type = ''
         try:
             conn = sqlite3.connect(str(p))
             conn.row_factory = sqlite3.Row
@@ -368,8 +522,8 @@ class Api:
             except Exception:
                 deck_name = ''
                 deck_type = ''
-            # Get card rows with scryfall_id and quantity
-            cur.execute("SELECT scryfall_id, name, COALESCE(quantity,1) AS quantity FROM cards WHERE deck_id=?", (deck_id,))
+            # Get card rows with their printing and quantity
+            cur.execute("SELECT scryfall_id, name, set_code, collector_number, type_line, COALESCE(quantity,1) AS quantity FROM cards WHERE deck_id=?", (deck_id,))
             rows = cur.fetchall()
             conn.close()
         except Exception as e:
@@ -389,11 +543,7 @@ class Api:
         errors: list[str] = []
         
         try:
-            for r in rows:
-                with self._precon_lock:
-                    self._precon_current += 1
-                
-                scryfall_id = str(r['scryfall_id'] or '').strip()
+            for r, enriched in zip(rows, self._resolve_decklist_cards(rows, errors)):
                 fallback_name = str(r['name'] or '').strip()
                 qty = 0
                 try:
@@ -402,23 +552,6 @@ class Api:
                     qty = 0
                 qty = max(1, qty)
                 
-                enriched = None
-                # Fetch from Scryfall using scryfall_id
-                if scryfall_id:
-                    try:
-                        url = f"https://api.scryfall.com/cards/{urllib.parse.quote(scryfall_id)}"
-                        data = self._http_get_json(url)
-                        if isinstance(data, dict) and data.get('object') == 'card':
-                            enriched = self._map_scryfall_card(data)
-                        time.sleep(0.12)
-                    except Exception as e:
-                        errors.append(f"{fallback_name} ({scryfall_id}): {e}")
-                        enriched = None
-                
-                # Fallback to basic card info if Scryfall fetch failed
-                if enriched is None:
-                    enriched = db.normalize_item({ 'name': fallback_name, 'scryfall_id': scryfall_id })
-                
                 enriched['source'] = f'decklist:{deck_name or "unknown"}'
                 
                 # Track colors for deck
@@ -429,9 +562,8 @@ class Api:
                 except Exception:
                     pass
                 
-                # Push repeated by quantity for collection inserts
-                for _ in range(qty):
-                    items.append(enriched)
+                # One holding per card; the quantity is added in a single upsert
+                items.append(dict(enriched, quantity=qty))
                 
                 # Count by normalized enriched name to match collection rows
                 ename = str(enriched.get('name') or fallback_name or '').strip()
@@ -439,7 +571,19 @@ class Api:
                 if ename:
                     counts_by_name[ename] = counts_by_name.get(ename, 0) + qty
             
-            inserted = csql.insert_items(Path(self._collection_db_path), items)
+            deck_items = [{ 'name': n, 'count': c } for n, c in counts_by_name.items() if n]
+            colors_sorted = [c for c in ['W','U','B','R','G','C'] if c in color_set]
+            db_path = Path(self._collection_db_path)
+
+            def apply(conn):
+                # Nested writes join this transaction: the cards and the deck commit together
+                added = csql.insert_stream(db_path, items, batch_size=len(items))
+                # Create or update a deck with the same name and place cards
+                if deck_name:
+                    csql.save_deck(db_path, deck_name, deck_items, deck_type=deck_type or None, deck_colors=colors_sorted)
+                return added
+
+            inserted = csql.write(db_path, apply)
         except Exception as e:
             with self._precon_lock:
                 self._precon_running = False
@@ -447,16 +591,6 @@ class Api:
         
         self._sync_card_names_from_collection()
         
-        # Create or update a deck with the same name and place cards
-        try:
-            if deck_name:
-                deck_items = [{ 'name': n, 'count': c } for n, c in counts_by_name.items() if n]
-                colors_sorted = [c for c in ['W','U','B','R','G','C'] if c in color_set]
-                csql.save_deck(Path(self._collection_db_path), deck_name, deck_items, deck_type=deck_type or None, deck_colors=colors_sorted)
-        except Exception:
-            # Do not fail import if deck save fails
-            pass
-        
         total = self.get_collection_count()
         
         # Clear progress tracking
@@ -469,7 +603,7 @@ class Api:
         """Import a deck from decklist.db with commander selection into collection.db.
         This is identical to import_deck_from_db but saves the commander field.
         """
-        import sqlite3, time
+        import sqlite3
         print(f"\n=== IMPORT DEBUG: import_deck_from_db_with_commander called ===")
         print(f"deck_id: {deck_id}")
         print(f"commander: {commander}")
@@ -478,6 +612,7 @@ class Api:
             print(f"ERROR: decklist.db not found at {p}")
             return { 'added': 0, 'total': self.get_collection_count(), 'errors': [f'decklist.db not found'] }
         deck_name = ''
+        deck_type = ''
         try:
             conn = sqlite3.connect(str(p))
             conn.row_factory = sqlite3.Row
@@ -492,8 +627,8 @@ class Api:
             except Exception:
                 deck_name = ''
                 deck_type = ''
-            # Get card rows with scryfall_id and quantity
-            cur.execute("SELECT scryfall_id, name, COALESCE(quantity,1) AS quantity FROM cards WHERE deck_id=?", (deck_id,))
+            # Get card rows with their printing and quantity
+            cur.execute("SELECT scryfall_id, name, set_code, collector_number, type_line, COALESCE(quantity,1) AS quantity FROM cards WHERE deck_id=?", (deck_id,))
             rows = cur.fetchall()
             conn.close()
         except Exception as e:
@@ -513,11 +648,7 @@ class Api:
         errors: list[str] = []
         
         try:
-            for r in rows:
-                with self._precon_lock:
-                    self._precon_current += 1
-                
-                scryfall_id = str(r['scryfall_id'] or '').strip()
+            for r, enriched in zip(rows, self._resolve_decklist_cards(rows, errors)):
                 fallback_name = str(r['name'] or '').strip()
                 qty = 0
                 try:
@@ -526,23 +657,6 @@ class Api:
                     qty = 0
                 qty = max(1, qty)
                 
-                enriched = None
-                # Fetch from Scryfall using scryfall_id
-                if scryfall_id:
-                    try:
-                        url = f"https://api.scryfall.com/cards/{urllib.parse.quote(scryfall_id)}"
-                        data = self._http_get_json(url)
-                        if isinstance(data, dict) and data.get('object') == 'card':
-                            enriched = self._map_scryfall_card(data)
-                        time.sleep(0.12)
-                    except Exception as e:
-                        errors.append(f"{fallback_name} ({scryfall_id}): {e}")
-                        enriched = None
-                
-                # Fallback to basic card info if Scryfall fetch failed
-                if enriched is None:
-                    enriched = db.normalize_item({ 'name': fallback_name, 'scryfall_id': scryfall_id })
-                
                 enriched['source'] = f'decklist:{deck_name or "unknown"}'
                 
                 # Track colors for deck
@@ -553,9 +667,8 @@ class Api:
                 except Exception:
                     pass
                 
-                # Push repeated by quantity for collection inserts
-                for _ in range(qty):
-                    items.append(enriched)
+                # One holding per card; the quantity is added in a single upsert
+                items.append(dict(enriched, quantity=qty))
                 
                 # Count by normalized enriched name to match collection rows
                 ename = str(enriched.get('name') or fallback_name or '').strip()
@@ -563,50 +676,52 @@ class Api:
                 if ename:
                     counts_by_name[ename] = counts_by_name.get(ename, 0) + qty
             
-            inserted = csql.insert_items(Path(self._collection_db_path), items)
+            deck_items = [{ 'name': n, 'count': c } for n, c in counts_by_name.items() if n]
+            
+            # Apply commander deck rules if importing to commander deck
+            is_commander = str(deck_type or '').lower() in ['commander', 'edh']
+            if is_commander:
+                # For commander decks, limit non-basic lands to 1 copy
+                corrected_items = []
+                basic_lands = {
+                    'plains', 'island', 'swamp', 'mountain', 'forest', 'wastes',
+                    'snow-covered plains', 'snow-covered island', 'snow-covered swamp', 
+                    'snow-covered mountain', 'snow-covered forest'
+                }
+                
+                for item in deck_items:
+                    name = str(item.get('name', '')).strip()
+                    count = int(item.get('count', 0))
+                    
+                    if name.lower() in basic_lands:
+                        # Basic lands: keep original count
+                        corrected_items.append(item)
+                    else:
+                        # Non-basic cards: limit to 1 copy
+                        corrected_items.append({ 'name': name, 'count': 1 })
+                
+                deck_items = corrected_items
+            
+            colors_sorted = [c for c in ['W','U','B','R','G','C'] if c in color_set]
+            db_path = Path(self._collection_db_path)
+
+            def apply(conn):
+                # Nested writes join this transaction: the cards and the deck commit together
+                added = csql.insert_stream(db_path, items, batch_size=len(items))
+                # Create or update a deck with the same name and place cards, including commander
+                if deck_name:
+                    csql.save_deck(db_path, deck_name, deck_items, deck_type=deck_type or None, deck_colors=colors_sorted, commander=commander or '')
+                return added
+
+            inserted = csql.write(db_path, apply)
         except Exception as e:
             with self._precon_lock:
                 self._precon_running = False
+            print(f"ERROR: precon import failed: {e}")
             return { 'added': 0, 'total': self.get_collection_count(), 'errors': [f'Insert failed: {e}'] }
         
         self._sync_card_names_from_collection()
         
-        # Create or update a deck with the same name and place cards, including commander
-        try:
-            if deck_name:
-                deck_items = [{ 'name': n, 'count': c } for n, c in counts_by_name.items() if n]
-                
-                # Apply commander deck rules if importing to commander deck
-                is_commander = str(deck_type or '').lower() in ['commander', 'edh']
-                if is_commander:
-                    # For commander decks, limit non-basic lands to 1 copy
-                    corrected_items = []
-                    basic_lands = {
-                        'plains', 'island', 'swamp', 'mountain', 'forest', 'wastes',
-                        'snow-covered plains', 'snow-covered island', 'snow-covered swamp', 
-                        'snow-covered mountain', 'snow-covered forest'
-                    }
-                    
-                    for item in deck_items:
-                        name = str(item.get('name', '')).strip()
-                        count = int(item.get('count', 0))
-                        
-                        if name.lower() in basic_lands:
-                            # Basic lands: keep original count
-                            corrected_items.append(item)
-                        else:
-                            # Non-basic cards: limit to 1 copy
-                            corrected_items.append({ 'name': name, 'count': 1 })
-                    
-                    deck_items = corrected_items
-                
-                colors_sorted = [c for c in ['W','U','B','R','G','C'] if c in color_set]
-                # Pass commander to save_deck function
-                csql.save_deck(Path(self._collection_db_path), deck_name, deck_items, deck_type=deck_type or None, deck_colors=colors_sorted, commander=commander or '')
-        except Exception as e:
-            # Log deck save errors for troubleshooting
-            print(f"Warning: Failed to save deck metadata: {e}")
-        
         total = self.get_collection_count()
         
         # Clear progress tracking
@@ -620,27 +735,12 @@ class Api:
     def update_deck_commander(self, deck_name: str, commander: str):
         """Update the commander for an existing deck"""
         try:
-            from pathlib import Path
-            from core import collection_sql as csql
-            import sqlite3
-            
             db_path = Path(self._collection_db_path)
-            csql.ensure_db(db_path)
             
-            with sqlite3.connect(str(db_path)) as conn:
-                # Check if deck exists
-                cur = conn.cursor()
-                cur.execute("SELECT id FROM decks WHERE name = ?", (deck_name,))
-                result = cur.fetchone()
-                
-                if not result:
-                    return {"ok": False, "error": "Deck not found"}
-                
-                # Update commander
-                conn.execute("UPDATE decks SET commander = ? WHERE name = ?", (commander or '', deck_name))
-                conn.commit()
-                
-                return {"ok": True, "message": f"Updated commander for '{deck_name}' to '{commander or 'none'}'"}
+            updated = csql.execute_write(db_path, "UPDATE decks SET commander = ? WHERE name = ?", (commander or '', deck_name))
+            if not updated:
+                return {"ok": False, "error": "Deck not found"}
+            return {"ok": True, "message": f"Updated commander for '{deck_name}' to '{commander or 'none'}'"}
         except Exception as e:
             return {"ok": False, "error": str(e)}
 
@@ -729,10 +829,10 @@ class Api:
             base_tag = Path(filename).name
             enriched['source'] = f'precon:{base_tag}'
             enriched = self._sanitize_import_item(enriched, source_tag=f'precon:{base_tag}')
-            # Insert count copies
-            recs = [enriched for _ in range(max(1, int(count)))]
+            # Insert count copies as one holding
+            enriched['quantity'] = max(1, int(count))
             try:
-                inserted = csql.insert_items(Path(self._collection_db_path), recs)
+                inserted = csql.insert_items(Path(self._collection_db_path), [enriched])
                 added += int(inserted)
             except Exception as e:
                 errors.append(f"Failed to insert {name}: {e}")
@@ -806,13 +906,13 @@ class Api:
             return { 'ok': False, 'added': 0, 'total': self.get_collection_count(), 'errors': [f'CSV not found: {csv_path}'] }
         added = 0
         errors: list[str] = []
-        items_batch: list[dict] = []
         
         # Count total rows first
         with self._import_lock:
             self._import_running = True
             self._import_current = 0
             self._import_total = 0
+            self._import_inserted = 0
         
         try:
             # First pass: count rows
@@ -825,41 +925,45 @@ class Api:
             
             print(f"[DEBUG] Total rows to process: {self._import_total}")
             
-            # Second pass: process rows
-            with p.open('r', encoding='utf-8', newline='') as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    if not row:
-                        continue
-                    scry_id = str(row[0] or '').strip()
-                    if not scry_id:
-                        continue
-                    
-                    with self._import_lock:
-                        self._import_current += 1
-                    
-                    print(f"[DEBUG] Processing row {self._import_current}/{self._import_total}: {scry_id}")
-                    
-                    try:
-                        url = f"https://api.scryfall.com/cards/{urllib.parse.quote(scry_id)}"
-                        data = self._http_get_json(url)
-                        if isinstance(data, dict) and data.get('object') == 'card':
-                            it = self._map_scryfall_card(data)
-                            it['source'] = 'csv-import'
-                            items_batch.append(it)
-                            print(f"[DEBUG] Added card to batch: {it.get('name', 'Unknown')}")
-                        else:
-                            print(f"[DEBUG] Invalid card data for {scry_id}")
-                        # polite throttle
-                        time.sleep(0.12)
-                    except Exception as e:
-                        print(f"[DEBUG] Error processing {scry_id}: {e}")
-                        errors.append(f"{scry_id}: {e}")
+            # Second pass: fetch each row and stream it into the DB in batches
+            def fetch_rows():
+                with p.open('r', encoding='utf-8', newline='') as f:
+                    reader = csv.reader(f)
+                    for row in reader:
+                        if not row:
+                            continue
+                        scry_id = str(row[0] or '').strip()
+                        if not scry_id:
+                            continue
+                        
+                        with self._import_lock:
+                            self._import_current += 1
+                        
+                        print(f"[DEBUG] Processing row {self._import_current}/{self._import_total}: {scry_id}")
+                        
+                        try:
+                            url = f"https://api.scryfall.com/cards/{urllib.parse.quote(scry_id)}"
+                            data = self._http_get_json(url)
+                            if isinstance(data, dict) and data.get('object') == 'card':
+                                it = self._map_scryfall_card(data)
+                                it['source'] = 'csv-import'
+                                print(f"[DEBUG] Added card to batch: {it.get('name', 'Unknown')}")
+                                yield it
+                            else:
+                                print(f"[DEBUG] Invalid card data for {scry_id}")
+                            # polite throttle
+                            time.sleep(0.12)
+                        except Exception as e:
+                            print(f"[DEBUG] Error processing {scry_id}: {e}")
+                            errors.append(f"{scry_id}: {e}")
+            
+            def on_inserted(n):
+                with self._import_lock:
+                    self._import_inserted = n
             
-            if items_batch:
-                print(f"[DEBUG] Attempting to insert {len(items_batch)} items into collection.db")
-                added = csql.insert_items(Path(self._collection_db_path), items_batch)
-                print(f"[DEBUG] insert_items returned: {added}")
+            added = csql.insert_stream(Path(self._collection_db_path), fetch_rows(), batch_size=50, progress_cb=on_inserted)
+            print(f"[DEBUG] insert_stream returned: {added}")
+            if added:
                 self._sync_card_names_from_collection()
             total = self.get_collection_count()
             print(f"[DEBUG] Import complete - added: {added}, total in collection: {total}")
@@ -987,9 +1091,10 @@ class Api:
             table_name_hint='card',
             max_rows=max_rows,
             progress_cb=on_progress,
-            cancel_cb=lambda: self._build_cancel
+            cancel_cb=lambda: self._build_cancel,
+            stats=self._build_stats
         )
-        return { 'inserted': inserted }
+        return { 'inserted': inserted, 'stats': self._build_stats.snapshot() }
 
     # --- Async build controls for UI progress/cancel ---
     def start_build_index(self, max_rows: int | None = None):
@@ -1010,7 +1115,8 @@ class Api:
                         table_name_hint='card',
                         max_rows=max_rows,
                         progress_cb=on_progress,
-                        cancel_cb=lambda: self._build_cancel
+                        cancel_cb=lambda: self._build_cancel,
+                        stats=self._build_stats
                     )
                 finally:
                     self._build_running = False
@@ -1020,12 +1126,26 @@ class Api:
             return { 'started': True }
 
     def get_build_progress(self):
+        """Return build state plus throughput, timing split and ETA from the live build stats."""
         with self._build_lock:
-            return {
+            out = self._build_stats.snapshot()
+            out.update({
                 'running': self._build_running,
                 'inserted': self._build_inserted,
                 'cancel': self._build_cancel
-            }
+            })
+            return out
+
+    def get_build_history(self, limit: int = 20):
+        """Return summaries of previous index builds recorded in the index DB, newest first."""
+        try:
+            conn = card_index.open_db(Path(self._index_db_path))
+            try:
+                return card_index.list_build_runs(conn, limit=limit)
+            finally:
+                conn.close()
+        except Exception:
+            return []
 
     def cancel_build(self):
         with self._build_lock:
@@ -1094,10 +1214,135 @@ class Api:
     def get_collection_count(self):
         return csql.count_items(Path(self._collection_db_path))
 
+    def check_collection_counters(self, repair: bool = False):
+        """Verify the trigger-maintained usage/total/summary counters; rebuild them when repair=True."""
+        return csql.check_counters(Path(self._collection_db_path), repair)
+
+    def get_writer_metrics(self):
+        """Queue depth, group-commit batch sizes and commit latency of the collection DB writer."""
+        return csql.writer_metrics(Path(self._collection_db_path))
+
+    @staticmethod
+    def _file_version(path: Path) -> str:
+        try:
+            st = Path(path).stat()
+        except OSError:
+            return 'missing'
+        return f"{st.st_mtime_ns}-{st.st_size}"
+
+    def version_token(self, method_name: str, user_id: int | str | None = None) -> str | None:
+        """Cheap token that changes whenever the data behind a VERSIONED_READS method may have
+        changed, or None if the method is not versioned. Collection DBs use their change log
+        sequence, and user DBs add the version of the catalog rows that fill their holdings (so
+        another user's import leaves it alone); the read-only decklist_cards.db uses its file
+        mtime and size. `user_id` is the user whose data the request reads (default: the
+        current user); a user DB is never provisioned for a token.
+        """
+        sources = self.VERSIONED_READS.get(method_name)
+        if not sources:
+            return None
+        parts = []
+        for src in sources:
+            if src == 'collection':
+                parts.append(csql.change_token(Path(self._collection_db_path)))
+            elif src == 'user':
+                uid = self._current_user_id if user_id is None else user_id
+                if not self._user_dbs.path_for(uid).exists():
+                    parts.append(f"{uid}:missing")
+                    continue
+                with self._user_dbs.lease(uid) as user_db_path:
+                    parts.append(f"{uid}:{csql.change_token(user_db_path)}:{csql.catalog_token(user_db_path)}")
+            elif src == 'decklist':
+                parts.append(self._file_version(Path(self._decklist_db_path)))
+        return '|'.join(parts)
+
+    def get_changes(self, since_seq: int = 0, limit: int = 500):
+        """Collection/deck changes after since_seq, with the current rows they touch (see csql.get_changes).
+        Clients keep last_seq and apply deltas instead of re-downloading the collection.
+        """
+        return csql.get_changes(Path(self._collection_db_path), since_seq, limit)
+
+    def get_user_changes(self, since_seq: int = 0, limit: int = 500, user_id: int | str = None):
+        """Change feed for the user's collection (see get_changes)."""
+        with self._user_db(user_id) as user_db_path:
+            return csql.get_changes(user_db_path, since_seq, limit)
+
+    def compact_change_log(self, keep: int = csql.DEFAULT_CHANGE_LOG_KEEP, max_age: float | None = CHANGE_LOG_MAX_AGE):
+        """Trim old change log entries in the collection DB and every open user DB. Returns rows deleted."""
+        deleted = 0
+        for path in [Path(self._collection_db_path)] + self._user_dbs.open_paths():
+            try:
+                deleted += csql.compact_changes(path, keep, max_age)
+            except Exception:
+                pass
+        return {'deleted': deleted}
+
+    def _schedule_change_log_compaction(self):
+        def run():
+            self.compact_change_log()
+            self._schedule_change_log_compaction()
+        t = threading.Timer(CHANGE_LOG_COMPACT_INTERVAL, run)
+        t.daemon = True
+        t.start()
+
     def get_collection_items(self):
         """Return full collection items for UI display and client-side filtering."""
         return csql.load_all(Path(self._collection_db_path))
 
+    def export_collection_chunks(self, fmt: str = 'ndjson', filters: dict | None = None, chunk_rows: int = 500):
+        """Yield the collection as NDJSON or CSV text, about chunk_rows rows per chunk, for streaming
+        responses. Rows are read with csql.iter_collection, so memory stays flat for any size.
+        List fields are '|'-joined in CSV.
+        """
+        import csv, io
+        fmt = str(fmt or 'ndjson').lower()
+        if fmt not in ('ndjson', 'csv'):
+            raise ValueError(f'unsupported export format: {fmt}')
+        rows = csql.iter_collection(Path(self._collection_db_path), filters)
+        buf = io.StringIO()
+        writer = None
+        if fmt == 'csv':
+            writer = csv.writer(buf)
+            writer.writerow(csql.ROW_KEYS)
+        n = 0
+        for it in rows:
+            if writer is None:
+                buf.write(json.dumps(it, ensure_ascii=False))
+                buf.write('\n')
+            else:
+                writer.writerow(['|'.join(map(str, v)) if isinstance(v, list) else ('' if v is None else v) for v in it.values()])
+            n += 1
+            if n % chunk_rows == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+
+    def list_collection(self, filters: dict | None = None, sort: str = 'name', after_cursor: str | None = None, limit: int = 100,
+                        with_total: bool = False):
+        """Return one keyset-paginated page of the collection, filtered on the server.
+        Pass the returned next_cursor as after_cursor to fetch the following page.
+        Returns { items, next_cursor, total, total_copies } (totals only on the first page;
+        for a filtered listing only with with_total).
+        """
+        try:
+            return csql.list_collection(Path(self._collection_db_path), filters, sort, after_cursor, limit, _flag(with_total))
+        except ValueError as e:
+            return { 'ok': False, 'error': str(e) }
+
+    def search_collection(self, query: str = '', limit: int = 50, offset: int = 0, filters: dict | None = None):
+        """Full-text search over the collection's names, types and rules text, best matches first.
+        Also accepts the arguments as one dict ({ query, limit, offset, filters }), as JS callers send them.
+        """
+        if isinstance(query, dict):
+            opts = query
+            query = str(opts.get('query') or '')
+            limit = opts.get('limit', limit)
+            offset = opts.get('offset', offset)
+            filters = opts.get('filters', filters)
+        return csql.search_collection(Path(self._collection_db_path), query, limit, offset, filters)
+
     def reset_collection_db(self):
         """Delete and recreate an empty SQLite collection DB. Returns path and total."""
         p = Path(self._collection_db_path)
@@ -1120,124 +1365,99 @@ class Api:
 
     # --- User-Specific Collections ---
     def _get_user_collection_path(self, user_id: int | str) -> Path:
-        """Get the path to a user's collection database."""
-        users_dir = Path('users')
-        users_dir.mkdir(exist_ok=True)
-        return users_dir / f"user_{user_id}_collection.db"
+        """Get the path to a user's collection database (it may not exist yet)."""
+        return self._user_dbs.path_for(user_id)
+
+    def _user_db(self, user_id: int | str | None):
+        """Lease on the user's collection database, provisioned on first use.
+        Use as `with self._user_db(user_id) as path:`; the store is not evicted until the block exits.
+        """
+        if user_id is None:
+            user_id = self._current_user_id
+        return self._user_dbs.lease(user_id)
 
     def init_user_collection(self, user_id: int | str = None):
-        """Initialize a user's collection database (copy from template or create new)."""
+        """Initialize a user's collection database from the empty schema template."""
         if user_id is None:
             user_id = self._current_user_id
-        
-        user_db_path = self._get_user_collection_path(user_id)
-        
-        # If already exists, return it
-        if user_db_path.exists():
-            return {'success': True, 'path': str(user_db_path.resolve()), 'message': 'Collection already exists'}
-        
         try:
-            # Create parent directory
-            user_db_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # If template collection.db exists, copy it; otherwise create empty
-            template_path = Path(self._collection_db_path)
-            if template_path.exists():
-                import shutil
-                shutil.copy2(str(template_path), str(user_db_path))
-                return {'success': True, 'path': str(user_db_path.resolve()), 'message': 'Collection initialized from template'}
-            else:
-                # Create empty database
-                csql.reset_db(user_db_path)
-                return {'success': True, 'path': str(user_db_path.resolve()), 'message': 'Collection created (empty)'}
+            created = self._user_dbs.provision(user_id)
+            user_db_path = self._get_user_collection_path(user_id)
+            message = 'Collection created (empty)' if created else 'Collection already exists'
+            return {'success': True, 'path': str(user_db_path.resolve()), 'message': message}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def get_user_db_stats(self):
+        """Per-user database cache stats: hits, misses, provisioned, evictions, open stores and fds."""
+        return self._user_dbs.stats()
+
+    def compact_user_collections(self):
+        """Move card metadata held in existing per-user DBs into the shared catalog and shrink them."""
+        try:
+            return {'success': True, **self._user_dbs.offload_all()}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
     def get_user_collection_count(self, user_id: int | str = None):
         """Get card count for user's collection."""
-        if user_id is None:
-            user_id = self._current_user_id
-        
-        user_db_path = self._get_user_collection_path(user_id)
-        if not user_db_path.exists():
-            self.init_user_collection(user_id)
-        
-        try:
-            return csql.count_items(user_db_path)
-        except Exception:
-            return 0
+        with self._user_db(user_id) as user_db_path:
+            try:
+                return csql.count_items(user_db_path)
+            except Exception:
+                return 0
 
     def get_user_collection_items(self, user_id: int | str = None):
         """Get all items in user's collection."""
-        if user_id is None:
-            user_id = self._current_user_id
-        
-        user_db_path = self._get_user_collection_path(user_id)
-        if not user_db_path.exists():
-            self.init_user_collection(user_id)
-        
-        try:
-            return csql.load_all(user_db_path)
-        except Exception:
-            return []
+        with self._user_db(user_id) as user_db_path:
+            try:
+                return csql.load_all(user_db_path)
+            except Exception:
+                return []
+
+    def list_user_collection(self, filters: dict | None = None, sort: str = 'name', after_cursor: str | None = None, limit: int = 100,
+                             user_id: int | str = None, with_total: bool = False):
+        """Keyset-paginated page of the user's collection (see list_collection)."""
+        with self._user_db(user_id) as user_db_path:
+            try:
+                return csql.list_collection(user_db_path, filters, sort, after_cursor, limit, _flag(with_total))
+            except ValueError as e:
+                return {'ok': False, 'error': str(e)}
+
+    def search_user_collection(self, query: str = '', limit: int = 50, offset: int = 0, filters: dict | None = None, user_id: int | str = None):
+        """Full-text search over the user's collection (see search_collection)."""
+        with self._user_db(user_id) as user_db_path:
+            try:
+                return csql.search_collection(user_db_path, query, limit, offset, filters)
+            except Exception:
+                return []
 
     def get_user_decks(self, user_id: int | str = None):
         """Get all decks for a user."""
-        if user_id is None:
-            user_id = self._current_user_id
-        
-        user_db_path = self._get_user_collection_path(user_id)
-        if not user_db_path.exists():
-            self.init_user_collection(user_id)
-        
-        try:
-            return csql.get_decks(user_db_path)
-        except Exception:
-            return []
+        with self._user_db(user_id) as user_db_path:
+            try:
+                return csql.get_decks(user_db_path)
+            except Exception:
+                return []
 
     def save_user_deck(self, deck_name: str, items: list[dict], deck_type: str | None = None, commander: str | None = None, user_id: int | str = None):
         """Save a deck for a user."""
-        if user_id is None:
-            user_id = self._current_user_id
-        
-        user_db_path = self._get_user_collection_path(user_id)
-        if not user_db_path.exists():
-            self.init_user_collection(user_id)
-        
-        import time
         name = str(deck_name or '')
-        attempts = 0
-        last_err = None
-        
-        while attempts < 6:
+        with self._user_db(user_id) as user_db_path:
             try:
                 csql.save_deck(user_db_path, name, items or [], deck_type, None, commander)
                 return {'success': True, 'message': f'Deck "{name}" saved'}
             except Exception as e:
-                msg = str(e)
-                last_err = e
-                if 'database is locked' in msg.lower() or 'busy' in msg.lower():
-                    time.sleep(0.2 * (attempts + 1))
-                    attempts += 1
-                    continue
-                return {'success': False, 'error': msg}
-        
-        return {'success': False, 'error': f"database is locked after retries: {last_err}"}
+                return {'success': False, 'error': str(e)}
 
     def add_to_user_collection(self, card_name: str, quantity: int = 1, user_id: int | str = None):
         """Add cards to user's collection."""
-        if user_id is None:
-            user_id = self._current_user_id
-        
-        user_db_path = self._get_user_collection_path(user_id)
-        if not user_db_path.exists():
-            self.init_user_collection(user_id)
-        
-        try:
-            csql.add_item(user_db_path, card_name, quantity)
-            return {'success': True, 'message': f'Added {quantity} {card_name} to collection'}
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        with self._user_db(user_id) as user_db_path:
+            try:
+                csql.add_item(user_db_path, card_name, quantity)
+                return {'success': True, 'message': f'Added {quantity} {card_name} to collection'}
+            except Exception as e:
+                return {'success': False, 'error': str(e)}
 
     def get_user_collection_db_path(self, user_id: int | str = None):
         """Get diagnostics for user's collection database."""
@@ -1264,26 +1484,28 @@ class Api:
         except Exception:
             return []
 
+    def list_deck_headers(self):
+        """Return deck name, type, colors, commander and card count for every deck, without card lists."""
+        try:
+            return csql.list_deck_headers(Path(self._collection_db_path))
+        except Exception:
+            return []
+
+    def get_deck(self, deck_name: str):
+        """Return a single deck with its cards, or None if it does not exist."""
+        try:
+            return csql.get_deck(Path(self._collection_db_path), deck_name)
+        except Exception:
+            return None
+
     def save_deck_items(self, deck_name: str, items: list[dict], deck_type: str | None = None, commander: str | None = None):
         """Replace a deck's contents with provided items: [{name, count}]. Optionally set deck_type/commander."""
-        import time
         name = str(deck_name or '')
-        attempts = 0
-        last_err = None
-        while attempts < 6:
-            try:
-                csql.save_deck(Path(self._collection_db_path), name, items or [], deck_type, None, commander)
-                return { 'ok': True }
-            except Exception as e:
-                msg = str(e)
-                last_err = e
-                # Retry transient SQLite lock errors
-                if 'database is locked' in msg.lower() or 'busy' in msg.lower():
-                    time.sleep(0.2 * (attempts + 1))
-                    attempts += 1
-                    continue
-                return { 'ok': False, 'error': msg }
-        return { 'ok': False, 'error': f"database is locked after retries: {last_err}" }
+        try:
+            csql.save_deck(Path(self._collection_db_path), name, items or [], deck_type, None, commander)
+            return { 'ok': True }
+        except Exception as e:
+            return { 'ok': False, 'error': str(e) }
 
     # --- Deck persistence helpers ---
     def _load_decks(self) -> list[dict]:
@@ -1362,196 +1584,44 @@ class Api:
     def get_collection_summary(self):
         """Return aggregated collection by name with qty, available, and decks list.
         Also includes simple aggregates for colors (unique), cmc (avg), and exemplar PT/text.
+        Served from the trigger-maintained collection_summary table (see csql.get_collection_summary).
         """
-        items = csql.load_all(Path(self._collection_db_path))
-        # group by name
-        groups: dict[str, dict] = {}
-        for it in items:
-            name = str((it or {}).get('name','')).strip()
-            if not name:
-                continue
-            key = name.lower()
-            g = groups.get(key)
-            if g is None:
-                g = {
-                    'name': name,
-                    'qty': 0,
-                    'colors': set(),
-                    'types': set(),
-                    'cmcs': [],
-                    'powers': [],
-                    'toughnesses': [],
-                    'texts': [],
-                    'back_name': '',
-                    'back_mana_cost': '',
-                    'back_colors': set(),
-                    'back_types': set(),
-                    'back_oracle_text': '',
-                    'back_power': '',
-                    'back_toughness': '',
-                }
-                groups[key] = g
-            g['qty'] += 1
-            for c in (it.get('colors') or []):
-                g['colors'].add(str(c))
-            for t in (it.get('types') or []):
-                g['types'].add(str(t))
-            if it.get('cmc') is not None:
-                try:
-                    g['cmcs'].append(float(it.get('cmc')))
-                except Exception:
-                    pass
-            if it.get('power') is not None:
-                g['powers'].append(str(it.get('power')))
-            if it.get('toughness') is not None:
-                g['toughnesses'].append(str(it.get('toughness')))
-            if it.get('text'):
-                g['texts'].append(str(it.get('text')))
-            # Collect back face data (first non-empty wins)
-            if it.get('back_name') and not g['back_name']:
-                g['back_name'] = str(it.get('back_name'))
-            if it.get('back_mana_cost') and not g['back_mana_cost']:
-                g['back_mana_cost'] = str(it.get('back_mana_cost'))
-            for c in (it.get('back_colors') or []):
-                g['back_colors'].add(str(c))
-            for t in (it.get('back_types') or []):
-                g['back_types'].add(str(t))
-            if it.get('back_oracle_text') and not g['back_oracle_text']:
-                g['back_oracle_text'] = str(it.get('back_oracle_text'))
-            if it.get('back_power') and not g['back_power']:
-                g['back_power'] = str(it.get('back_power'))
-            if it.get('back_toughness') and not g['back_toughness']:
-                g['back_toughness'] = str(it.get('back_toughness'))
-        # compute decks usage from SQLite decks; fallback to JSON decks if needed
-        usage_by_name: dict[str, int] = {}
-        decks_by_name: dict[str, list[str]] = {}
-        try:
-            # Build usage map and deck name mapping from SQL
-            usage_by_name = csql.usage_counts_by_name(Path(self._collection_db_path))
-            for d in csql.get_decks(Path(self._collection_db_path)):
-                dname = str(d.get('name','')).strip()
-                for c in (d.get('cards') or []):
-                    nm = str(c.get('name','')).strip()
-                    cnt = int(c.get('count', 0))
-                    if cnt > 0 and nm:
-                        decks_by_name.setdefault(nm.lower(), []).append(dname)
-        except Exception:
-            # Fallback to legacy JSON decks store
-            try:
-                decks = self._load_decks()
-                for d in decks:
-                    dname = str(d.get('name','')).strip()
-                    for c in (d.get('cards') or []):
-                        nm = str(c.get('name','')).strip()
-                        cnt = int(c.get('count', 0))
-                        k = nm.lower()
-                        usage_by_name[k] = usage_by_name.get(k, 0) + max(0, cnt)
-                        if cnt > 0:
-                            decks_by_name.setdefault(k, []).append(dname)
-            except Exception:
-                usage_by_name = {}
-                decks_by_name = {}
-
-        # finalize summary
-        out = []
-        for k, g in groups.items():
-            qty = int(g['qty'])
-            used = int(usage_by_name.get(k, 0))
-            avail = max(0, qty - used)
-            colors = sorted(list(g['colors']))
-            types = sorted(list(g['types']))
-            cmc = None
-            if g['cmcs']:
-                cmc = round(sum(g['cmcs'])/len(g['cmcs']), 1)
-            power = next((p for p in g['powers'] if p), '')
-            tough = next((t for t in g['toughnesses'] if t), '')
-            text = next((t for t in g['texts'] if t), '')
-            out.append({
-                'name': g['name'],
-                'qty': qty,
-                'available': avail,
-                'decks': sorted(list(set(decks_by_name.get(k, [])))),
-                'colors': colors,
-                'types': types,
-                'cmc': cmc,
-                'power': power,
-                'toughness': tough,
-                'text': text,
-                'back_name': g['back_name'],
-                'back_mana_cost': g['back_mana_cost'],
-                'back_colors': sorted(list(g['back_colors'])),
-                'back_types': sorted(list(g['back_types'])),
-                'back_oracle_text': g['back_oracle_text'],
-                'back_power': g['back_power'],
-                'back_toughness': g['back_toughness'],
-            })
-        out.sort(key=lambda x: x['name'])
-        return out
+        return csql.get_collection_summary(Path(self._collection_db_path))
 
     # --- Deck APIs backed by SQLite ---
     def save_deck(self, deck_name: str, items: list[dict], commander: str | None = None):
         """Create/replace a deck with a list of {name, count}."""
-        import time
         name = str(deck_name or '')
-        attempts = 0
-        last_err = None
-        while attempts < 6:
-            try:
-                csql.save_deck(Path(self._collection_db_path), name, items or [], None, None, commander)
-                return { 'ok': True }
-            except Exception as e:
-                msg = str(e)
-                last_err = e
-                if 'database is locked' in msg.lower() or 'busy' in msg.lower():
-                    time.sleep(0.2 * (attempts + 1))
-                    attempts += 1
-                    continue
-                return { 'ok': False, 'error': msg }
-        return { 'ok': False, 'error': f"database is locked after retries: {last_err}" }
+        try:
+            csql.save_deck(Path(self._collection_db_path), name, items or [], None, None, commander)
+            return { 'ok': True }
+        except Exception as e:
+            return { 'ok': False, 'error': str(e) }
 
     def create_deck(self, deck_name: str, deck_type: str | None = None, deck_colors: list[str] | None = None, commander: str | None = None):
         """Create a deck if missing and optionally set deck_type/colors/commander. Does not change cards."""
-        import time
         name = str(deck_name or '').strip()
         if not name:
             return { 'ok': False, 'error': 'name_required' }
-        attempts = 0
-        last_err = None
-        while attempts < 6:
-            try:
-                p = Path(self._collection_db_path)
-                did = csql.create_or_get_deck(p, name)
-                try:
-                    import json as _json
-                    with csql._open_conn(p) as conn:  # type: ignore
-                        conn.execute("PRAGMA busy_timeout=5000")
-                        if deck_type is not None and deck_colors is not None and commander is not None:
-                            conn.execute("UPDATE decks SET deck_type=?, deck_colors=?, commander=? WHERE id=?", (str(deck_type or ''), _json.dumps(deck_colors or []), str(commander or ''), int(did)))
-                        elif deck_type is not None and deck_colors is not None:
-                            conn.execute("UPDATE decks SET deck_type=?, deck_colors=? WHERE id=?", (str(deck_type or ''), _json.dumps(deck_colors or []), int(did)))
-                        elif deck_type is not None and commander is not None:
-                            conn.execute("UPDATE decks SET deck_type=?, commander=? WHERE id=?", (str(deck_type or ''), str(commander or ''), int(did)))
-                        elif deck_colors is not None and commander is not None:
-                            conn.execute("UPDATE decks SET deck_colors=?, commander=? WHERE id=?", (_json.dumps(deck_colors or []), str(commander or ''), int(did)))
-                        elif deck_type is not None:
-                            conn.execute("UPDATE decks SET deck_type=? WHERE id=?", (str(deck_type or ''), int(did)))
-                        elif deck_colors is not None:
-                            conn.execute("UPDATE decks SET deck_colors=? WHERE id=?", (_json.dumps(deck_colors or []), int(did)))
-                        elif commander is not None:
-                            conn.execute("UPDATE decks SET commander=? WHERE id=?", (str(commander or ''), int(did)))
-                        conn.commit()
-                except Exception:
-                    pass
-                return { 'ok': True }
-            except Exception as e:
-                msg = str(e)
-                last_err = e
-                if 'database is locked' in msg.lower() or 'busy' in msg.lower():
-                    time.sleep(0.2 * (attempts + 1))
-                    attempts += 1
-                    continue
-                return { 'ok': False, 'error': msg }
-        return { 'ok': False, 'error': f"database is locked after retries: {last_err}" }
+        p = Path(self._collection_db_path)
+        sets, args = [], []
+        if deck_type is not None:
+            sets.append('deck_type=?'); args.append(str(deck_type or ''))
+        if deck_colors is not None:
+            sets.append('deck_colors=?'); args.append(json.dumps(deck_colors or []))
+        if commander is not None:
+            sets.append('commander=?'); args.append(str(commander or ''))
+
+        def apply(conn):
+            did = csql.create_or_get_deck(p, name)
+            if sets:
+                conn.execute(f"UPDATE decks SET {', '.join(sets)} WHERE id=?", (*args, int(did)))
+
+        try:
+            csql.write(p, apply)
+            return { 'ok': True }
+        except Exception as e:
+            return { 'ok': False, 'error': str(e) }
 
     def get_decks_sql(self):
         try:
@@ -1561,225 +1631,64 @@ class Api:
 
     # --- Deck card mutations (SQL) ---
     def add_cards_to_deck(self, deck_name: str, items: list[dict]):
-        import time
-        name = str(deck_name or '').strip()
-        if not name:
-            return { 'ok': False, 'error': 'name_required' }
-        
-        # Check if this is a commander deck and validate rules
-        deck_info = self._get_deck_info(name)
-        is_commander = deck_info and str(deck_info.get('type', '')).lower() in ['commander', 'edh']
-        
-        if is_commander:
-            # Validate commander deck rules before adding
-            violations = self._validate_commander_deck_additions(name, items)
-            if violations:
-                return { 'ok': False, 'error': 'commander_rules_violation', 'violations': violations }
-        
-        attempts = 0
-        last_err = None
-        while attempts < 6:
-            try:
-                p = Path(self._collection_db_path)
-                # First add to deck
-                for it in (items or []):
-                    nm = str((it or {}).get('name') or '').strip()
-                    cnt = int((it or {}).get('count') or 0)
-                    if nm and cnt > 0:
-                        csql.add_to_deck(p, name, nm, cnt)
-                # Then ensure inventory has at least as many copies as used across decks
-                try:
-                    used_map = csql.usage_counts_by_name(p)
-                except Exception:
-                    used_map = {}
-                import sqlite3, json as _json
-                with csql._open_conn(p) as conn:  # type: ignore
-                    for it in (items or []):
-                        nm = str((it or {}).get('name') or '').strip()
-                        if not nm:
-                            continue
-                        used = int(used_map.get(nm.lower(), 0))
-                        cur = conn.execute("SELECT COUNT(1) FROM collection WHERE lower(name)=?", (nm.lower(),))
-                        total = int(cur.fetchone()[0] or 0)
-                        missing = max(0, used - total)
-                        if missing > 0:
-                            row = {
-                                'name': nm,
-                                'set_code': '',
-                                'number': '',
-                                'colors': _json.dumps([]),
-                                'types': _json.dumps([]),
-                                'cmc': None,
-                                'power': None,
-                                'toughness': None,
-                                'text': None,
-                                'image_path': None,
-                                'image_url': None,
-                                'source': 'deck_add',
-                            }
-                            conn.executemany(
-                                "INSERT INTO collection(name,set_code,number,colors,types,cmc,power,toughness,text,image_path,image_url,source) VALUES(:name,:set_code,:number,:colors,:types,:cmc,:power,:toughness,:text,:image_path,:image_url,:source)",
-                                [row]*missing
-                            )
-                    conn.commit()
-                return { 'ok': True }
-            except Exception as e:
-                msg = str(e)
-                last_err = e
-                if 'locked' in msg.lower() or 'busy' in msg.lower():
-                    time.sleep(0.2 * (attempts + 1))
-                    attempts += 1
-                    continue
-                return { 'ok': False, 'error': msg }
-        return { 'ok': False, 'error': f"database is locked after retries: {last_err}" }
-
-    def _get_deck_info(self, deck_name: str) -> dict | None:
-        """Get deck information including type and current cards."""
-        try:
-            p = Path(self._collection_db_path)
-            with csql._open_conn(p) as conn:
-                deck_row = conn.execute(
-                    "SELECT id, deck_type, commander FROM decks WHERE lower(name)=?", 
-                    (str(deck_name or '').strip().lower(),)
-                ).fetchone()
-                
-                if not deck_row:
-                    return None
-                
-                deck_id, deck_type, commander = deck_row
-                
-                # Get current cards
-                cards = {}
-                for row in conn.execute("SELECT name, count FROM deck_cards WHERE deck_id=?", (deck_id,)):
-                    cards[str(row[0]).lower()] = int(row[1])
-                
-                return {
-                    'type': str(deck_type or ''),
-                    'commander': str(commander or ''),
-                    'cards': cards
-                }
-        except Exception:
-            return None
-    
-    def _is_basic_land(self, card_name: str) -> bool:
-        """Check if a card is a basic land (unlimited in Commander)."""
-        basic_lands = {
-            'plains', 'island', 'swamp', 'mountain', 'forest', 'wastes',
-            'snow-covered plains', 'snow-covered island', 'snow-covered swamp', 
-            'snow-covered mountain', 'snow-covered forest'
-        }
-        return str(card_name or '').strip().lower() in basic_lands
-    
-    def _validate_commander_deck_additions(self, deck_name: str, items: list[dict]) -> list[str]:
-        """Validate cards being added to a commander deck. Returns list of rule violations."""
-        violations = []
-        deck_info = self._get_deck_info(deck_name)
-        
-        if not deck_info:
-            return violations
-        
-        current_cards = deck_info['cards']
-        
-        for item in (items or []):
-            name = str((item or {}).get('name', '')).strip()
-            count = int((item or {}).get('count', 0))
-            
-            if not name or count <= 0:
-                continue
-            
-            name_lower = name.lower()
-            
-            # Skip basic lands (no limit)
-            if self._is_basic_land(name):
-                continue
-            
-            current_count = current_cards.get(name_lower, 0)
-            
-            # Commander rule: max 1 copy of non-basic cards
-            if current_count >= 1:
-                violations.append(f"'{name}' already in deck (max 1 copy allowed in Commander)")
-            elif current_count + count > 1:
-                violations.append(f"Cannot add {count} copies of '{name}' (max 1 copy allowed in Commander)")
-        
-        return violations
+        """Add [{name, count}] to a deck in one transaction, enforcing Commander rules and
+        topping up the collection so it owns every copy the decks use.
+        """
+        res = self.apply_deck_changes(deck_name, adds=items)
+        return { k: v for k, v in res.items() if k != 'deck' }
 
     def remove_cards_from_deck(self, deck_name: str, items: list[dict]):
-        import time
+        res = self.apply_deck_changes(deck_name, removes=items)
+        return { k: v for k, v in res.items() if k != 'deck' }
+
+    def apply_deck_changes(self, deck_name: str, adds: list[dict] | None = None, removes: list[dict] | None = None, metadata: dict | None = None):
+        """Apply a batch deck edit atomically: adds/removes are [{name, count}], metadata may set
+        type, colors and commander. Returns { ok, deck } or { ok: False, error[, violations] }.
+        """
         name = str(deck_name or '').strip()
         if not name:
             return { 'ok': False, 'error': 'name_required' }
-        attempts = 0
-        last_err = None
-        while attempts < 6:
-            try:
-                for it in (items or []):
-                    nm = str((it or {}).get('name') or '').strip()
-                    cnt = int((it or {}).get('count') or 0)
-                    if nm and cnt > 0:
-                        csql.remove_from_deck(Path(self._collection_db_path), name, nm, cnt)
-                return { 'ok': True }
-            except Exception as e:
-                msg = str(e)
-                last_err = e
-                if 'locked' in msg.lower() or 'busy' in msg.lower():
-                    time.sleep(0.2 * (attempts + 1))
-                    attempts += 1
-                    continue
-                return { 'ok': False, 'error': msg }
-        return { 'ok': False, 'error': f"database is locked after retries: {last_err}" }
+        try:
+            return csql.apply_deck_changes(Path(self._collection_db_path), name, adds, removes, metadata)
+        except Exception as e:
+            return { 'ok': False, 'error': str(e) }
 
     def delete_deck(self, deck_name: str):
-        import time, sqlite3
         name = str(deck_name or '').strip()
         if not name:
             return { 'ok': False, 'error': 'name_required' }
-        attempts = 0
-        last_err = None
-        p = Path(self._collection_db_path)
-        while attempts < 6:
-            try:
-                # Before deleting the deck, remove that many copies from collection
-                with csql._open_conn(p) as conn:  # type: ignore
-                    conn.execute("PRAGMA busy_timeout=5000")
-                    # Find deck id and its cards
-                    cur = conn.execute("SELECT id FROM decks WHERE lower(name)=?", (name.lower(),))
-                    row = cur.fetchone()
-                    if row:
-                        did = int(row[0])
-                        # Build list of {name, count}
-                        cur2 = conn.execute("SELECT name, count FROM deck_cards WHERE deck_id=?", (did,))
-                        to_remove = [{'name': r[0], 'count': int(r[1] or 0)} for r in cur2.fetchall()]
-                    else:
-                        to_remove = []
-                # Delete requested counts from collection
-                try:
-                    removed = 0
-                    if to_remove:
-                        removed = int(csql.delete_by_names_counts(p, to_remove) or 0)
-                except Exception:
-                    removed = 0
-                # Finally, delete the deck (and its deck_cards via FK CASCADE or explicit deletes)
-                with csql._open_conn(p) as conn:  # type: ignore
-                    conn.execute("PRAGMA busy_timeout=5000")
-                    # Ensure deck_cards removed first for safety on older schemas
-                    conn.execute("DELETE FROM deck_cards WHERE deck_id IN (SELECT id FROM decks WHERE lower(name)=?)", (name.lower(),))
-                    conn.execute("DELETE FROM decks WHERE lower(name)=?", (name.lower(),))
-                    conn.commit()
-                return { 'ok': True, 'removed_from_collection': removed, 'planned': sum(int(x.get('count') or 0) for x in (to_remove or [])) }
-            except Exception as e:
-                msg = str(e)
-                last_err = e
-                if 'locked' in msg.lower() or 'busy' in msg.lower():
-                    time.sleep(0.2 * (attempts + 1))
-                    attempts += 1
-                    continue
-                return { 'ok': False, 'error': msg }
-        return { 'ok': False, 'error': f"database is locked after retries: {last_err}" }
+        try:
+            # Remove that many copies from collection and delete the deck in one transaction
+            res = csql.delete_deck(Path(self._collection_db_path), name)
+            if res is None:
+                return { 'ok': True, 'removed_from_collection': 0, 'planned': 0 }
+            return { 'ok': True, **res }
+        except Exception as e:
+            return { 'ok': False, 'error': str(e) }
 
     def _sync_card_names_from_collection(self):
-        items = csql.load_all(Path(self._collection_db_path))
-        names = sorted({str(it.get('name', '')).strip() for it in items if str(it.get('name', '')).strip()})
-        db.save_cards_db(Path(self._db_path), names)
+        """Schedule a rewrite of the legacy cards_db.json name list.
+        Mutations only mark it stale; one background flush per CARD_NAMES_FLUSH_DELAY
+        rewrites it, so a burst of edits or an import costs a single write.
+        """
+        with self._card_names_lock:
+            if self._card_names_timer is not None:
+                return
+            t = threading.Timer(CARD_NAMES_FLUSH_DELAY, self.flush_card_names)
+            t.daemon = True
+            self._card_names_timer = t
+        t.start()
+
+    def flush_card_names(self):
+        """Write cards_db.json from the collection now (also what the scheduled flush runs)."""
+        with self._card_names_lock:
+            t, self._card_names_timer = self._card_names_timer, None
+        if t is not None:
+            t.cancel()
+        try:
+            db.save_cards_db(Path(self._db_path), csql.card_names(Path(self._collection_db_path)))
+        except Exception:
+            pass
 
     def process_manual_entry(self, text: str):
         """Process one or multiple manual entries (comma or newline separated) via AllPrintings.sql.
@@ -1820,16 +1729,14 @@ class Api:
         - Update the row's normalized fields in-place.
         Returns { scanned, repaired }.
         """
-        import sqlite3, json as _json
+        import json as _json
         p = Path(self._collection_db_path)
-        csql.ensure_db(p)
         # Ensure index ready
         self.ensure_index()
         repaired = 0
         scanned = 0
         try:
-            with csql._open_conn(p) as conn:  # type: ignore
-                conn.execute("PRAGMA busy_timeout=5000")
+            with csql.get_store(p).conn as conn:
                 rows = conn.execute(
                     "SELECT id, name, set_code, number FROM collection WHERE name LIKE '""%' OR name LIKE '%""' OR instr(name, char(10))>0 OR length(name)>120 LIMIT ?",
                     (int(max_rows),)
@@ -1876,27 +1783,22 @@ class Api:
                             enriched = None
                     if enriched is None:
                         enriched = { 'name': cleaned, 'set': set_code, 'number': number, 'colors': [], 'types': [], 'cmc': None, 'power': None, 'toughness': None, 'text': '', 'image_path': None, 'image_url': None, 'source': 'repair' }
-                    # Update row fields
+                    # Update row fields; a cleaned name that is already held merges into that holding
                     try:
-                        conn.execute(
-                            "UPDATE collection SET name=?, set_code=?, number=?, colors=?, types=?, cmc=?, power=?, toughness=?, text=? WHERE id=?",
-                            (
-                                str(enriched.get('name') or cleaned),
-                                str(enriched.get('set') or set_code),
-                                str(enriched.get('number') or number),
-                                _json.dumps(enriched.get('colors') or []),
-                                _json.dumps(enriched.get('types') or []),
-                                enriched.get('cmc'),
-                                None if enriched.get('power') is None else str(enriched.get('power')),
-                                None if enriched.get('toughness') is None else str(enriched.get('toughness')),
-                                str(enriched.get('text') or ''),
-                                rid,
-                            )
-                        )
+                        csql.update_holding(p, rid, {
+                            'name': str(enriched.get('name') or cleaned),
+                            'set_code': str(enriched.get('set') or set_code),
+                            'number': str(enriched.get('number') or number),
+                            'colors': _json.dumps(enriched.get('colors') or []),
+                            'types': _json.dumps(enriched.get('types') or []),
+                            'cmc': enriched.get('cmc'),
+                            'power': None if enriched.get('power') is None else str(enriched.get('power')),
+                            'toughness': None if enriched.get('toughness') is None else str(enriched.get('toughness')),
+                            'text': str(enriched.get('text') or ''),
+                        })
                         repaired += 1
                     except Exception:
                         pass
-                conn.commit()
         except Exception:
             pass
         # refresh name list
@@ -1904,38 +1806,44 @@ class Api:
         return { 'scanned': scanned, 'repaired': repaired }
 
     def enrich_collection(self, max_items: int | None = None):
-        """Backfill metadata for existing entries using the structured index."""
+        """Backfill metadata for existing entries using the structured index.
+        Only the rules fields are filled in, in place: identifiers, quantity and condition are kept.
+        """
         self.ensure_index()
-        items = csql.load_all(Path(self._collection_db_path))
-        updated = 0
+        path = Path(self._collection_db_path)
+        items = csql.load_all(path)
+        updates = []
         conn = card_index.open_db(Path(self._index_db_path))
-        out = []
-        for it in items:
-            out.append(it)
-            if max_items and updated >= max_items:
-                continue
-            # If already has key metadata, skip
-            if it.get('types') or it.get('cmc') is not None or it.get('text'):
-                continue
-            name = str(it.get('name', ''))
-            if not name:
-                continue
-            rows = card_index.lookup_by_name(conn, name, limit=1)
-            if not rows:
-                continue
-            enriched = rows[0]
-            # Merge preserving identifiers and image_path
-            enriched['image_path'] = it.get('image_path', enriched.get('image_path', ''))
-            enriched['source'] = it.get('source', 'enriched')
-            # Replace in out
-            out[-1] = enriched
-            updated += 1
-        conn.close()
-        # Replace contents: reset and insert
-        csql.reset_db(Path(self._collection_db_path))
-        csql.insert_items(Path(self._collection_db_path), out)
+        try:
+            for it in items:
+                if max_items and len(updates) >= max_items:
+                    break
+                # If already has key metadata, skip
+                if it.get('types') or it.get('cmc') is not None or it.get('text'):
+                    continue
+                name = str(it.get('name', ''))
+                if not name:
+                    continue
+                rows = card_index.lookup_by_name(conn, name, limit=1)
+                if not rows:
+                    continue
+                enriched = rows[0]
+                updates.append((
+                    json.dumps(enriched.get('colors') or []),
+                    json.dumps(enriched.get('types') or []),
+                    enriched.get('cmc'),
+                    None if enriched.get('power') is None else str(enriched.get('power')),
+                    None if enriched.get('toughness') is None else str(enriched.get('toughness')),
+                    str(enriched.get('text') or ''),
+                    it['id'],
+                ))
+        finally:
+            conn.close()
+        if updates:
+            csql.write(path, lambda c: c.executemany(
+                "UPDATE collection SET colors=?, types=?, cmc=?, power=?, toughness=?, text=? WHERE id=?", updates))
         self._sync_card_names_from_collection()
-        return { 'updated': updated, 'total': len(out) }
+        return { 'updated': len(updates), 'total': len(items) }
 
     def repair_collection(self, max_items: int | None = None):
         """Repair/enrich existing collection rows by fetching from Scryfall.
@@ -1943,13 +1851,12 @@ class Api:
         Updates columns: scryfall_id, mana_cost, oracle_text, cmc, colors, types, image_url, power, toughness.
         Returns { updated, total, errors }.
         """
-        import sqlite3, urllib.parse
+        import urllib.parse
         path = Path(self._collection_db_path)
         updated = 0
         errors: list[str] = []
+        conn = csql.get_store(path).conn
         try:
-            conn = sqlite3.connect(str(path))
-            conn.row_factory = sqlite3.Row
             cur = conn.cursor()
             rows = list(cur.execute("SELECT id, name, set_code, number FROM collection"))
             count = 0
@@ -1995,7 +1902,8 @@ class Api:
                         iu2 = f0.get('image_uris') or {}
                         img = iu2.get('normal') or iu2.get('large') or iu2.get('small') or ''
                     # Update row
-                    cur.execute(
+                    csql.execute_write(
+                        path,
                         """
                         UPDATE collection
                         SET scryfall_id=?, mana_cost=?, oracle_text=?, cmc=?, colors=?, types=?, image_url=?, power=?, toughness=?
@@ -2022,8 +1930,6 @@ class Api:
                 except Exception as e:
                     errors.append(f"{name}: {e}")
                     continue
-            conn.commit()
-            conn.close()
             self._sync_card_names_from_collection()
             return { 'updated': updated, 'total': len(rows), 'errors': errors }
         except Exception as e:
@@ -2041,10 +1947,9 @@ class Api:
             self._repair_errors_list = []
         def run():
             try:
-                import sqlite3, urllib.parse
+                import urllib.parse
                 path = Path(self._collection_db_path)
-                conn = sqlite3.connect(str(path))
-                conn.row_factory = sqlite3.Row
+                conn = csql.get_store(path).conn
                 cur = conn.cursor()
                 # Select cards that need repair:
                 # 1. Unrepaired cards
@@ -2130,37 +2035,29 @@ class Api:
                             iu = data.get('image_uris')
                             img = iu.get('normal') or iu.get('large') or iu.get('small') or ''
                         
-                        # also update cleaned name if changed and mark as repaired
-                        cur.execute(
-                            """
-                            UPDATE collection
-                            SET name=?, scryfall_id=?, mana_cost=?, oracle_text=?, cmc=?, colors=?, types=?, image_url=?, power=?, toughness=?,
-                                back_name=?, back_mana_cost=?, back_colors=?, back_types=?, back_oracle_text=?, back_power=?, back_toughness=?, back_image_url=?,
-                                repaired=1
-                            WHERE id=?
-                            """,
-                            (
-                                nm_clean or name,
-                                scry_id,
-                                str(mana_cost or ''),
-                                str(oracle_text or ''),
-                                cmc,
-                                json.dumps(colors or []),
-                                json.dumps(types_arr or []),
-                                str(img or ''),
-                                None if power is None else str(power),
-                                None if toughness is None else str(toughness),
-                                str(back_name or ''),
-                                str(back_mana_cost or ''),
-                                json.dumps(back_colors or []),
-                                json.dumps(back_types or []),
-                                str(back_oracle_text or ''),
-                                None if back_power is None else str(back_power),
-                                None if back_toughness is None else str(back_toughness),
-                                str(back_image_url or ''),
-                                rid,
-                            )
-                        )
+                        # also update cleaned name if changed and mark as repaired;
+                        # if that name is already held, the row merges into that holding
+                        csql.update_holding(path, rid, {
+                            'name': nm_clean or name,
+                            'scryfall_id': scry_id,
+                            'mana_cost': str(mana_cost or ''),
+                            'oracle_text': str(oracle_text or ''),
+                            'cmc': cmc,
+                            'colors': json.dumps(colors or []),
+                            'types': json.dumps(types_arr or []),
+                            'image_url': str(img or ''),
+                            'power': None if power is None else str(power),
+                            'toughness': None if toughness is None else str(toughness),
+                            'back_name': str(back_name or ''),
+                            'back_mana_cost': str(back_mana_cost or ''),
+                            'back_colors': json.dumps(back_colors or []),
+                            'back_types': json.dumps(back_types or []),
+                            'back_oracle_text': str(back_oracle_text or ''),
+                            'back_power': None if back_power is None else str(back_power),
+                            'back_toughness': None if back_toughness is None else str(back_toughness),
+                            'back_image_url': str(back_image_url or ''),
+                            'repaired': 1,
+                        })
                         count += 1
                         with self._repair_lock:
                             self._repair_updated = count
@@ -2177,8 +2074,6 @@ class Api:
                         with self._repair_lock:
                             self._repair_updated = count
                         continue
-                conn.commit()
-                conn.close()
                 self._sync_card_names_from_collection()
             finally:
                 with self._repair_lock:
@@ -2204,6 +2099,7 @@ class Api:
                 'running': self._import_running,
                 'current': self._import_current,
                 'total': self._import_total,
+                'inserted': self._import_inserted,
             }
 
     def get_precon_import_progress(self):
@@ -2222,7 +2118,7 @@ class Api:
             if not norm.get('name'):
                 return { 'added': 0, 'total': self.get_collection_count(), 'item': {} }
             norm.setdefault('source', 'manual-select')
-            # Allow duplicates so inventory quantities >1 are stored as separate entries
+            # An existing holding of this printing gains a copy instead of a new row
             added = csql.insert_items(Path(self._collection_db_path), [norm])
             self._sync_card_names_from_collection()
             total = self.get_collection_count()
@@ -2265,27 +2161,12 @@ class Api:
         Each item should include at least name, set, and number.
         Returns counts and new total.
         """
-        # Delete by exact identifiers using SQL
+        # Delete every copy whose (name, set, number) matches any item, in one transaction
         path = Path(self._collection_db_path)
         if not items:
             return { 'deleted': 0, 'total': self.get_collection_count() }
-        # Convert to name-only with counts=None to delete all matching identifiers by name+set+number
-        # For simplicity, delete all rows whose (name,set,number) matches any item
         try:
-            import sqlite3
-            conn = sqlite3.connect(str(path))
-            try:
-                cur = conn.cursor()
-                deleted = 0
-                for it in (items or []):
-                    nm = str((it or {}).get('name') or '').strip()
-                    sc = str((it or {}).get('set') or '').strip()
-                    no = str((it or {}).get('number') or '').strip()
-                    cur.execute("DELETE FROM collection WHERE lower(name)=? AND lower(set_code)=? AND lower(number)=?", (nm.lower(), sc.lower(), no.lower()))
-                    deleted += cur.rowcount
-                conn.commit()
-            finally:
-                conn.close()
+            deleted = csql.delete_by_identifiers(path, items)
             self._sync_card_names_from_collection()
             return { 'deleted': deleted, 'total': self.get_collection_count() }
         except Exception:
@@ -0,0 +1,142 @@
+"""Micro-benchmarks for core.collection_sql. Run: python bench_collection.py"""
+import json
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from core import collection_sql as csql
+from core import response_encoding
+
+
+def _timeit(fn, n: int) -> float:
+    """Return average microseconds per call."""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def bench_call_overhead(tmp: Path, n: int = 500):
+    """Per-call overhead of a trivial read: legacy connect+schema per call vs CollectionStore."""
+    path = tmp / 'overhead.db'
+    csql.insert_items(path, [{'name': 'Island'}] * 10)
+
+    def legacy_count():
+        # What every csql call used to do: run the schema script, then open a fresh connection
+        conn = sqlite3.connect(str(path), timeout=30)
+        conn.executescript(csql.SCHEMA)
+        conn.execute("PRAGMA table_info(decks)").fetchall()
+        conn.execute("PRAGMA table_info(collection)").fetchall()
+        conn.commit()
+        conn.close()
+        conn = sqlite3.connect(str(path), timeout=30)
+        conn.execute("SELECT COUNT(1) FROM collection").fetchone()
+        conn.close()
+
+    before = _timeit(legacy_count, n)
+    after = _timeit(lambda: csql.count_items(path), n)
+    print(f"count_items per call: legacy {before:.1f} us, store {after:.1f} us ({before / max(after, 1e-9):.1f}x)")
+
+
+def _card_rows(n: int):
+    for i in range(n):
+        yield {'name': f'Card {i}', 'set': 'abc', 'number': str(i), 'colors': ['U'], 'types': ['Creature'],
+               'cmc': 3, 'power': 2, 'toughness': 2, 'text': 'Flying', 'source': 'bench'}
+
+
+def bench_insert_stream(tmp: Path, n: int = 100_000):
+    """Peak Python memory and time for a generator-fed import vs building the full list first."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    csql.insert_items(tmp / 'list.db', list(_card_rows(n)))
+    t_list = time.perf_counter() - t0
+    _, peak_list = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    csql.insert_stream(tmp / 'stream.db', _card_rows(n), batch_size=500)
+    t_stream = time.perf_counter() - t0
+    _, peak_stream = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"insert {n} rows: list {t_list:.2f}s peak {peak_list / 1e6:.1f} MB, "
+          f"stream {t_stream:.2f}s peak {peak_stream / 1e6:.1f} MB")
+
+
+def _legacy_row_dict(row: sqlite3.Row) -> dict:
+    # What load_all used to do per row: name lookups on sqlite3.Row and four json.loads calls
+    return {
+        'id': row['id'], 'name': row['name'], 'set': row['set_code'], 'number': row['number'],
+        'colors': json.loads(row['colors'] or '[]'), 'types': json.loads(row['types'] or '[]'),
+        'cmc': row['cmc'], 'power': row['power'], 'toughness': row['toughness'], 'text': row['text'],
+        'image_path': row['image_path'], 'image_url': row['image_url'], 'source': row['source'],
+        'back_name': row['back_name'] or '', 'back_mana_cost': row['back_mana_cost'] or '',
+        'back_colors': json.loads(row['back_colors'] or '[]'), 'back_types': json.loads(row['back_types'] or '[]'),
+        'back_oracle_text': row['back_oracle_text'] or '', 'back_power': row['back_power'],
+        'back_toughness': row['back_toughness'], 'back_image_url': row['back_image_url'] or '',
+        'quantity': int(row['quantity'] or 0), 'condition': row['condition'] or '',
+    }
+
+
+def bench_row_decode(tmp: Path, n: int = 100_000):
+    """Time and peak memory to read n rows: legacy Row+json.loads dicts vs tuple decode vs slotted records."""
+    path = tmp / 'decode.db'
+    csql.insert_stream(path, _card_rows(n))
+    conn = csql.get_store(path).conn
+
+    def legacy():
+        return [_legacy_row_dict(r) for r in conn.execute("SELECT * FROM collection ORDER BY id ASC").fetchall()]
+
+    for label, fn in (('legacy dicts', legacy), ('tuple dicts', lambda: csql.load_all(path)),
+                      ('records', lambda: csql.load_all(path, records=True))):
+        fn()  # warm the page cache and the JSON array cache
+        t0 = time.perf_counter()
+        count = len(fn())
+        dt = time.perf_counter() - t0
+        # Separate traced pass: tracemalloc itself slows allocation-heavy code severalfold
+        tracemalloc.start()
+        rows = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows
+        print(f"load {count} rows as {label}: {dt * 1000:.0f} ms, peak {peak / 1e6:.1f} MB")
+
+
+def bench_api_response(tmp: Path, n: int = 50_000, reps: int = 5):
+    """Bytes on the wire and server CPU per request for a summary of n names:
+    stdlib json as jsonify sent it vs the response pipeline's encoder and encodings."""
+    path = tmp / 'summary.db'
+    csql.insert_stream(path, ({
+        'name': f'Card {i}', 'set': 'abc', 'number': str(i), 'colors': [['W'], ['U'], ['B', 'R']][i % 3],
+        'types': ['Creature', 'Human', 'Wizard'], 'cmc': i % 8, 'power': str(i % 5), 'toughness': str(i % 6),
+        'text': 'Flying. When this creature enters, draw a card, then discard a card.',
+    } for i in range(n)))
+    t0 = time.process_time()
+    summary = csql.get_collection_summary(path)
+    print(f"summary of {len(summary)} names: query {(time.process_time() - t0) * 1000:.0f} ms CPU")
+
+    def stdlib():
+        return json.dumps(summary).encode('utf-8'), None
+
+    def pipeline(accept):
+        return lambda: response_encoding.encode(response_encoding.dumps(summary), accept)
+
+    encoder = 'orjson' if response_encoding.orjson is not None else 'json'
+    variants = [('stdlib json, identity', stdlib), (f'{encoder}, identity', pipeline(''))]
+    variants += [(f'{encoder}, {enc}', pipeline(enc)) for enc in response_encoding.available_encodings()]
+    for label, fn in variants:
+        fn()
+        t0 = time.process_time()
+        for _ in range(reps):
+            body, _enc = fn()
+        cpu = (time.process_time() - t0) / reps
+        print(f"{label:24} {len(body) / 1e6:7.2f} MB on the wire, {cpu * 1000:6.1f} ms CPU per request")
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as td:
+        bench_call_overhead(Path(td))
+        bench_insert_stream(Path(td))
+        bench_row_decode(Path(td))
+        bench_api_response(Path(td))
+        csql.close_stores()
@@ -0,0 +1,185 @@
+# core/card_catalog.py
+"""Shared card metadata catalog (card_catalog.db).
+One row per printing (name, set_code, number) holding the rules text, types, image URLs and
+back-face fields. Per-user collection DBs attach it read-only and keep only identifiers and
+quantities themselves; collection_sql fills their rows from it at read time.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable
+
+# Metadata columns moved out of per-user collection rows, in collection column names
+CATALOG_COLUMNS = (
+    'colors', 'types', 'cmc', 'power', 'toughness', 'text', 'oracle_text', 'image_url',
+    'back_name', 'back_mana_cost', 'back_colors', 'back_types', 'back_oracle_text',
+    'back_power', 'back_toughness', 'back_image_url',
+)
+KEY_COLUMNS = ('name', 'set_code', 'number')
+
+# Same columns as collection_fts, so search can rank hits from both with one weight list
+FTS_COLUMNS = ('name', 'types', 'text', 'oracle_text', 'back_name', 'back_types', 'back_oracle_text')
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    name TEXT NOT NULL COLLATE NOCASE,
+    set_code TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    number TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    colors TEXT,
+    types TEXT,
+    cmc REAL,
+    power TEXT,
+    toughness TEXT,
+    text TEXT,
+    oracle_text TEXT,
+    image_url TEXT,
+    back_name TEXT,
+    back_mana_cost TEXT,
+    back_colors TEXT,
+    back_types TEXT,
+    back_oracle_text TEXT,
+    back_power TEXT,
+    back_toughness TEXT,
+    back_image_url TEXT,
+    changed_seq INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, set_code, number)
+);
+"""
+
+# seq counts catalog changes; each row keeps the seq of its last real change (changed_seq), so a
+# collection's view of the catalog is versioned by the max over the rows it joins
+# (collection_sql.catalog_token)
+VERSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    seq INTEGER NOT NULL DEFAULT 0,
+    deleted_seq INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO catalog_state (id) VALUES (1);
+"""
+
+# A known printing keeps its values; only fields it was missing are filled in
+UPSERT_SQL = "INSERT INTO cards ({}) VALUES ({}) ON CONFLICT(name, set_code, number) DO UPDATE SET {}".format(
+    ", ".join(KEY_COLUMNS + CATALOG_COLUMNS),
+    ", ".join("?" for _ in KEY_COLUMNS + CATALOG_COLUMNS),
+    ", ".join(
+        f"{col} = CASE WHEN {col} IS NULL OR {col} IN ('', '[]') THEN excluded.{col} ELSE {col} END"
+        for col in CATALOG_COLUMNS
+    ),
+)
+
+_lock = threading.Lock()
+# catalog path -> writer connection; only used under _lock
+_writers: Dict[str, sqlite3.Connection] = {}
+
+
+def _create_fts(conn: sqlite3.Connection) -> None:
+    cols = ", ".join(FTS_COLUMNS)
+    new_vals = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_vals = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in FTS_COLUMNS)
+    try:
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5({cols}, content='cards', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')")
+    except sqlite3.OperationalError as e:
+        if 'fts5' in str(e).lower():
+            return
+        raise
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cards_fts_ai AFTER INSERT ON cards BEGIN
+            INSERT INTO cards_fts(rowid, {cols}) VALUES (new.rowid, {new_vals});
+        END""")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cards_fts_ad AFTER DELETE ON cards BEGIN
+            INSERT INTO cards_fts(cards_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_vals});
+        END""")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cards_fts_au AFTER UPDATE ON cards WHEN {changed} BEGIN
+            INSERT INTO cards_fts(cards_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_vals});
+            INSERT INTO cards_fts(rowid, {cols}) VALUES (new.rowid, {new_vals});
+        END""")
+
+
+def _create_versioning(conn: sqlite3.Connection) -> None:
+    if 'changed_seq' not in [r[1] for r in conn.execute("PRAGMA table_info(cards)")]:
+        # Catalogs created before versioning: existing rows count as unchanged since seq 0
+        conn.execute("ALTER TABLE cards ADD COLUMN changed_seq INTEGER NOT NULL DEFAULT 0")
+    conn.executescript(VERSION_SCHEMA)
+    stamp = """UPDATE catalog_state SET seq = seq + 1 WHERE id = 1;
+            UPDATE cards SET changed_seq = (SELECT seq FROM catalog_state WHERE id = 1) WHERE rowid = new.rowid;"""
+    changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in CATALOG_COLUMNS)
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS cards_version_ai AFTER INSERT ON cards BEGIN {stamp} END")
+    # The upsert rewrites every known printing it sees: only a real change is a new version
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cards_version_au AFTER UPDATE OF {", ".join(CATALOG_COLUMNS)} ON cards
+        WHEN {changed} BEGIN {stamp} END""")
+    # A deleted row leaves nothing to take a max over, so deletions version every reader
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS cards_version_ad AFTER DELETE ON cards BEGIN
+            UPDATE catalog_state SET seq = seq + 1, deleted_seq = seq + 1 WHERE id = 1;
+        END""")
+
+
+def _writer(path: Path) -> sqlite3.Connection:
+    """Open (once) the catalog's writer connection and create the schema. Call under _lock."""
+    key = str(Path(path).resolve())
+    conn = _writers.get(key)
+    if conn is None:
+        Path(key).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(key, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=5000")
+        # Rollback journal, not WAL: read-only attachments cannot rely on a shared -shm file
+        conn.execute("PRAGMA journal_mode=DELETE")
+        with conn:
+            conn.executescript(CATALOG_SCHEMA)
+            _create_fts(conn)
+            _create_versioning(conn)
+        _writers[key] = conn
+    return conn
+
+
+def ensure_catalog(path: Path) -> None:
+    """Create the catalog DB and its schema if needed."""
+    with _lock:
+        _writer(path)
+
+
+def upsert_cards(path: Path, rows: Iterable[tuple]) -> int:
+    """Insert or complete printings. Each row is KEY_COLUMNS + CATALOG_COLUMNS values.
+    Returns the number of rows written.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    with _lock:
+        conn = _writer(path)
+        with conn:
+            conn.executemany(UPSERT_SQL, rows)
+    return len(rows)
+
+
+def attach(conn: sqlite3.Connection, path: Path, schema: str = 'catalog') -> None:
+    """ATTACH the catalog read-only to a connection opened with uri=True."""
+    uri = Path(path).resolve().as_uri() + '?mode=ro'
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+
+
+def state(conn: sqlite3.Connection, schema: str = 'catalog') -> tuple:
+    """(seq, deleted_seq) of an attached catalog: seq moves with every catalog change."""
+    row = conn.execute(f"SELECT seq, deleted_seq FROM {schema}.catalog_state WHERE id = 1").fetchone()
+    return (int(row[0]), int(row[1])) if row else (0, 0)
+
+
+def has_fts(conn: sqlite3.Connection, schema: str = 'catalog') -> bool:
+    row = conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type='table' AND name='cards_fts'").fetchone()
+    return row is not None
+
+
+def close_catalogs() -> None:
+    with _lock:
+        conns = list(_writers.values())
+        _writers.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
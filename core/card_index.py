@@ -1,8 +1,11 @@
 # core/card_index.py
 from __future__ import annotations
 from pathlib import Path
-from typing import Dict, Any, Iterable, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from collections import deque
 import sqlite3
+import threading
+import time
 from .sql_utils import split_values_rows, parse_sql_values_tuple
 
 SCHEMA = {
@@ -44,6 +47,11 @@ def open_db(db_path: Path) -> sqlite3.Connection:
         """
     )
     conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_name ON cards(name);")
+    try:
+        # Added after the first release: an existing index file gets it on its next writable open
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_set_number ON cards(\"set\" COLLATE NOCASE, number);")
+    except sqlite3.OperationalError:
+        pass  # read-only file: lookups still work, by scanning
     return conn
 
 
@@ -79,6 +87,35 @@ def lookup_by_name(conn: sqlite3.Connection, name: str, limit: int = 10) -> List
     return [row_to_item(r) for r in rows]
 
 
+# Pairs per lookup query (two bound variables each), well under SQLite's variable limit
+_PAIR_CHUNK = 400
+
+
+def lookup_by_set_number(conn: sqlite3.Connection, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Exact printings by (set code, collector number); keys are (lowercased set, number).
+    All pairs are resolved in one query per chunk, joined against idx_cards_set_number.
+    """
+    out: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    keys = list(dict.fromkeys(
+        (str(set_code or '').lower(), str(number or '')) for set_code, number in pairs
+    ))
+    keys = [k for k in keys if k[0] and k[1]]
+    for i in range(0, len(keys), _PAIR_CHUNK):
+        chunk = keys[i:i + _PAIR_CHUNK]
+        values = ", ".join("(?, ?)" for _ in chunk)
+        cur = conn.execute(
+            f"WITH wanted(set_code, number) AS (VALUES {values})"
+            " SELECT w.set_code, w.number, c.name, c.\"set\", c.number, c.colors, c.types, c.cmc, c.power, c.toughness, c.text"
+            " FROM wanted w JOIN cards c ON c.\"set\" = w.set_code COLLATE NOCASE AND c.number = w.number"
+            " ORDER BY c.rowid",
+            [v for key in chunk for v in key]
+        )
+        for row in cur:
+            # Several rows per printing (e.g. both faces): keep the first inserted
+            out.setdefault((row[0], row[1]), row_to_item(row[2:]))
+    return out
+
+
 def row_to_item(row) -> Dict[str, Any]:
     name, set_code, number, colors, types, cmc, power, toughness, text = row
     return {
@@ -193,6 +230,153 @@ def _to_float_safe(v):
         return None
 
 
+# --- Build instrumentation ---
+
+_PROGRESS_REPORT_BYTES = 4 * 1024 * 1024
+
+BUILD_RUNS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS build_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    source TEXT,
+    source_bytes INTEGER,
+    bytes_read INTEGER,
+    rows INTEGER,
+    seconds REAL,
+    parse_seconds REAL,
+    write_seconds REAL,
+    rows_per_sec REAL,
+    mb_per_sec REAL
+);
+"""
+
+
+class BuildStats:
+    """Live counters for an index build.
+    Updated by the builder thread and read by get_build_progress from another thread,
+    so every access goes through a lock. Rates are computed over a sliding window
+    of recent samples so a stalled build shows its rate dropping towards zero.
+    """
+
+    def __init__(self, window: float = 10.0):
+        self._lock = threading.Lock()
+        self.window = float(window)
+        self.source = ''
+        self.total_bytes = 0
+        self.bytes_read = 0
+        self.inserted = 0
+        self.parse_seconds = 0.0
+        self.write_seconds = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.last_update: Optional[float] = None
+        self.status = 'idle'
+        self._samples: deque = deque()
+
+    def start(self, source: str, total_bytes: int) -> None:
+        now = time.time()
+        with self._lock:
+            self.source = str(source)
+            self.total_bytes = int(total_bytes or 0)
+            self.bytes_read = 0
+            self.inserted = 0
+            self.parse_seconds = 0.0
+            self.write_seconds = 0.0
+            self.started_at = now
+            self.finished_at = None
+            self.last_update = now
+            self.status = 'running'
+            self._samples.clear()
+            self._samples.append((now, 0, 0))
+
+    def update(self, bytes_read: int, inserted: int, parse_dt: float = 0.0, write_dt: float = 0.0) -> None:
+        now = time.time()
+        with self._lock:
+            self.bytes_read = int(bytes_read)
+            self.inserted = int(inserted)
+            self.parse_seconds += parse_dt
+            self.write_seconds += write_dt
+            self.last_update = now
+            self._samples.append((now, self.bytes_read, self.inserted))
+            # Keep one sample older than the window as the rate baseline
+            while len(self._samples) > 2 and self._samples[1][0] < now - self.window:
+                self._samples.popleft()
+
+    def finish(self, status: str) -> None:
+        with self._lock:
+            self.finished_at = time.time()
+            self.status = status
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self.finished_at or time.time()
+            elapsed = (now - self.started_at) if self.started_at else 0.0
+            rows_per_sec = 0.0
+            bytes_per_sec = 0.0
+            if self._samples:
+                t0, b0, r0 = self._samples[0]
+                dt = now - t0
+                if dt > 0:
+                    rows_per_sec = (self.inserted - r0) / dt
+                    bytes_per_sec = (self.bytes_read - b0) / dt
+            eta = None
+            if self.status == 'running' and bytes_per_sec > 0 and self.total_bytes:
+                eta = max(0.0, (self.total_bytes - self.bytes_read) / bytes_per_sec)
+            percent = (100.0 * self.bytes_read / self.total_bytes) if self.total_bytes else 0.0
+            return {
+                'status': self.status,
+                'source': self.source,
+                'inserted': self.inserted,
+                'bytes_read': self.bytes_read,
+                'total_bytes': self.total_bytes,
+                'percent': round(min(100.0, percent), 2),
+                'elapsed_seconds': round(elapsed, 3),
+                'parse_seconds': round(self.parse_seconds, 3),
+                'write_seconds': round(self.write_seconds, 3),
+                'rows_per_sec': round(rows_per_sec, 1),
+                'mb_per_sec': round(bytes_per_sec / (1024 * 1024), 3),
+                'eta_seconds': None if eta is None else round(eta, 1),
+                'idle_seconds': round(now - self.last_update, 3) if self.last_update else 0.0,
+            }
+
+
+def _record_build_run(conn: sqlite3.Connection, stats: BuildStats) -> None:
+    """Persist the final build summary so builds can be compared over time."""
+    snap = stats.snapshot()
+    elapsed = snap['elapsed_seconds']
+    conn.executescript(BUILD_RUNS_SCHEMA)
+    conn.execute(
+        """
+        INSERT INTO build_runs (started_at, finished_at, status, source, source_bytes, bytes_read, rows,
+                                seconds, parse_seconds, write_seconds, rows_per_sec, mb_per_sec)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+        """,
+        (
+            stats.started_at, stats.finished_at, snap['status'], snap['source'], snap['total_bytes'],
+            snap['bytes_read'], snap['inserted'], elapsed, snap['parse_seconds'], snap['write_seconds'],
+            (snap['inserted'] / elapsed) if elapsed > 0 else 0.0,
+            (snap['bytes_read'] / (1024 * 1024) / elapsed) if elapsed > 0 else 0.0,
+        )
+    )
+    conn.commit()
+
+
+def list_build_runs(conn: sqlite3.Connection, limit: int = 20) -> List[Dict[str, Any]]:
+    conn.executescript(BUILD_RUNS_SCHEMA)
+    cur = conn.execute(
+        """
+        SELECT id, started_at, finished_at, status, source, source_bytes, bytes_read, rows,
+               seconds, parse_seconds, write_seconds, rows_per_sec, mb_per_sec
+        FROM build_runs ORDER BY id DESC LIMIT ?
+        """,
+        (int(limit),)
+    )
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
 def build_index_from_sql(
     sql_path: Path,
     db_path: Path,
@@ -200,10 +384,13 @@ def build_index_from_sql(
     max_rows: Optional[int] = None,
     progress_cb: Optional[callable] = None,
     cancel_cb: Optional[callable] = None,
+    stats: Optional[BuildStats] = None,
 ) -> int:
     """
     Stream the AllPrintings.sql file and insert parsed rows into SQLite index.
     We detect INSERT INTO statements whose table name contains the hint (e.g., 'card').
+    If `stats` is given it is updated with bytes read, throughput and parse/write timings,
+    and the final summary is recorded in the index DB's build_runs table.
     Returns number of rows inserted.
     """
     sql_path = Path(sql_path)
@@ -211,6 +398,11 @@ def build_index_from_sql(
     inserted = 0
     if not sql_path.exists():
         return inserted
+    if stats is None:
+        stats = BuildStats()
+    stats.start(str(sql_path), sql_path.stat().st_size)
+    bytes_read = 0
+    last_report = 0
 
     current_cols: List[str] = []
     buffering = False
@@ -219,6 +411,7 @@ def build_index_from_sql(
 
     def flush_values(values_section: str):
         nonlocal inserted
+        t0 = time.perf_counter()
         rows = split_values_rows(values_section)
         items: List[Dict[str, Any]] = []
         for row in rows:
@@ -228,53 +421,75 @@ def build_index_from_sql(
             items.append(_extract_item(current_cols, values))
             if max_rows and (inserted + len(items)) >= max_rows:
                 break
+        t1 = time.perf_counter()
         insert_cards(conn, items)
+        t2 = time.perf_counter()
         inserted += len(items)
+        stats.update(bytes_read, inserted, parse_dt=t1 - t0, write_dt=t2 - t1)
         if progress_cb:
             try:
                 progress_cb(inserted)
             except Exception:
                 pass
 
-    with sql_path.open('r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            s = line.strip()
-            if not buffering:
-                if s.lower().startswith('insert into'):
-                    # Parse header: INSERT INTO table (col1,col2,...) VALUES
-                    low = s.lower()
-                    # find table name
-                    try:
-                        after_into = low.split('insert into', 1)[1].strip()
-                        tbl_and_cols = after_into.split('values', 1)[0].strip()
-                        # table name up to first '('
-                        tname = tbl_and_cols.split('(' ,1)[0].strip().strip('`"')
-                        if table_name_hint in tname:
-                            target_table = tname
-                            # columns inside parentheses
-                            cols_part = tbl_and_cols.split('(', 1)[1].rsplit(')', 1)[0]
-                            cols = [c.strip() for c in cols_part.split(',')]
-                            current_cols = cols
-                            buffering = True
-                            buffer_lines = []
-                            # if there's content after VALUES on same line, keep it
-                            if 'values' in low:
-                                after_values = s.lower().split('values', 1)[1]
-                                remainder = s[len(s) - len(after_values):]
-                                buffer_lines.append(remainder)
-                    except Exception:
-                        pass
-            else:
-                buffer_lines.append(s)
-                if s.endswith(';'):
-                    values_section = ' '.join(buffer_lines)[:-1]  # drop semicolon
-                    try:
-                        flush_values(values_section)
-                    except Exception:
-                        pass
-                    buffering = False
-                    buffer_lines = []
-                    if max_rows and inserted >= max_rows:
-                        break
+    status = 'failed'
+    try:
+        with sql_path.open('rb') as f:
+            for raw in f:
+                bytes_read += len(raw)
+                if cancel_cb and cancel_cb():
+                    break
+                # Keep byte progress moving through long runs of non-matching statements
+                if bytes_read - last_report >= _PROGRESS_REPORT_BYTES:
+                    last_report = bytes_read
+                    stats.update(bytes_read, inserted)
+                line = raw.decode('utf-8', errors='ignore')
+                s = line.strip()
+                if not buffering:
+                    if s.lower().startswith('insert into'):
+                        # Parse header: INSERT INTO table (col1,col2,...) VALUES
+                        low = s.lower()
+                        # find table name
+                        try:
+                            after_into = low.split('insert into', 1)[1].strip()
+                            tbl_and_cols = after_into.split('values', 1)[0].strip()
+                            # table name up to first '('
+                            tname = tbl_and_cols.split('(' ,1)[0].strip().strip('`"')
+                            if table_name_hint in tname:
+                                target_table = tname
+                                # columns inside parentheses
+                                cols_part = tbl_and_cols.split('(', 1)[1].rsplit(')', 1)[0]
+                                cols = [c.strip() for c in cols_part.split(',')]
+                                current_cols = cols
+                                buffering = True
+                                buffer_lines = []
+                                # if there's content after VALUES on same line, keep it
+                                if 'values' in low:
+                                    after_values = s.lower().split('values', 1)[1]
+                                    remainder = s[len(s) - len(after_values):]
+                                    buffer_lines.append(remainder)
+                        except Exception:
+                            pass
+                else:
+                    buffer_lines.append(s)
+                    if s.endswith(';'):
+                        values_section = ' '.join(buffer_lines)[:-1]  # drop semicolon
+                        try:
+                            flush_values(values_section)
+                        except Exception:
+                            pass
+                        buffering = False
+                        buffer_lines = []
+                        if max_rows and inserted >= max_rows:
+                            break
+        status = 'cancelled' if (cancel_cb and cancel_cb()) else 'completed'
+    finally:
+        stats.update(bytes_read, inserted)
+        stats.finish(status)
+        try:
+            _record_build_run(conn, stats)
+        except Exception:
+            pass
+        conn.close()
 
     return inserted
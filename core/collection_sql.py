@@ -1,8 +1,19 @@
 # core/collection_sql.py
+import base64
 import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Iterator
+
+from . import card_catalog
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS collection (
@@ -56,11 +67,13 @@ CREATE INDEX IF NOT EXISTS idx_deck_cards_name ON deck_cards(name);
 CREATE INDEX IF NOT EXISTS idx_decks_user ON decks(user_id);
 """
 
-def _open_conn(path: Path) -> sqlite3.Connection:
+def _open_conn(path: Path, check_same_thread: bool = True) -> sqlite3.Connection:
     p = Path(path)
     p.parent.mkdir(parents=True, exist_ok=True)
     # Increase default timeout and set busy timeout to reduce 'database is locked'
-    conn = sqlite3.connect(str(p), timeout=30)
+    # uri=True lets ATTACH take a read-only file: URI (plain paths are unaffected)
+    conn = sqlite3.connect(str(p), timeout=30, check_same_thread=check_same_thread,
+                           cached_statements=STATEMENT_CACHE_SIZE, uri=True)
     try:
         conn.execute("PRAGMA busy_timeout=5000")
     except Exception:
@@ -69,152 +82,1660 @@ def _open_conn(path: Path) -> sqlite3.Connection:
     return conn
 
 
-def ensure_db(path: Path) -> None:
-    with _open_conn(path) as conn:
-        conn.executescript(SCHEMA)
-        # Improve concurrency: enable WAL so readers don't block writers
+# -------------------- Schema migrations --------------------
+
+# Ordered registry: MIGRATIONS[i] upgrades a DB from user_version i to i + 1.
+# Append new migrations at the end; never edit or reorder ones that have shipped.
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = []
+
+
+def migration(fn: Callable[[sqlite3.Connection], None]) -> Callable[[sqlite3.Connection], None]:
+    MIGRATIONS.append(fn)
+    return fn
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: List[tuple]) -> None:
+    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}  # cid, name, type, ...
+    for name, decl in columns:
+        if name not in cols:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _execute_script(conn: sqlite3.Connection, script: str) -> None:
+    """Run a multi-statement script one statement at a time. Unlike executescript(), this does
+    not COMMIT first, so it stays inside migrate()'s transaction and rolls back with it.
+    """
+    pending = ''
+    for part in script.split(';'):
+        pending += part + ';'
+        # A ';' inside a trigger body does not end the statement: wait until it is complete
+        if sqlite3.complete_statement(pending):
+            if pending.strip(' \t\r\n;'):
+                conn.execute(pending)
+            pending = ''
+    if pending.strip(' \t\r\n;'):
+        conn.execute(pending)
+
+
+@migration
+def _m001_base_schema(conn: sqlite3.Connection) -> None:
+    """Base tables; also brings unversioned DBs created by older releases up to date."""
+    stmts = [st for st in SCHEMA.split(';') if st.strip()]
+    # Tables first: legacy tables may lack columns that the indexes below refer to
+    indexes = [st for st in stmts if 'CREATE INDEX' in st]
+    for stmt in stmts:
+        if stmt not in indexes:
+            conn.execute(stmt)
+    _add_missing_columns(conn, 'decks', [
+        ('deck_type', "TEXT NOT NULL DEFAULT ''"),
+        ('deck_colors', "TEXT NOT NULL DEFAULT '[]'"),
+        ('commander', "TEXT NOT NULL DEFAULT ''"),
+        ('user_id', "INTEGER NOT NULL DEFAULT 1"),
+    ])
+    _add_missing_columns(conn, 'collection', [
+        ('repaired', "INTEGER DEFAULT 0"),
+        ('user_id', "INTEGER NOT NULL DEFAULT 1"),
+        # Double-faced card columns
+        ('back_name', "TEXT"),
+        ('back_mana_cost', "TEXT"),
+        ('back_colors', "TEXT"),
+        ('back_types', "TEXT"),
+        ('back_oracle_text', "TEXT"),
+        ('back_power', "TEXT"),
+        ('back_toughness', "TEXT"),
+        ('back_image_url', "TEXT"),
+    ])
+    for stmt in indexes:
+        conn.execute(stmt)
+
+
+@migration
+def _m002_repair_columns(conn: sqlite3.Connection) -> None:
+    """Columns written by Api.repair_collection / start_repair_collection."""
+    _add_missing_columns(conn, 'collection', [
+        ('scryfall_id', "TEXT"),
+        ('mana_cost', "TEXT"),
+        ('oracle_text', "TEXT"),
+    ])
+
+
+# Columns identifying one holding: a distinct printing in a given condition
+HOLDING_KEY = "name COLLATE NOCASE, set_code COLLATE NOCASE, number COLLATE NOCASE, condition"
+
+
+@migration
+def _m003_holdings(conn: sqlite3.Connection) -> None:
+    """One row per printing and condition with a quantity, instead of one row per physical copy.
+    Existing duplicate rows are collapsed into the best-enriched (then oldest) row of each group.
+    """
+    _add_missing_columns(conn, 'collection', [
+        ('quantity', "INTEGER NOT NULL DEFAULT 1"),
+        ('condition', "TEXT NOT NULL DEFAULT ''"),
+    ])
+    conn.execute(f"""
+        CREATE TEMP TABLE _holding_keep AS
+        SELECT id, qty FROM (
+            SELECT id,
+                   SUM(quantity) OVER (PARTITION BY {HOLDING_KEY}) AS qty,
+                   ROW_NUMBER() OVER (PARTITION BY {HOLDING_KEY} ORDER BY COALESCE(repaired, 0) DESC, id ASC) AS rn
+            FROM collection
+        ) WHERE rn = 1
+    """)
+    conn.execute("CREATE UNIQUE INDEX temp.idx_holding_keep ON _holding_keep(id)")
+    conn.execute("DELETE FROM collection WHERE id NOT IN (SELECT id FROM _holding_keep)")
+    conn.execute("UPDATE collection SET quantity = (SELECT qty FROM _holding_keep k WHERE k.id = collection.id)")
+    conn.execute("DROP TABLE _holding_keep")
+    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_collection_holding ON collection({HOLDING_KEY})")
+
+
+@migration
+def _m004_nocase_indexes(conn: sqlite3.Connection) -> None:
+    """Indexes for case-insensitive name lookups (queries use `name = ? COLLATE NOCASE`).
+    Raw-name indexes superseded by a NOCASE index with the same leading columns are dropped.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_decks_name_nocase ON decks(name COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_deck_cards_deck_name ON deck_cards(deck_id, name COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_deck_cards_name_nocase ON deck_cards(name COLLATE NOCASE)")
+    conn.execute("DROP INDEX IF EXISTS idx_collection_name")
+    conn.execute("DROP INDEX IF EXISTS idx_collection_ident")
+    conn.execute("DROP INDEX IF EXISTS idx_deck_cards_name")
+    conn.execute("DROP INDEX IF EXISTS idx_deck_cards_deck")
+
+
+@migration
+def _m005_listing_indexes(conn: sqlite3.Connection) -> None:
+    """(sort key, id) indexes so keyset pages in list_collection are index seeks."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_collection_name_id ON collection(name COLLATE NOCASE, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_collection_set_id ON collection(set_code COLLATE NOCASE, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_collection_cmc_id ON collection(IFNULL(cmc, -1), id)")
+
+
+# Columns indexed for full-text search (the FTS table is external-content over `collection`)
+FTS_COLUMNS = ('name', 'types', 'text', 'oracle_text', 'back_name', 'back_types', 'back_oracle_text')
+
+
+@migration
+def _m006_fulltext(conn: sqlite3.Connection) -> None:
+    """FTS5 index over names, types and rules text, kept in sync by triggers.
+    SQLite builds without FTS5 skip this; search_collection then falls back to LIKE.
+    """
+    cols = ", ".join(FTS_COLUMNS)
+    new_vals = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_vals = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in FTS_COLUMNS)
+    try:
+        conn.execute(f"CREATE VIRTUAL TABLE collection_fts USING fts5({cols}, content='collection', content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+    except sqlite3.OperationalError as e:
+        if 'fts5' in str(e).lower():
+            return
+        raise
+    conn.execute(f"""
+        CREATE TRIGGER collection_fts_ai AFTER INSERT ON collection BEGIN
+            INSERT INTO collection_fts(rowid, {cols}) VALUES (new.id, {new_vals});
+        END""")
+    conn.execute(f"""
+        CREATE TRIGGER collection_fts_ad AFTER DELETE ON collection BEGIN
+            INSERT INTO collection_fts(collection_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        END""")
+    # Quantity-only updates (the common upsert case) leave the index alone
+    conn.execute(f"""
+        CREATE TRIGGER collection_fts_au AFTER UPDATE ON collection WHEN {changed} BEGIN
+            INSERT INTO collection_fts(collection_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+            INSERT INTO collection_fts(rowid, {cols}) VALUES (new.id, {new_vals});
+        END""")
+    conn.execute("INSERT INTO collection_fts(collection_fts) VALUES ('rebuild')")
+
+
+# Per-name aggregate the summary endpoint reads; one row per case-insensitive card name
+SUMMARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collection_summary (
+    name TEXT PRIMARY KEY COLLATE NOCASE,
+    qty INTEGER NOT NULL DEFAULT 0,
+    used INTEGER NOT NULL DEFAULT 0,
+    decks TEXT NOT NULL DEFAULT '[]',
+    colors TEXT NOT NULL DEFAULT '[]',
+    types TEXT NOT NULL DEFAULT '[]',
+    cmc_sum REAL NOT NULL DEFAULT 0,
+    cmc_count INTEGER NOT NULL DEFAULT 0,
+    power TEXT,
+    toughness TEXT,
+    text TEXT,
+    back_name TEXT,
+    back_mana_cost TEXT,
+    back_colors TEXT NOT NULL DEFAULT '[]',
+    back_types TEXT NOT NULL DEFAULT '[]',
+    back_oracle_text TEXT,
+    back_power TEXT,
+    back_toughness TEXT
+)
+"""
+
+# Exemplar columns (first non-empty value by id) and JSON-array columns (sorted distinct union)
+_SUMMARY_FIRST = ('power', 'toughness', 'text', 'back_name', 'back_mana_cost', 'back_oracle_text', 'back_power', 'back_toughness')
+_SUMMARY_SETS = ('colors', 'types', 'back_colors', 'back_types')
+
+
+def _json_array(expr: str) -> str:
+    return f"CASE WHEN json_valid({expr}) THEN {expr} ELSE '[]' END"
+
+
+def _summary_usage_sql(n: str) -> tuple:
+    """(used, decks) expressions for the card name expression `n`."""
+    used = f"(SELECT IFNULL(SUM(count), 0) FROM deck_cards WHERE name = {n} COLLATE NOCASE)"
+    decks = (
+        "(SELECT json_group_array(dn) FROM (SELECT DISTINCT d.name AS dn FROM deck_cards dc"
+        f" JOIN decks d ON d.id = dc.deck_id WHERE dc.name = {n} COLLATE NOCASE AND dc.count > 0 ORDER BY 1))"
+    )
+    return used, decks
+
+
+def _summary_refresh_sql(n: str) -> List[str]:
+    """Statements that recompute the summary row for the card name expression `n`
+    (`old.name` inside a trigger, `:n` when run from Python).
+    """
+    used, decks = _summary_usage_sql(n)
+    first = [
+        f"(SELECT {c} FROM collection WHERE name = {n} COLLATE NOCASE AND IFNULL({c}, '') <> '' ORDER BY id LIMIT 1)"
+        for c in _SUMMARY_FIRST
+    ]
+    sets = [
+        "(SELECT json_group_array(value) FROM (SELECT DISTINCT j.value FROM collection c,"
+        f" json_each({_json_array('c.' + c)}) j WHERE c.name = {n} COLLATE NOCASE ORDER BY 1))"
+        for c in _SUMMARY_SETS
+    ]
+    cols = ", ".join(('name', 'qty', 'used', 'decks', 'cmc_sum', 'cmc_count') + _SUMMARY_FIRST + _SUMMARY_SETS)
+    vals = ", ".join([
+        f"(SELECT name FROM collection WHERE name = {n} COLLATE NOCASE ORDER BY id LIMIT 1)",
+        "SUM(quantity)", used, decks, "IFNULL(SUM(cmc), 0)", "COUNT(cmc)",
+    ] + first + sets)
+    return [
+        f"DELETE FROM collection_summary WHERE name = {n}",
+        f"INSERT INTO collection_summary ({cols}) SELECT {vals}"
+        f" FROM collection WHERE name = {n} COLLATE NOCASE HAVING COUNT(*) > 0",
+    ]
+
+
+def _summary_add_row_sql() -> List[str]:
+    """Statements folding a newly inserted collection row (`new`) into its summary row."""
+    used, decks = _summary_usage_sql('new.name')
+    # Skip the JSON union when the new row adds nothing (empty, or the same array as the summary)
+    sets = [
+        f"{c} = CASE WHEN IFNULL(new.{c}, '[]') IN ('', '[]') OR new.{c} = {c} THEN {c}"
+        f" ELSE (SELECT json_group_array(value) FROM (SELECT value FROM json_each(collection_summary.{c})"
+        f" UNION SELECT value FROM json_each({_json_array('new.' + c)}) ORDER BY 1)) END"
+        for c in _SUMMARY_SETS
+    ]
+    first = [f"{c} = IFNULL(NULLIF({c}, ''), NULLIF(new.{c}, ''))" for c in _SUMMARY_FIRST]
+    return [
+        "INSERT INTO collection_summary (name, used, decks)"
+        f" SELECT new.name, {used}, {decks} WHERE NOT EXISTS (SELECT 1 FROM collection_summary WHERE name = new.name)",
+        "UPDATE collection_summary SET qty = qty + new.quantity, cmc_sum = cmc_sum + IFNULL(new.cmc, 0),"
+        " cmc_count = cmc_count + (new.cmc IS NOT NULL), " + ", ".join(first + sets) + " WHERE name = new.name",
+    ]
+
+
+def _summary_usage_update_sql(n: str) -> str:
+    used, decks = _summary_usage_sql(n)
+    return f"UPDATE collection_summary SET used = {used}, decks = {decks} WHERE name = {n}"
+
+
+def rebuild_collection_summary(conn: sqlite3.Connection) -> int:
+    """Recompute collection_summary from scratch. Returns the number of names."""
+    conn.execute("DELETE FROM collection_summary")
+    names = [r[0] for r in conn.execute("SELECT MIN(name) FROM collection GROUP BY name COLLATE NOCASE")]
+    _, insert_sql = _summary_refresh_sql(':n')
+    for nm in names:
+        conn.execute(insert_sql, {'n': nm})
+    return len(names)
+
+
+@migration
+def _m007_collection_summary(conn: sqlite3.Connection) -> None:
+    """Materialized per-name summary, kept current by triggers on collection, deck_cards and decks.
+    Inserts and quantity-only updates (the import/upsert paths) adjust the row in place;
+    anything else recomputes the affected names.
+    """
+    conn.execute(SUMMARY_SCHEMA)
+
+    def trigger(name: str, event: str, stmts: List[str], when: str = '') -> None:
+        body = "".join(f"    {st};\n" for st in stmts)
+        conn.execute(f"CREATE TRIGGER {name} {event}{' WHEN ' + when if when else ''} BEGIN\n{body}END")
+
+    same = " AND ".join(f"old.{c} IS new.{c}" for c in ('name', 'cmc') + _SUMMARY_FIRST + _SUMMARY_SETS)
+    trigger('collection_summary_ai', 'AFTER INSERT ON collection', _summary_add_row_sql())
+    trigger('collection_summary_ad', 'AFTER DELETE ON collection', _summary_refresh_sql('old.name'))
+    trigger('collection_summary_au_qty', 'AFTER UPDATE ON collection',
+            ["UPDATE collection_summary SET qty = qty + new.quantity - old.quantity WHERE name = new.name"], same)
+    trigger('collection_summary_au', 'AFTER UPDATE ON collection', _summary_refresh_sql('old.name'), f"NOT ({same})")
+    trigger('collection_summary_au_rename', 'AFTER UPDATE OF name ON collection', _summary_refresh_sql('new.name'),
+            "old.name <> new.name COLLATE NOCASE")
+    trigger('deck_cards_summary_ai', 'AFTER INSERT ON deck_cards', [_summary_usage_update_sql('new.name')])
+    trigger('deck_cards_summary_ad', 'AFTER DELETE ON deck_cards', [_summary_usage_update_sql('old.name')])
+    trigger('deck_cards_summary_au', 'AFTER UPDATE ON deck_cards',
+            [_summary_usage_update_sql('old.name'), _summary_usage_update_sql('new.name')])
+    # Deck renames/deletes change the `decks` list of every card in that deck
+    used, decks = _summary_usage_sql('collection_summary.name')
+    trigger('decks_summary_au', 'AFTER UPDATE OF name ON decks',
+            [f"UPDATE collection_summary SET decks = {decks} WHERE name IN (SELECT name FROM deck_cards WHERE deck_id = new.id)"])
+    trigger('decks_summary_ad', 'AFTER DELETE ON decks',
+            [f"UPDATE collection_summary SET used = {used}, decks = {decks} WHERE name IN (SELECT name FROM deck_cards WHERE deck_id = old.id)"])
+    rebuild_collection_summary(conn)
+
+
+COUNTERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS card_usage (
+    name TEXT PRIMARY KEY COLLATE NOCASE,
+    used INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS collection_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    holdings INTEGER NOT NULL DEFAULT 0,
+    copies INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO collection_totals (id) VALUES (1);
+"""
+
+_USAGE_ADD = "INSERT INTO card_usage (name, used) VALUES (new.name, new.count) ON CONFLICT(name) DO UPDATE SET used = used + excluded.used;"
+_USAGE_SUB = "UPDATE card_usage SET used = used - old.count WHERE name = old.name; DELETE FROM card_usage WHERE name = old.name AND used <= 0;"
+
+
+@migration
+def _m008_counters(conn: sqlite3.Connection) -> None:
+    """Per-name deck usage and whole-collection totals, maintained by triggers in the writing transaction."""
+    # IF NOT EXISTS: DBs that an earlier, non-atomic version of this migration left
+    # half-applied at version 7 already have some of these objects
+    _execute_script(conn, COUNTERS_SCHEMA)
+    _execute_script(conn, f"""
+        CREATE TRIGGER IF NOT EXISTS deck_cards_usage_ai AFTER INSERT ON deck_cards BEGIN {_USAGE_ADD} END;
+        CREATE TRIGGER IF NOT EXISTS deck_cards_usage_ad AFTER DELETE ON deck_cards BEGIN {_USAGE_SUB} END;
+        CREATE TRIGGER IF NOT EXISTS deck_cards_usage_au AFTER UPDATE OF name, count ON deck_cards BEGIN {_USAGE_SUB} {_USAGE_ADD} END;
+        CREATE TRIGGER IF NOT EXISTS collection_totals_ai AFTER INSERT ON collection BEGIN
+            UPDATE collection_totals SET holdings = holdings + 1, copies = copies + new.quantity WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS collection_totals_ad AFTER DELETE ON collection BEGIN
+            UPDATE collection_totals SET holdings = holdings - 1, copies = copies - old.quantity WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS collection_totals_au AFTER UPDATE OF quantity ON collection WHEN old.quantity IS NOT new.quantity BEGIN
+            UPDATE collection_totals SET copies = copies + new.quantity - old.quantity WHERE id = 1;
+        END;
+    """)
+    _rebuild_usage_and_totals(conn)
+
+
+def _rebuild_usage_and_totals(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM card_usage")
+    conn.execute(
+        "INSERT INTO card_usage (name, used) SELECT MIN(name), SUM(count) FROM deck_cards"
+        " GROUP BY name COLLATE NOCASE HAVING SUM(count) > 0"
+    )
+    conn.execute(
+        "UPDATE collection_totals SET (holdings, copies) ="
+        " (SELECT COUNT(*), IFNULL(SUM(quantity), 0) FROM collection) WHERE id = 1"
+    )
+
+
+def rebuild_counters(conn: sqlite3.Connection) -> None:
+    """Recompute every trigger-maintained aggregate (card_usage, collection_totals,
+    collection_summary) from the base tables. Caller commits.
+    """
+    _rebuild_usage_and_totals(conn)
+    rebuild_collection_summary(conn)
+
+
+# Append-only feed of row changes for incremental sync; seq never repeats (AUTOINCREMENT)
+CHANGE_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    op TEXT NOT NULL,
+    key TEXT NOT NULL,
+    at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+);
+CREATE TABLE IF NOT EXISTS change_log_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    floor INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO change_log_state (id) VALUES (1);
+"""
+
+# table -> SQL for the changed row's key; {r} is new or old
+_CHANGE_KEYS = {
+    'collection': "json_object('id', {r}.id, 'name', {r}.name, 'set', {r}.set_code, 'number', {r}.number, 'condition', {r}.condition)",
+    'decks': "json_object('id', {r}.id, 'name', {r}.name)",
+    'deck_cards': "json_object('deck_id', {r}.deck_id, 'name', {r}.name)",
+}
+
+
+@migration
+def _m009_change_log(conn: sqlite3.Connection) -> None:
+    """change_log rows for every insert, update and delete on collection, decks and deck_cards."""
+    # IF NOT EXISTS: tolerate DBs left half-applied at version 8 by the earlier executescript() version
+    _execute_script(conn, CHANGE_LOG_SCHEMA)
+    for tbl, key in _CHANGE_KEYS.items():
+        for event, op, r in (('INSERT', 'insert', 'new'), ('UPDATE', 'update', 'new'), ('DELETE', 'delete', 'old')):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {tbl}_change_log_{op} AFTER {event} ON {tbl} BEGIN
+                    INSERT INTO change_log (tbl, op, key) VALUES ('{tbl}', '{op}', {key.format(r=r)});
+                END""")
+
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate(conn: sqlite3.Connection, target: int | None = None) -> int:
+    """Apply pending migrations up to `target` (default: latest) and return the resulting version.
+    Each migration runs in its own IMMEDIATE transaction together with the user_version bump,
+    so a failure leaves the DB at the last good version and the error propagates.
+    Passing a lower `target` builds fixture DBs as older releases would have left them.
+    """
+    target = SCHEMA_VERSION if target is None else int(target)
+    version = get_schema_version(conn)
+    while version < target:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            conn.execute("PRAGMA journal_mode=WAL")
-            conn.execute("PRAGMA synchronous=NORMAL")
+            # Another process may have migrated while we waited for the write lock
+            version = get_schema_version(conn)
+            if version >= target:
+                conn.rollback()
+                break
+            MIGRATIONS[version](conn)
+            version += 1
+            conn.execute(f"PRAGMA user_version={version}")
+            conn.commit()
         except Exception:
-            pass
-        # Migration: ensure decks.deck_type exists
+            conn.rollback()
+            raise
+    return version
+
+
+# -------------------- Connection store --------------------
+
+# Prepared statements are cached per connection by SQL text, so keep hot queries as constant strings.
+STATEMENT_CACHE_SIZE = 256
+
+# Seconds a caller waits for its write to commit before giving up
+DEFAULT_WRITE_TIMEOUT = 30.0
+# Upper bound on closures folded into one group commit
+MAX_WRITE_BATCH = 64
+
+
+class DatabaseWriter:
+    """The single writer for one DB file.
+    A background thread drains a queue of mutation closures fn(conn) and group-commits them:
+    each batch runs under one BEGIN IMMEDIATE ... COMMIT, every closure inside its own savepoint
+    so a failing closure is rolled back alone. Writers never contend with each other for the
+    lock, so 'database is locked' retries are unnecessary. Closures must not commit or roll back.
+    """
+
+    def __init__(self, store: 'CollectionStore', max_batch: int = MAX_WRITE_BATCH):
+        self.store = store
+        self.max_batch = max(1, int(max_batch))
+        self._queue: queue.Queue = queue.Queue()
+        self._conn: sqlite3.Connection | None = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'jobs': 0, 'failed': 0, 'cancelled': 0, 'batches': 0, 'commit_errors': 0,
+            'max_queue_depth': 0, 'max_batch': 0,
+            'commit_ms_total': 0.0, 'commit_ms_max': 0.0, 'commit_ms_last': 0.0, 'wait_ms_total': 0.0,
+        }
+        self._thread = threading.Thread(target=self._loop, name=f"csql-writer:{store.path.name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Queue fn(conn) for the writer thread; the future resolves once its batch has committed."""
+        fut: Future = Future()
+        self._queue.put((fn, fut, time.perf_counter()))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            if depth > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth
+        return fut
+
+    def run(self, fn: Callable[[sqlite3.Connection], Any], timeout: float | None = DEFAULT_WRITE_TIMEOUT) -> Any:
+        """Run fn(conn) on the writer and return its result once committed.
+        Raises TimeoutError if it has not committed within `timeout` seconds; a closure that has
+        not started by then is dropped, one already running still commits.
+        """
+        if threading.current_thread() is self._thread:
+            # Nested write from inside a closure: join the current transaction
+            return fn(self._conn)
+        fut = self.submit(fn)
         try:
-            cols = [r[1] for r in conn.execute("PRAGMA table_info(decks)")]  # cid, name, type, ...
-            if 'deck_type' not in cols:
-                conn.execute("ALTER TABLE decks ADD COLUMN deck_type TEXT NOT NULL DEFAULT ''")
-            if 'deck_colors' not in cols:
-                conn.execute("ALTER TABLE decks ADD COLUMN deck_colors TEXT NOT NULL DEFAULT '[]'")
-            if 'commander' not in cols:
-                conn.execute("ALTER TABLE decks ADD COLUMN commander TEXT NOT NULL DEFAULT ''")
-            if 'user_id' not in cols:
-                conn.execute("ALTER TABLE decks ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_decks_user ON decks(user_id)")
-        except Exception:
-            pass
-        # Migration: ensure collection.repaired exists
+            return fut.result(timeout)
+        except TimeoutError:
+            fut.cancel()
+            raise TimeoutError(f"write to {self.store.path.name} not committed within {timeout}s") from None
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=DEFAULT_WRITE_TIMEOUT)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            st = dict(self._stats)
+        batches = st['batches'] or 1
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': st['max_queue_depth'],
+            'jobs': st['jobs'],
+            'failed': st['failed'],
+            'cancelled': st['cancelled'],
+            'batches': st['batches'],
+            'commit_errors': st['commit_errors'],
+            'avg_batch': round(st['jobs'] / batches, 2),
+            'max_batch': st['max_batch'],
+            'commit_ms_avg': round(st['commit_ms_total'] / batches, 3),
+            'commit_ms_max': round(st['commit_ms_max'], 3),
+            'commit_ms_last': round(st['commit_ms_last'], 3),
+            'wait_ms_avg': round(st['wait_ms_total'] / max(1, st['jobs']), 3),
+        }
+
+    def _loop(self) -> None:
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            try:
+                if self._conn is None:
+                    self.store.ensure_schema()
+                    # Autocommit mode: transactions are only the ones begun explicitly below
+                    self._conn = _open_conn(self.store.path, check_same_thread=False)
+                    self._conn.isolation_level = None
+                self._run_batch(batch)
+            except BaseException as e:
+                if self._conn is not None and self._conn.in_transaction:
+                    try:
+                        self._conn.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+                for _fn, fut, _t in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _run_batch(self, batch: List[tuple]) -> None:
+        conn = self._conn
+        t0 = time.perf_counter()
+        done: List[tuple] = []
+        failed = cancelled = 0
+        wait_ms = 0.0
+        conn.execute("BEGIN IMMEDIATE")
+        for fn, fut, queued_at in batch:
+            if not fut.set_running_or_notify_cancel():
+                cancelled += 1
+                continue
+            wait_ms += (time.perf_counter() - queued_at) * 1000
+            conn.execute("SAVEPOINT write_job")
+            try:
+                result = fn(conn)
+                conn.execute("RELEASE write_job")
+                done.append((fut, result))
+            except BaseException as e:
+                conn.execute("ROLLBACK TO write_job")
+                conn.execute("RELEASE write_job")
+                fut.set_exception(e)
+                failed += 1
         try:
-            cols = [r[1] for r in conn.execute("PRAGMA table_info(collection)")]
-            if 'repaired' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN repaired INTEGER DEFAULT 0")
-            if 'user_id' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_collection_user ON collection(user_id)")
-            # Add double-faced card columns
-            if 'back_name' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN back_name TEXT")
-            if 'back_mana_cost' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN back_mana_cost TEXT")
-            if 'back_colors' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN back_colors TEXT")
-            if 'back_types' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN back_types TEXT")
-            if 'back_oracle_text' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN back_oracle_text TEXT")
-            if 'back_power' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN back_power TEXT")
-            if 'back_toughness' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN back_toughness TEXT")
-            if 'back_image_url' not in cols:
-                conn.execute("ALTER TABLE collection ADD COLUMN back_image_url TEXT")
-        except Exception:
-            pass
-        conn.commit()
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for fut, _result in done:
+                fut.set_exception(e)
+            with self._stats_lock:
+                self._stats['commit_errors'] += 1
+            return
+        commit_ms = (time.perf_counter() - t0) * 1000
+        with self._stats_lock:
+            st = self._stats
+            st['batches'] += 1
+            st['jobs'] += len(done) + failed
+            st['failed'] += failed
+            st['cancelled'] += cancelled
+            st['max_batch'] = max(st['max_batch'], len(batch))
+            st['commit_ms_total'] += commit_ms
+            st['commit_ms_last'] = commit_ms
+            st['commit_ms_max'] = max(st['commit_ms_max'], commit_ms)
+            st['wait_ms_total'] += wait_ms
+        for fut, result in done:
+            fut.set_result(result)
 
 
-def _to_row_dict(row: sqlite3.Row) -> Dict[str, Any]:
-    return {
-        'name': row['name'],
-        'set': row['set_code'],
-        'number': row['number'],
-        'colors': json.loads(row['colors'] or '[]'),
-        'types': json.loads(row['types'] or '[]'),
-        'cmc': row['cmc'],
-        'power': row['power'],
-        'toughness': row['toughness'],
-        'text': row['text'],
-        'image_path': row['image_path'],
-        'image_url': row['image_url'],
-        'source': row['source'],
-        'back_name': row['back_name'] or '',
-        'back_mana_cost': row['back_mana_cost'] or '',
-        'back_colors': json.loads(row['back_colors'] or '[]'),
-        'back_types': json.loads(row['back_types'] or '[]'),
-        'back_oracle_text': row['back_oracle_text'] or '',
-        'back_power': row['back_power'],
-        'back_toughness': row['back_toughness'],
-        'back_image_url': row['back_image_url'] or '',
-    }
+class CollectionStore:
+    """Owns the connections to one collection DB.
+    Each thread gets its own persistent connection, and the schema is applied once
+    per store instead of on every call.
+    """
+
+    def __init__(self, path: Path, catalog: Path | None = None):
+        self.path = Path(path)
+        # Shared card catalog attached read-only to reader connections (see use_catalog)
+        self.catalog = Path(catalog) if catalog else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._version = -1
+        # thread ident -> (weakref to thread, connection); lets close() reach every connection
+        self._conns: Dict[int, tuple] = {}
+        self._writer: DatabaseWriter | None = None
+        self._closed = False
+        # ((catalog state, change seq), token) from the last catalog_token() computation
+        self._catalog_token: tuple | None = None
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise sqlite3.ProgrammingError(f"store for {self.path.name} is closed; get_store() reopens it")
+
+    def ensure_schema(self) -> None:
+        if self._version == SCHEMA_VERSION:
+            return
+        with self._lock:
+            if self._version == SCHEMA_VERSION:
+                return
+            conn = _open_conn(self.path)
+            try:
+                # Improve concurrency: enable WAL so readers don't block writers
+                try:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                except sqlite3.Error:
+                    pass
+                version = migrate(conn)
+            finally:
+                conn.close()
+            # A DB written by a newer release is left as-is
+            self._version = SCHEMA_VERSION if version >= SCHEMA_VERSION else version
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection for the calling thread, opened (and the schema applied) on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+        return conn
+
+    @property
+    def writer(self) -> DatabaseWriter:
+        """The DB's single writer thread, started on first use."""
+        writer = self._writer
+        if writer is None:
+            with self._lock:
+                # A closed store never starts a second writer for its file
+                self._check_open()
+                if self._writer is None:
+                    self._writer = DatabaseWriter(self)
+                writer = self._writer
+        return writer
+
+    def write(self, fn: Callable[[sqlite3.Connection], Any], timeout: float | None = DEFAULT_WRITE_TIMEOUT) -> Any:
+        """Run fn(conn) through the single writer and return its result once committed."""
+        return self.writer.run(fn, timeout)
+
+    @property
+    def rows_source(self) -> str:
+        """FROM target for holding reads on the calling thread's connection: the collection table,
+        or with a catalog attached, a view completing its rows from the catalog (aliased collection).
+        """
+        if getattr(self._local, 'conn', None) is None:
+            self._connect()
+        return self._local.rows_source
+
+    def connection_count(self) -> int:
+        """Open connections (per-thread readers plus the writer, if started)."""
+        with self._lock:
+            return len(self._conns) + (1 if self._writer is not None else 0)
+
+    def _connect(self) -> sqlite3.Connection:
+        self._check_open()
+        self.ensure_schema()
+        # Connections are only used by their owning thread; check_same_thread is off so close() can run anywhere
+        conn = _open_conn(self.path, check_same_thread=False)
+        rows_source = 'collection'
+        if self.catalog is not None and self.catalog.exists():
+            card_catalog.attach(conn, self.catalog)
+            conn.execute(_CATALOG_ROWS_VIEW)
+            rows_source = 'collection_rows AS collection'
+        self._local.rows_source = rows_source
+        t = threading.current_thread()
+        with self._lock:
+            if self._closed:
+                conn.close()
+                self._check_open()
+            self._prune_dead_threads()
+            self._conns[t.ident] = (weakref.ref(t), conn)
+        self._local.conn = conn
+        return conn
+
+    def _prune_dead_threads(self) -> None:
+        for ident, (tref, conn) in list(self._conns.items()):
+            t = tref()
+            if t is None or not t.is_alive():
+                self._conns.pop(ident, None)
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def close(self) -> None:
+        """Close every connection opened by this store and retire it: later use raises
+        ProgrammingError, and callers go through get_store() for a fresh store.
+        """
+        with self._lock:
+            self._closed = True
+            conns = list(self._conns.values())
+            self._conns.clear()
+            self._version = -1
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.stop()
+        for _tref, conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+_stores: Dict[str, CollectionStore] = {}
+_stores_lock = threading.Lock()
+# canonical DB path -> catalog path, applied whenever that DB's store is (re)created
+_catalogs: Dict[str, Path] = {}
+
+
+def _canonical(path: Path) -> str:
+    return os.path.normcase(os.path.abspath(str(path)))
+
+
+def get_store(path: Path) -> CollectionStore:
+    """Return the shared CollectionStore for a DB path (one per file per process)."""
+    key = str(path)
+    store = _stores.get(key)
+    if store is not None:
+        return store
+    with _stores_lock:
+        canon = _canonical(key)
+        store = _stores.get(canon)
+        if store is None:
+            store = CollectionStore(Path(canon), _catalogs.get(canon))
+            _stores[canon] = store
+        _stores[key] = store
+        return store
+
+
+def release_store(path: Path) -> None:
+    """Close a DB's store and drop it from the registry; the next get_store reopens it."""
+    canon = _canonical(path)
+    with _stores_lock:
+        store = _stores.get(canon)
+        if store is None:
+            return
+        for key in [k for k, v in _stores.items() if v is store]:
+            del _stores[key]
+    store.close()
+
+
+def use_catalog(path: Path, catalog: Path) -> None:
+    """Back a collection DB with the shared card catalog: its reads are completed from the
+    catalog and inserted card metadata goes to the catalog instead of the DB's own rows.
+    An already open store for the DB is reopened with the catalog attached.
+    """
+    catalog = Path(catalog)
+    card_catalog.ensure_catalog(catalog)
+    canon = _canonical(path)
+    with _stores_lock:
+        if _catalogs.get(canon) == catalog:
+            return
+        _catalogs[canon] = catalog
+    release_store(path)
+
+
+def close_stores() -> None:
+    with _stores_lock:
+        stores = set(_stores.values())
+        _stores.clear()
+    for store in stores:
+        store.close()
+
+
+def ensure_db(path: Path) -> None:
+    get_store(path).ensure_schema()
+
+
+def write(path: Path, fn: Callable[[sqlite3.Connection], Any], timeout: float | None = DEFAULT_WRITE_TIMEOUT) -> Any:
+    """Run the mutation fn(conn) on the DB's single writer; returns fn's result after commit."""
+    return get_store(path).write(fn, timeout)
+
+
+def execute_write(path: Path, sql: str, params: tuple | Dict[str, Any] = ()) -> int:
+    """Run one write statement through the single writer. Returns the affected row count."""
+    return write(path, lambda conn: conn.execute(sql, params).rowcount)
+
+
+def writer_metrics(path: Path) -> Dict[str, Any]:
+    """Queue depth, batch sizes and commit latency for the DB's writer."""
+    return get_store(path).writer.metrics()
+
+
+# -------------------- Row decoding --------------------
+
+# Every read selects exactly these columns, so each value's position is fixed here once
+# instead of being looked up by name per row; _decode_row and CollectionRecord follow this order.
+ROW_COLUMNS = (
+    'id', 'name', 'set_code', 'number', 'colors', 'types', 'cmc', 'power', 'toughness', 'text',
+    'image_path', 'image_url', 'source', 'back_name', 'back_mana_cost', 'back_colors', 'back_types',
+    'back_oracle_text', 'back_power', 'back_toughness', 'back_image_url', 'quantity', 'condition',
+)
+ROW_SELECT = ", ".join(ROW_COLUMNS)
+ROW_KEYS = tuple('set' if c == 'set_code' else c for c in ROW_COLUMNS)
+
+
+def _catalog_fill(col: str, local: str = 'c', cat: str = 'k') -> str:
+    """SQL for a metadata value: the local one if set, else the catalog's."""
+    return (f"CASE WHEN {local}.{col} IS NULL OR {local}.{col} IN ('', '[]') "
+            f"THEN COALESCE({cat}.{col}, {local}.{col}) ELSE {local}.{col} END")
+
+
+# Per-connection view over a catalog-backed DB's holdings, with the same column names as collection.
+# Rows written before the catalog existed keep their own metadata; it takes precedence.
+_CATALOG_ROWS_VIEW = (
+    "CREATE TEMP VIEW IF NOT EXISTS collection_rows AS SELECT "
+    + ", ".join(f"c.{col}" for col in ROW_COLUMNS if col not in card_catalog.CATALOG_COLUMNS)
+    + ", " + ", ".join(f"{_catalog_fill(col)} AS {col}" for col in ROW_COLUMNS if col in card_catalog.CATALOG_COLUMNS)
+    + " FROM main.collection c LEFT JOIN catalog.cards k"
+    " ON k.name = c.name AND k.set_code = c.set_code AND k.number = c.number"
+)
 
 
-def _from_item(item: Dict[str, Any]) -> Dict[str, Any]:
-    it = dict(item or {})
+@lru_cache(maxsize=4096)
+def _json_tuple(s: str) -> tuple:
+    try:
+        v = json.loads(s)
+    except ValueError:
+        return ()
+    return tuple(v) if isinstance(v, list) else ()
+
+
+def _decode_json_array(s: str | None) -> list:
+    """Decode a colors/types JSON array. The handful of distinct values repeat across
+    thousands of rows, so each is parsed once; callers get their own list.
+    """
+    if not s or s == '[]':
+        return []
+    return list(_json_tuple(s))
+
+
+def _decode_row(r: tuple) -> Dict[str, Any]:
     return {
-        'name': str(it.get('name') or ''),
-        'set_code': str(it.get('set') or ''),
-        'number': str(it.get('number') or ''),
-        'colors': json.dumps(it.get('colors') or []),
-        'types': json.dumps(it.get('types') or []),
-        'cmc': it.get('cmc'),
-        'power': None if it.get('power') is None else str(it.get('power')),
-        'toughness': None if it.get('toughness') is None else str(it.get('toughness')),
-        'text': it.get('text'),
-        'image_path': it.get('image_path'),
-        'image_url': it.get('image_url'),
-        'source': it.get('source'),
-        'back_name': str(it.get('back_name') or ''),
-        'back_mana_cost': str(it.get('back_mana_cost') or ''),
-        'back_colors': json.dumps(it.get('back_colors') or []),
-        'back_types': json.dumps(it.get('back_types') or []),
-        'back_oracle_text': str(it.get('back_oracle_text') or ''),
-        'back_power': None if it.get('back_power') is None else str(it.get('back_power')),
-        'back_toughness': None if it.get('back_toughness') is None else str(it.get('back_toughness')),
-        'back_image_url': str(it.get('back_image_url') or ''),
+        'id': r[0],
+        'name': r[1],
+        'set': r[2],
+        'number': r[3],
+        'colors': _decode_json_array(r[4]),
+        'types': _decode_json_array(r[5]),
+        'cmc': r[6],
+        'power': r[7],
+        'toughness': r[8],
+        'text': r[9],
+        'image_path': r[10],
+        'image_url': r[11],
+        'source': r[12],
+        'back_name': r[13] or '',
+        'back_mana_cost': r[14] or '',
+        'back_colors': _decode_json_array(r[15]),
+        'back_types': _decode_json_array(r[16]),
+        'back_oracle_text': r[17] or '',
+        'back_power': r[18],
+        'back_toughness': r[19],
+        'back_image_url': r[20] or '',
+        'quantity': int(r[21] or 0),
+        'condition': r[22] or '',
     }
 
 
+class CollectionRecord:
+    """Slotted alternative to the row dict (same keys as attributes), for reads that hold
+    many rows at once. to_dict() gives the dict shape; record_json_default lets json.dumps
+    serialize records directly.
+    """
+
+    __slots__ = ROW_KEYS
+
+    def __init__(self, r: tuple):
+        (self.id, self.name, self.set, self.number, colors, types, self.cmc, self.power, self.toughness,
+         self.text, self.image_path, self.image_url, self.source, back_name, back_mana_cost, back_colors,
+         back_types, back_oracle_text, self.back_power, self.back_toughness, back_image_url, quantity,
+         condition) = r
+        self.colors = _decode_json_array(colors)
+        self.types = _decode_json_array(types)
+        self.back_name = back_name or ''
+        self.back_mana_cost = back_mana_cost or ''
+        self.back_colors = _decode_json_array(back_colors)
+        self.back_types = _decode_json_array(back_types)
+        self.back_oracle_text = back_oracle_text or ''
+        self.back_image_url = back_image_url or ''
+        self.quantity = int(quantity or 0)
+        self.condition = condition or ''
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in ROW_KEYS}
+
+    def __repr__(self) -> str:
+        return f"CollectionRecord(id={self.id!r}, name={self.name!r}, quantity={self.quantity!r})"
+
+
+def record_json_default(obj: Any) -> Any:
+    """json.dumps(default=...) hook for CollectionRecord."""
+    if isinstance(obj, CollectionRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """Cursor returning plain tuples, bypassing the connection's sqlite3.Row factory."""
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur
+
+
+def _str_or_none(v: Any) -> str | None:
+    return None if v is None else str(v)
+
+
+def _json_list(v: Any) -> str:
+    return json.dumps(v) if v else '[]'
+
+
+def _quantity(v: Any) -> int:
+    try:
+        return max(1, int(v))
+    except (TypeError, ValueError):
+        return 1
+
+
+# Column order for collection inserts and the converter for each column, resolved once at import.
+_INSERT_MAPPERS: tuple = (
+    ('name', 'name', lambda v: str(v or '')),
+    ('set_code', 'set', lambda v: str(v or '')),
+    ('number', 'number', lambda v: str(v or '')),
+    ('colors', 'colors', _json_list),
+    ('types', 'types', _json_list),
+    ('cmc', 'cmc', None),
+    ('power', 'power', _str_or_none),
+    ('toughness', 'toughness', _str_or_none),
+    ('text', 'text', None),
+    ('image_path', 'image_path', None),
+    ('image_url', 'image_url', None),
+    ('source', 'source', None),
+    ('back_name', 'back_name', lambda v: str(v or '')),
+    ('back_mana_cost', 'back_mana_cost', lambda v: str(v or '')),
+    ('back_colors', 'back_colors', _json_list),
+    ('back_types', 'back_types', _json_list),
+    ('back_oracle_text', 'back_oracle_text', lambda v: str(v or '')),
+    ('back_power', 'back_power', _str_or_none),
+    ('back_toughness', 'back_toughness', _str_or_none),
+    ('back_image_url', 'back_image_url', lambda v: str(v or '')),
+    ('condition', 'condition', lambda v: str(v or '')),
+    ('quantity', 'quantity', _quantity),
+)
+
+_IDENTITY_COLUMNS = ('name', 'set_code', 'number', 'condition', 'quantity')
+
+# Adding copies of an existing holding bumps its quantity and fills in any metadata it was missing
+INSERT_SQL = "INSERT INTO collection ({}) VALUES ({}) ON CONFLICT({}) DO UPDATE SET quantity = quantity + excluded.quantity, {}".format(
+    ", ".join(col for col, _key, _fn in _INSERT_MAPPERS),
+    ", ".join("?" for _ in _INSERT_MAPPERS),
+    HOLDING_KEY,
+    ", ".join(
+        f"{col} = CASE WHEN {col} IS NULL OR {col} IN ('', '[]') THEN excluded.{col} ELSE {col} END"
+        for col, _key, _fn in _INSERT_MAPPERS if col not in _IDENTITY_COLUMNS
+    ),
+)
+
+_QUANTITY_POS = len(_INSERT_MAPPERS) - 1
+
+_MAPPER_PAIRS = tuple((key, fn) for _col, key, fn in _INSERT_MAPPERS)
+
+
+def _to_insert_row(item: Dict[str, Any]) -> tuple:
+    """Convert an item dict into an INSERT_SQL parameter tuple."""
+    get = (item or {}).get
+    return tuple(get(key) if fn is None else fn(get(key)) for key, fn in _MAPPER_PAIRS)
+
+
+_INSERT_POS = {col: i for i, (col, _key, _fn) in enumerate(_INSERT_MAPPERS)}
+# Where each catalog column comes from in an insert row (None: not an insert column)
+_CATALOG_SOURCE = tuple(_INSERT_POS.get(col) for col in card_catalog.KEY_COLUMNS + card_catalog.CATALOG_COLUMNS)
+_CATALOG_POSITIONS = frozenset(_INSERT_POS[col] for col in card_catalog.CATALOG_COLUMNS if col in _INSERT_POS)
+_EMPTY_INSERT_ROW = _to_insert_row({})
+
+
+def _split_catalog_rows(rows: List[tuple]) -> tuple:
+    """Split insert rows for a catalog-backed DB into (catalog rows, rows without metadata)."""
+    catalog_rows = []
+    local_rows = []
+    for r in rows:
+        if any(r[i] not in (None, '', '[]') for i in _CATALOG_POSITIONS):
+            catalog_rows.append(tuple(None if i is None else r[i] for i in _CATALOG_SOURCE))
+        local_rows.append(tuple(_EMPTY_INSERT_ROW[i] if i in _CATALOG_POSITIONS else v for i, v in enumerate(r)))
+    return catalog_rows, local_rows
+
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def insert_stream(path: Path, items: Iterable[Dict[str, Any]], batch_size: int = DEFAULT_BATCH_SIZE,
+                  progress_cb: Callable[[int], None] | None = None) -> int:
+    """Insert items from any iterable, `batch_size` rows per transaction.
+    Only one batch is held in memory, so generators can feed arbitrarily large imports.
+    The iterable is pulled between transactions, never while the write lock is held.
+    An item's 'quantity' (default 1) is added to the matching holding, creating it if needed.
+    For a catalog-backed DB (use_catalog) the card metadata goes to the catalog instead.
+    Calls progress_cb(copies_so_far) after each committed batch. Returns copies added.
+    """
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    it = iter(items)
+    store = get_store(path)
+    added = 0
+    while True:
+        rows = [_to_insert_row(x) for x in islice(it, batch_size)]
+        if not rows:
+            break
+        if store.catalog is not None:
+            catalog_rows, rows = _split_catalog_rows(rows)
+            card_catalog.upsert_cards(store.catalog, catalog_rows)
+        store.write(lambda conn: conn.executemany(INSERT_SQL, rows))
+        added += sum(r[_QUANTITY_POS] for r in rows)
+        if progress_cb:
+            try:
+                progress_cb(added)
+            except Exception:
+                pass
+    return added
+
+
 def insert_items(path: Path, items: List[Dict[str, Any]]) -> int:
     if not items:
         return 0
-    ensure_db(path)
-    with _open_conn(path) as conn:
-        cur = conn.cursor()
-        added = 0
-        for it in items:
-            row = _from_item(it)
-            cur.execute(
-                """
-                INSERT INTO collection
-                (name, set_code, number, colors, types, cmc, power, toughness, text, image_path, image_url, source,
-                 back_name, back_mana_cost, back_colors, back_types, back_oracle_text, back_power, back_toughness, back_image_url)
-                VALUES (:name, :set_code, :number, :colors, :types, :cmc, :power, :toughness, :text, :image_path, :image_url, :source,
-                        :back_name, :back_mana_cost, :back_colors, :back_types, :back_oracle_text, :back_power, :back_toughness, :back_image_url)
-                """,
-                row
+    return insert_stream(path, items)
+
+
+def offload_to_catalog(path: Path) -> Dict[str, Any]:
+    """Move a catalog-backed DB's own card metadata into the catalog, blank it locally and
+    VACUUM the file. Reads are unchanged: the catalog fills the blanked fields back in.
+    Returns { moved, vacuumed }.
+    """
+    store = get_store(path)
+    if store.catalog is None:
+        raise ValueError('database has no catalog (see use_catalog)')
+    cols = card_catalog.CATALOG_COLUMNS
+    has_meta = " OR ".join(f"({c} IS NOT NULL AND {c} NOT IN ('', '[]'))" for c in cols)
+    select = ", ".join(card_catalog.KEY_COLUMNS + cols)
+    rows = store.conn.execute(f"SELECT {select} FROM main.collection WHERE {has_meta}").fetchall()
+    if not rows:
+        return {'moved': 0, 'vacuumed': False}
+    card_catalog.upsert_cards(store.catalog, (tuple(r) for r in rows))
+    blank = [(c, _EMPTY_INSERT_ROW[_INSERT_POS[c]] if c in _INSERT_POS else None) for c in cols]
+    sql = "UPDATE collection SET " + ", ".join(f"{c} = ?" for c, _v in blank) + f" WHERE {has_meta}"
+    moved = store.write(lambda conn: conn.execute(sql, [v for _c, v in blank]).rowcount)
+    conn = _open_conn(store.path)
+    conn.isolation_level = None
+    try:
+        conn.execute("VACUUM")
+        # In WAL mode the rewritten pages land in the -wal file; fold them back to shrink the DB
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        vacuumed = True
+    except sqlite3.OperationalError:
+        # Busy: the space is reclaimed by a later offload or VACUUM
+        vacuumed = False
+    finally:
+        conn.close()
+    return {'moved': moved, 'vacuumed': vacuumed}
+
+
+def load_all(path: Path, records: bool = False) -> List[Any]:
+    """Every holding in id order, as row dicts or (records=True) CollectionRecord objects."""
+    store = get_store(path)
+    cur = _tuple_cursor(store.conn)
+    cur.execute(f"SELECT {ROW_SELECT} FROM {store.rows_source} ORDER BY id ASC")
+    decode = CollectionRecord if records else _decode_row
+    return [decode(r) for r in cur.fetchall()]
+
+
+DEFAULT_FETCH_SIZE = 1000
+
+
+def iter_collection(path: Path, filters: Dict[str, Any] | None = None, fetch_size: int = DEFAULT_FETCH_SIZE,
+                    records: bool = False) -> Iterator[Any]:
+    """Yield matching holdings in id order, pulling `fetch_size` rows per fetchmany, so exports
+    of any size run in constant memory. `filters` takes the same keys as list_collection.
+    The generator reads on the calling thread's connection; consume it on that thread.
+    """
+    where, params = _collection_filters(filters)
+    store = get_store(path)
+    sql = f"SELECT {ROW_SELECT} FROM {store.rows_source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+    decode = CollectionRecord if records else _decode_row
+    fetch_size = max(1, int(fetch_size or DEFAULT_FETCH_SIZE))
+    cur = _tuple_cursor(store.conn)
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            for r in rows:
+                yield decode(r)
+    finally:
+        cur.close()
+
+
+def add_item(path: Path, name: str, quantity: int = 1, **fields: Any) -> int:
+    """Add `quantity` copies of a card by name (plus optional item fields). Returns copies added."""
+    nm = str(name or '').strip()
+    if not nm or int(quantity or 0) <= 0:
+        return 0
+    return insert_stream(path, [dict(fields, name=nm, quantity=int(quantity))])
+
+
+def add_name(path: Path, name: str, **fields: Any) -> bool:
+    """Add one copy of a card by name unless the collection already holds that name (any printing,
+    any case). The check and the insert share one write transaction. Returns True if added.
+    """
+    nm = str(name or '').strip()
+    if not nm:
+        return False
+
+    def add(conn: sqlite3.Connection) -> bool:
+        if conn.execute("SELECT 1 FROM collection_summary WHERE name = ?", (nm,)).fetchone():
+            return False
+        # Runs on the writer thread, so this insert joins the current transaction
+        return add_item(path, nm, 1, **fields) > 0
+
+    return write(path, add)
+
+
+# Columns update_holding may set: the insert columns except quantity, plus the repair columns
+_HOLDING_UPDATE_COLUMNS = frozenset(_INSERT_POS) - {'quantity'} | {'scryfall_id', 'mana_cost', 'oracle_text', 'repaired'}
+_HOLDING_KEY_COLUMNS = ('name', 'set_code', 'number', 'condition')
+
+
+def _merge_holding_sql(cols: List[str]) -> str:
+    """UPDATE adding a quantity to a holding and filling in the given columns where it has none."""
+    sets = ["quantity = quantity + ?"]
+    for col in cols:
+        if col == 'repaired':
+            sets.append("repaired = MAX(IFNULL(repaired, 0), ?)")
+        else:
+            sets.append(f"{col} = CASE WHEN {col} IS NULL OR {col} IN ('', '[]') THEN ? ELSE {col} END")
+    return "UPDATE collection SET " + ", ".join(sets) + " WHERE id = ?"
+
+
+def update_holding(path: Path, rid: int, fields: Dict[str, Any]) -> str | None:
+    """Set columns (collection column names) of holding `rid`, in one transaction.
+    When a new name/set_code/number/condition is that of another holding, the row's quantity is
+    added to that holding, which keeps its own values and only gains the fields it was missing,
+    and the row is deleted. Returns 'updated', 'merged', or None if the row does not exist.
+    """
+    unknown = set(fields) - _HOLDING_UPDATE_COLUMNS
+    if unknown:
+        raise ValueError(f"not updatable: {', '.join(sorted(unknown))}")
+    cols = list(fields)
+    vals = [fields[c] for c in cols]
+
+    def apply(conn: sqlite3.Connection) -> str | None:
+        row = conn.execute("SELECT name, set_code, number, condition, quantity FROM collection WHERE id = ?", (rid,)).fetchone()
+        if row is None:
+            return None
+        key = [fields.get(c, row[i]) for i, c in enumerate(_HOLDING_KEY_COLUMNS)]
+        other = conn.execute(
+            "SELECT id FROM collection WHERE name = ? COLLATE NOCASE AND set_code = ? COLLATE NOCASE"
+            " AND number = ? COLLATE NOCASE AND condition = ? AND id <> ?",
+            (*key, rid),
+        ).fetchone()
+        if other is None:
+            if cols:
+                conn.execute("UPDATE collection SET " + ", ".join(f"{c} = ?" for c in cols) + " WHERE id = ?", (*vals, rid))
+            return 'updated'
+        meta = [c for c in cols if c not in _HOLDING_KEY_COLUMNS]
+        conn.execute("DELETE FROM collection WHERE id = ?", (rid,))
+        conn.execute(_merge_holding_sql(meta), (int(row[4] or 0), *(fields[c] for c in meta), other[0]))
+        return 'merged'
+
+    return write(path, apply)
+
+
+# -------------------- Paginated listing --------------------
+
+# sort name -> SQL expression; each is the leading column of a (expr, id) index from migration 5
+LIST_SORTS = {
+    'name': "name COLLATE NOCASE",
+    'set': "set_code COLLATE NOCASE",
+    'cmc': "IFNULL(cmc, -1)",
+    'id': "id",
+}
+MAX_PAGE_SIZE = 500
+
+
+def _escape_like(s: str) -> str:
+    return s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _collection_filters(filters: Dict[str, Any] | None) -> tuple:
+    """Build a WHERE clause for list/export filters.
+    Supported keys: name_prefix, colors (all must match), types (all must match),
+    cmc_min, cmc_max, set, source.
+    """
+    f = dict(filters or {})
+    where: List[str] = []
+    params: List[Any] = []
+    prefix = str(f.get('name_prefix') or '').strip()
+    if prefix:
+        where.append("name LIKE ? ESCAPE '\\'")
+        params.append(_escape_like(prefix) + '%')
+    for col in ('colors', 'types'):
+        for v in (f.get(col) or []):
+            where.append(f"EXISTS (SELECT 1 FROM json_each(collection.{col}) WHERE value = ?)")
+            params.append(str(v))
+    if f.get('cmc_min') is not None:
+        where.append("cmc >= ?")
+        params.append(float(f['cmc_min']))
+    if f.get('cmc_max') is not None:
+        where.append("cmc <= ?")
+        params.append(float(f['cmc_max']))
+    if f.get('set'):
+        where.append("set_code = ? COLLATE NOCASE")
+        params.append(str(f['set']))
+    if f.get('source'):
+        where.append("source = ?")
+        params.append(str(f['source']))
+    return where, params
+
+
+def _encode_cursor(sort: str, key: Any, rid: int) -> str:
+    raw = json.dumps([sort, key, rid], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        csort, key, rid = json.loads(raw.decode('utf-8'))
+    except Exception:
+        raise ValueError('invalid cursor')
+    if csort != sort:
+        raise ValueError('cursor was issued for a different sort')
+    return key, int(rid)
+
+
+def list_collection(path: Path, filters: Dict[str, Any] | None = None, sort: str = 'name',
+                    after_cursor: str | None = None, limit: int = 100, with_total: bool = False) -> Dict[str, Any]:
+    """One page of holdings ordered by (sort key, id), continuing after `after_cursor`.
+    Pages are index seeks on the sort key, so cost does not grow with cursor depth.
+    `sort` is one of LIST_SORTS, optionally prefixed with '-' for descending.
+    Totals are only given on the first page (no cursor): unfiltered, from collection_totals;
+    filtered, only with `with_total`, since counting scans every matching row (else None).
+    Returns { items, next_cursor, total, total_copies }.
+    """
+    sort = str(sort or 'name')
+    desc = sort.startswith('-')
+    expr = LIST_SORTS.get(sort.lstrip('-'))
+    if expr is None:
+        raise ValueError(f'unknown sort: {sort}')
+    limit = max(1, min(int(limit or 100), MAX_PAGE_SIZE))
+    where, params = _collection_filters(filters)
+    store = get_store(path)
+    conn = store.conn
+    source = store.rows_source
+    total = total_copies = None
+    if not after_cursor:
+        if not where:
+            total, total_copies = conn.execute("SELECT holdings, copies FROM collection_totals WHERE id = 1").fetchone()
+        elif with_total:
+            sql = f"SELECT COUNT(1), COALESCE(SUM(quantity), 0) FROM {source} WHERE " + " AND ".join(where)
+            total, total_copies = conn.execute(sql, params).fetchone()
+    page_where = list(where)
+    page_params = list(params)
+    gt, ge, direction = ('<', '<=', 'DESC') if desc else ('>', '>=', 'ASC')
+    if after_cursor:
+        key, rid = _decode_cursor(after_cursor, sort)
+        if expr == 'id':
+            page_where.append(f"id {gt} ?")
+            page_params.append(rid)
+        else:
+            # Equivalent to (expr, id) > (key, rid) but written so the planner can seek the index
+            page_where.append(f"{expr} {ge} ? AND ({expr} {gt} ? OR id {gt} ?)")
+            page_params.extend([key, key, rid])
+    sql = f"SELECT {ROW_SELECT}, {expr} AS sort_key FROM {source}"
+    if page_where:
+        sql += " WHERE " + " AND ".join(page_where)
+    sql += f" ORDER BY {expr} {direction}" + ("" if expr == 'id' else f", id {direction}") + " LIMIT ?"
+    rows = _tuple_cursor(conn).execute(sql, page_params + [limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if more and rows:
+        last = rows[-1]
+        next_cursor = _encode_cursor(sort, last[-1], last[0])
+    return {
+        'items': [_decode_row(r) for r in rows],
+        'next_cursor': next_cursor,
+        'total': total,
+        'total_copies': total_copies,
+    }
+
+
+# -------------------- Full-text search --------------------
+
+# bm25 weights per FTS_COLUMNS entry: name matches rank far above rules-text matches
+_FTS_WEIGHTS = "10.0, 3.0, 1.0, 1.0, 5.0, 2.0, 1.0"
+
+
+def _fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, each as a prefix."""
+    words = [w for w in str(query or '').replace('"', ' ').split() if w]
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='collection_fts'").fetchone()
+    return row is not None
+
+
+def search_collection(path: Path, query: str, limit: int = 50, offset: int = 0,
+                      filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+    """Ranked search over card names, types and rules text (front and back faces).
+    An empty query returns holdings by name. `filters` takes the same keys as list_collection.
+    """
+    limit = max(1, min(int(limit or 50), MAX_PAGE_SIZE))
+    offset = max(0, int(offset or 0))
+    where, params = _collection_filters(filters)
+    store = get_store(path)
+    conn = store.conn
+    source = store.rows_source
+    cur = _tuple_cursor(conn)
+    match = _fts_query(query)
+    if not match:
+        sql = f"SELECT {ROW_SELECT} FROM {source}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY name COLLATE NOCASE, id LIMIT ? OFFSET ?"
+        rows = cur.execute(sql, params + [limit, offset]).fetchall()
+    elif _has_fts(conn):
+        hits = f"SELECT rowid AS hit_id, bm25(collection_fts, {_FTS_WEIGHTS}) AS score FROM collection_fts WHERE collection_fts MATCH ?"
+        hit_params = [match]
+        if source != 'collection' and card_catalog.has_fts(conn):
+            # Rows completed from the catalog match on the catalog's text; keep each row's best score
+            hits = (
+                f"SELECT hit_id, MIN(score) AS score FROM ({hits} UNION ALL"
+                f" SELECT c.id, bm25(cards_fts, {_FTS_WEIGHTS}) FROM catalog.cards_fts"
+                " JOIN catalog.cards k ON k.rowid = cards_fts.rowid"
+                " JOIN main.collection c ON k.name = c.name AND k.set_code = c.set_code AND k.number = c.number"
+                " WHERE cards_fts MATCH ?) GROUP BY hit_id"
             )
-            added += 1
+            hit_params.append(match)
+        sql = f"SELECT {ROW_SELECT} FROM ({hits}) hits JOIN {source} ON collection.id = hits.hit_id"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY hits.score, collection.id LIMIT ? OFFSET ?"
+        rows = cur.execute(sql, hit_params + params + [limit, offset]).fetchall()
+    else:
+        # No FTS5 in this SQLite build: substring match on names, types and text
+        like = '%' + _escape_like(str(query).strip()) + '%'
+        where.append("(name LIKE ? ESCAPE '\\' OR types LIKE ? ESCAPE '\\' OR text LIKE ? ESCAPE '\\')")
+        params.extend([like, like, like])
+        sql = f"SELECT {ROW_SELECT} FROM {source} WHERE " + " AND ".join(where) + " ORDER BY name COLLATE NOCASE, id LIMIT ? OFFSET ?"
+        rows = cur.execute(sql, params + [limit, offset]).fetchall()
+    return [_decode_row(r) for r in rows]
+
+
+_SUMMARY_META = _SUMMARY_SETS + _SUMMARY_FIRST
+
+
+def get_collection_summary(path: Path) -> List[Dict[str, Any]]:
+    """Per-name aggregate of the collection (qty, available, decks, colors, avg cmc, exemplar
+    text/PT and back face), read straight from the trigger-maintained collection_summary table.
+    Names are ordered case-insensitively; avg cmc is per holding, not weighted by quantity.
+    For a catalog-backed DB, fields its own rows lack come from a catalog printing of the name.
+    """
+    store = get_store(path)
+    conn = store.conn
+    if store.rows_source == 'collection':
+        sql = "SELECT *, NULL AS catalog_cmc FROM collection_summary ORDER BY name COLLATE NOCASE"
+    else:
+        sql = (
+            "SELECT s.name, s.qty, s.used, s.decks, s.cmc_sum, s.cmc_count, k.cmc AS catalog_cmc, "
+            + ", ".join(f"{_catalog_fill(col, 's')} AS {col}" for col in _SUMMARY_META)
+            + " FROM collection_summary s LEFT JOIN catalog.cards k"
+            " ON k.rowid = (SELECT rowid FROM catalog.cards WHERE name = s.name LIMIT 1) ORDER BY s.name COLLATE NOCASE"
+        )
+    out = []
+    for r in conn.execute(sql):
+        qty = int(r['qty'] or 0)
+        out.append({
+            'name': r['name'],
+            'qty': qty,
+            'available': max(0, qty - int(r['used'] or 0)),
+            'decks': json.loads(r['decks'] or '[]'),
+            'colors': json.loads(r['colors'] or '[]'),
+            'types': json.loads(r['types'] or '[]'),
+            # Mean over the name's collection rows, one cmc per row regardless of quantity: the
+            # same per-row average the original grouping took over load_all() rows
+            'cmc': round(r['cmc_sum'] / r['cmc_count'], 1) if r['cmc_count'] else r['catalog_cmc'],
+            'power': r['power'] or '',
+            'toughness': r['toughness'] or '',
+            'text': r['text'] or '',
+            'back_name': r['back_name'] or '',
+            'back_mana_cost': r['back_mana_cost'] or '',
+            'back_colors': json.loads(r['back_colors'] or '[]'),
+            'back_types': json.loads(r['back_types'] or '[]'),
+            'back_oracle_text': r['back_oracle_text'] or '',
+            'back_power': r['back_power'] or '',
+            'back_toughness': r['back_toughness'] or '',
+        })
+    return out
+
+
+# -------------------- Change feed --------------------
+
+DEFAULT_CHANGES_LIMIT = 500
+# compact_changes keeps at least this many of the newest entries
+DEFAULT_CHANGE_LOG_KEEP = 10_000
+
+
+def _last_change_seq(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def change_token(path: Path) -> str:
+    """Version token for a DB's collection and decks: the change log's last seq, so it moves with
+    every committed change to collection, decks or deck_cards, in any process. One indexed read.
+    """
+    return str(_last_change_seq(get_store(path).conn))
+
+
+def catalog_token(path: Path) -> str:
+    """Version token for the catalog rows a catalog-backed DB reads ('' without a catalog): the
+    highest changed_seq among the printings its holdings join, so catalog writes for cards it does
+    not hold leave it unchanged. The join is redone only after the catalog or the DB changed.
+    """
+    store = get_store(path)
+    conn = store.conn
+    if store.rows_source == 'collection':
+        return ''
+    key = (card_catalog.state(conn), _last_change_seq(conn))
+    cached = store._catalog_token
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    row = conn.execute(
+        "SELECT MAX(k.changed_seq) FROM main.collection c JOIN catalog.cards k"
+        " ON k.name = c.name AND k.set_code = c.set_code AND k.number = c.number"
+    ).fetchone()
+    token = f"{row[0] or 0}.{key[0][1]}"
+    store._catalog_token = (key, token)
+    return token
+
+
+def get_changes(path: Path, since_seq: int = 0, limit: int = DEFAULT_CHANGES_LIMIT) -> Dict[str, Any]:
+    """Changes after `since_seq`, oldest first, with the current row of every collection holding
+    they touch. Clients apply the page and call again with `last_seq` while `has_more` is set.
+    `reset` means entries after since_seq were compacted away: reload everything, then continue
+    from `last_seq`.
+    Returns { changes: [{seq, table, op, key, at}], items, last_seq, has_more, reset }.
+    """
+    since_seq = max(0, int(since_seq or 0))
+    limit = max(1, min(int(limit or DEFAULT_CHANGES_LIMIT), MAX_PAGE_SIZE * 10))
+    store = get_store(path)
+    conn = store.conn
+    source = store.rows_source
+    # One read transaction so the log page and the rows it points at are the same snapshot
+    conn.execute("BEGIN")
+    try:
+        floor = conn.execute("SELECT floor FROM change_log_state WHERE id = 1").fetchone()[0]
+        if since_seq < floor:
+            return {'changes': [], 'items': [], 'last_seq': _last_change_seq(conn), 'has_more': False, 'reset': True}
+        rows = conn.execute(
+            "SELECT seq, tbl, op, key, at FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?", (since_seq, limit + 1)
+        ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        changes = [
+            {'seq': r[0], 'table': r[1], 'op': r[2], 'key': json.loads(r[3]), 'at': r[4]}
+            for r in rows
+        ]
+        ids = sorted({c['key']['id'] for c in changes if c['table'] == 'collection'})
+        items = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cur = _tuple_cursor(conn).execute(
+                f"SELECT {ROW_SELECT} FROM {source} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            items.extend(_decode_row(r) for r in cur)
+    finally:
         conn.commit()
-        return added
+    return {
+        'changes': changes,
+        'items': items,
+        'last_seq': changes[-1]['seq'] if changes else max(since_seq, floor),
+        'has_more': more,
+        'reset': False,
+    }
+
+
+def compact_changes(path: Path, keep: int = DEFAULT_CHANGE_LOG_KEEP, max_age: float | None = None) -> int:
+    """Trim the change log to its newest `keep` entries, and (with max_age) also drop entries
+    older than max_age seconds. Clients behind the trimmed range get reset=True. Returns rows deleted.
+    """
+    keep = max(0, int(keep))
+
+    def _compact(conn: sqlite3.Connection) -> int:
+        cutoff = _last_change_seq(conn) - keep
+        if max_age is not None:
+            row = conn.execute(
+                "SELECT MAX(seq) FROM change_log WHERE at < CAST(strftime('%s', 'now') AS INTEGER) - ?",
+                (float(max_age),)).fetchone()
+            cutoff = max(cutoff, int(row[0] or 0))
+        if cutoff <= 0:
+            return 0
+        deleted = conn.execute("DELETE FROM change_log WHERE seq <= ?", (cutoff,)).rowcount
+        conn.execute("UPDATE change_log_state SET floor = MAX(floor, ?) WHERE id = 1", (cutoff,))
+        return deleted
+
+    return write(path, _compact)
 
 
-def load_all(path: Path) -> List[Dict[str, Any]]:
-    ensure_db(path)
-    with _open_conn(path) as conn:
-        cur = conn.execute("SELECT * FROM collection ORDER BY id ASC")
-        return [_to_row_dict(r) for r in cur.fetchall()]
+def card_names(path: Path) -> List[str]:
+    """Distinct card names held, in case-insensitive order (a walk of collection_summary's key)."""
+    cur = _tuple_cursor(get_store(path).conn)
+    return [r[0] for r in cur.execute("SELECT name FROM collection_summary ORDER BY name")]
 
 
 def count_items(path: Path) -> int:
-    ensure_db(path)
-    with _open_conn(path) as conn:
-        cur = conn.execute("SELECT COUNT(1) FROM collection")
-        return int(cur.fetchone()[0])
+    """Total physical copies across all holdings (read from the collection_totals counter)."""
+    row = get_store(path).conn.execute("SELECT copies FROM collection_totals WHERE id = 1").fetchone()
+    return int(row[0]) if row else 0
+
+
+def used_by_name(conn: sqlite3.Connection, name: str) -> int:
+    """Copies of a card used across all decks (read from the card_usage counter)."""
+    row = conn.execute("SELECT used FROM card_usage WHERE name = ?", (str(name or '').strip(),)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def check_counters(path: Path, repair: bool = False) -> Dict[str, Any]:
+    """Compare the trigger-maintained counters with a from-scratch aggregate of the base tables.
+    Returns { ok, drift: {...} }; with repair=True, rebuilds all counters when any drift is found.
+    """
+    conn = get_store(path).conn
+    drift: Dict[str, Any] = {}
+    holdings, copies = conn.execute("SELECT holdings, copies FROM collection_totals WHERE id = 1").fetchone()
+    real = conn.execute("SELECT COUNT(*), IFNULL(SUM(quantity), 0) FROM collection").fetchone()
+    if (holdings, copies) != tuple(real):
+        drift['totals'] = {'stored': [holdings, copies], 'actual': list(real)}
+    bad_usage = conn.execute("""
+        SELECT n, SUM(s), SUM(a) FROM (
+            SELECT name COLLATE NOCASE AS n, used AS s, 0 AS a FROM card_usage
+            UNION ALL SELECT name COLLATE NOCASE, 0, count FROM deck_cards
+        ) GROUP BY n HAVING SUM(s) <> SUM(a)
+    """).fetchall()
+    if bad_usage:
+        drift['card_usage'] = {str(r[0]): {'stored': r[1], 'actual': r[2]} for r in bad_usage}
+    bad_summary = conn.execute("""
+        SELECT n FROM (
+            SELECT name COLLATE NOCASE AS n, qty AS s, 0 AS a FROM collection_summary
+            UNION ALL SELECT name COLLATE NOCASE, 0, quantity FROM collection
+        ) GROUP BY n HAVING SUM(s) <> SUM(a)
+    """).fetchall()
+    if bad_summary:
+        drift['collection_summary'] = [str(r[0]) for r in bad_summary]
+    if drift and repair:
+        write(path, rebuild_counters)
+    return {'ok': not drift, 'drift': drift, 'repaired': bool(drift and repair)}
+
+
+def count_by_name(conn: sqlite3.Connection, name: str) -> int:
+    cur = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM collection WHERE name = ? COLLATE NOCASE", (str(name or '').strip().lower(),))
+    return int(cur.fetchone()[0])
+
+
+# Temp (per-connection) tables that turn a delete request into a set-based plan
+_DELETE_TEMP_SCHEMA = (
+    """CREATE TEMP TABLE IF NOT EXISTS delete_request (
+        name TEXT NOT NULL COLLATE NOCASE,
+        set_code TEXT COLLATE NOCASE,
+        number TEXT COLLATE NOCASE,
+        count INTEGER
+    )""",
+    """CREATE TEMP TABLE IF NOT EXISTS delete_plan (
+        id INTEGER PRIMARY KEY,
+        take INTEGER NOT NULL,
+        quantity INTEGER NOT NULL
+    )""",
+    "DELETE FROM temp.delete_request",
+    "DELETE FROM temp.delete_plan",
+)
+
+# For each request, walk its matching holdings oldest-first and take copies until `count`
+# is met (NULL = all). The running SUM is ROW_NUMBER() generalised to holdings with quantity.
+_DELETE_PLAN_SQL = """
+INSERT OR IGNORE INTO temp.delete_plan (id, take, quantity)
+SELECT id, MIN(quantity, want - taken_before), quantity FROM (
+    SELECT c.id, c.quantity, IFNULL(r.count, 9223372036854775807) AS want,
+           SUM(c.quantity) OVER (PARTITION BY r.rowid ORDER BY c.id) - c.quantity AS taken_before
+    FROM temp.delete_request r
+    JOIN collection c ON c.name = r.name COLLATE NOCASE
+        AND (r.set_code IS NULL OR c.set_code = r.set_code COLLATE NOCASE)
+        AND (r.number IS NULL OR c.number = r.number COLLATE NOCASE)
+)
+WHERE taken_before < want
+"""
+
+
+def _delete_copies(conn: sqlite3.Connection, requests: Iterable[tuple] | None = None,
+                   request_sql: str | None = None, request_params: tuple = ()) -> int:
+    """Delete copies for (name, set_code, number, count) requests inside the caller's transaction.
+    set_code/number None match any printing; count None deletes every copy. Requests come either
+    from Python tuples or from an INSERT ... SELECT into temp.delete_request. Returns copies removed.
+    """
+    for st in _DELETE_TEMP_SCHEMA:
+        conn.execute(st)
+    if requests is not None:
+        conn.executemany("INSERT INTO temp.delete_request (name, set_code, number, count) VALUES (?, ?, ?, ?)", requests)
+    if request_sql:
+        conn.execute(request_sql, request_params)
+    conn.execute(_DELETE_PLAN_SQL)
+    removed = int(conn.execute("SELECT IFNULL(SUM(take), 0) FROM temp.delete_plan").fetchone()[0])
+    conn.execute("DELETE FROM collection WHERE id IN (SELECT id FROM temp.delete_plan WHERE take >= quantity)")
+    conn.execute(
+        "UPDATE collection SET quantity = quantity - (SELECT take FROM temp.delete_plan p WHERE p.id = collection.id)"
+        " WHERE id IN (SELECT id FROM temp.delete_plan WHERE take < quantity)"
+    )
+    return removed
 
 
 def delete_by_names_counts(path: Path, items: List[Dict[str, Any]]) -> int:
+    """Delete up to `count` copies per name (None = all), oldest holdings first, in one transaction."""
     if not items:
         return 0
-    ensure_db(path)
     # Build a normalized list: name -> remaining count (None = delete all)
     req: Dict[str, int | None] = {}
     for it in items:
@@ -233,23 +1754,44 @@ def delete_by_names_counts(path: Path, items: List[Dict[str, Any]]) -> int:
                 continue
     if not req:
         return 0
-    deleted = 0
-    with _open_conn(path) as conn:
-        cur = conn.cursor()
-        for nm, cnt in req.items():
-            if cnt is None:
-                cur.execute("DELETE FROM collection WHERE lower(name)=?", (nm,))
-                deleted += cur.rowcount
-            else:
-                # delete up to cnt rows deterministically (oldest first)
-                cur.execute("SELECT id FROM collection WHERE lower(name)=? ORDER BY id ASC LIMIT ?", (nm, cnt))
-                ids = [r[0] for r in cur.fetchall()]
-                if ids:
-                    qmarks = ",".join(["?"]*len(ids))
-                    cur.execute(f"DELETE FROM collection WHERE id IN ({qmarks})", ids)
-                    deleted += cur.rowcount
-        conn.commit()
-    return deleted
+    requests = [(nm, None, None, cnt) for nm, cnt in req.items()]
+    return write(path, lambda conn: _delete_copies(conn, requests))
+
+
+def delete_by_identifiers(path: Path, items: List[Dict[str, Any]]) -> int:
+    """Delete every copy matching each item's (name, set, number), in one transaction. Returns copies removed."""
+    keys = set()
+    for it in (items or []):
+        nm = str((it or {}).get('name') or '').strip()
+        if nm:
+            keys.add((nm.lower(), str((it or {}).get('set') or '').strip().lower(),
+                      str((it or {}).get('number') or '').strip().lower()))
+    if not keys:
+        return 0
+    requests = [k + (None,) for k in keys]
+    return write(path, lambda conn: _delete_copies(conn, requests))
+
+
+def delete_deck(path: Path, name: str, remove_from_collection: bool = True) -> Dict[str, int] | None:
+    """Delete a deck and, optionally, as many collection copies as the deck used, in one transaction.
+    Returns { removed_from_collection, planned }, or None if there is no such deck.
+    """
+    def apply(conn: sqlite3.Connection) -> Dict[str, int] | None:
+        did = _get_deck_id(conn, str(name or ''))
+        if did is None:
+            return None
+        planned = int(conn.execute("SELECT IFNULL(SUM(count), 0) FROM deck_cards WHERE deck_id=?", (did,)).fetchone()[0])
+        removed = 0
+        if remove_from_collection and planned:
+            removed = _delete_copies(conn, request_sql=(
+                "INSERT INTO temp.delete_request (name, count) SELECT MIN(name), SUM(count) FROM deck_cards"
+                " WHERE deck_id=? AND count > 0 GROUP BY name COLLATE NOCASE"
+            ), request_params=(did,))
+        conn.execute("DELETE FROM deck_cards WHERE deck_id=?", (did,))
+        conn.execute("DELETE FROM decks WHERE id=?", (did,))
+        return {'removed_from_collection': removed, 'planned': planned}
+
+    return write(path, apply)
 
 
 def reset_db(path: Path) -> None:
@@ -257,99 +1799,68 @@ def reset_db(path: Path) -> None:
     On Windows, deleting the SQLite file can fail if another connection is open.
     Instead, ensure schema exists and clear the collection table in-place.
     """
-    ensure_db(path)
-    with _open_conn(Path(path)) as conn:
-        conn.execute("DELETE FROM collection")
-        conn.commit()
+    execute_write(path, "DELETE FROM collection")
 
 # -------------------- Deck helpers (relational) --------------------
 
 def _get_deck_id(conn: sqlite3.Connection, name: str) -> int | None:
-    cur = conn.execute("SELECT id FROM decks WHERE lower(name)=?", (name.strip().lower(),))
+    cur = conn.execute("SELECT id FROM decks WHERE name = ? COLLATE NOCASE", (name.strip().lower(),))
     row = cur.fetchone()
     return row[0] if row else None
 
 def create_or_get_deck(path: Path, name: str) -> int:
-    ensure_db(path)
     nm = str(name or '').strip()
     if not nm:
         raise ValueError('Deck name required')
-    with _open_conn(path) as conn:
+    def apply(conn: sqlite3.Connection) -> int:
         did = _get_deck_id(conn, nm)
         if did is not None:
             return int(did)
-        cur = conn.execute("INSERT INTO decks(name) VALUES (?)", (nm,))
-        conn.commit()
-        return int(cur.lastrowid)
+        return int(conn.execute("INSERT INTO decks(name) VALUES (?)", (nm,)).lastrowid)
+
+    return write(path, apply)
 
 def save_deck(path: Path, name: str, items: List[Dict[str, Any]], deck_type: str | None = None, deck_colors: List[str] | None = None, commander: str | None = None) -> None:
     """Replace deck contents with provided items: [{name, count}]"""
-    import time
-    ensure_db(path)
     nm = str(name or '').strip()
     if not nm:
         return
-    attempts = 0
-    last_err: Exception | None = None
-    while attempts < 6:
+    # Normalize items: aggregate by lower(name)
+    agg: Dict[str, int] = {}
+    for it in (items or []):
+        nm2 = str((it or {}).get('name') or '').strip()
+        if not nm2:
+            continue
         try:
-            with _open_conn(path) as conn:
-                try:
-                    conn.execute("PRAGMA busy_timeout=15000")
-                except Exception:
-                    pass
-                # Acquire write lock early
-                try:
-                    conn.execute("BEGIN IMMEDIATE")
-                except Exception:
-                    # continue anyway; SQLite may auto-begin
-                    pass
-                did = _get_deck_id(conn, nm)
-                if did is None:
-                    cur = conn.execute("INSERT INTO decks(name) VALUES (?)", (nm,))
-                    did = int(cur.lastrowid)
-                # Update deck metadata
-                if deck_type is not None:
-                    conn.execute("UPDATE decks SET deck_type=? WHERE id=?", (str(deck_type or ''), did))
-                if deck_colors is not None:
-                    try:
-                        import json as _json
-                        conn.execute("UPDATE decks SET deck_colors=? WHERE id=?", (_json.dumps(deck_colors), did))
-                    except Exception:
-                        conn.execute("UPDATE decks SET deck_colors=? WHERE id=?", ('[]', did))
-                if commander is not None:
-                    conn.execute("UPDATE decks SET commander=? WHERE id=?", (str(commander or ''), did))
-                # Clear previous
-                conn.execute("DELETE FROM deck_cards WHERE deck_id=?", (did,))
-                # Normalize items: aggregate by lower(name)
-                agg: Dict[str, int] = {}
-                for it in (items or []):
-                    nm2 = str((it or {}).get('name') or '').strip()
-                    if not nm2:
-                        continue
-                    try:
-                        c = int((it or {}).get('count') or 0)
-                    except Exception:
-                        c = 0
-                    if c <= 0:
-                        continue
-                    key = nm2.lower()
-                    agg[key] = agg.get(key, 0) + c
-                rows = [(did, k, v) for k, v in agg.items()]
-                if rows:
-                    conn.executemany("INSERT INTO deck_cards(deck_id,name,count) VALUES (?,?,?)", rows)
-                conn.commit()
-                return
-        except Exception as e:
-            msg = str(e).lower()
-            last_err = e
-            if 'locked' in msg or 'busy' in msg:
-                attempts += 1
-                time.sleep(0.2 * attempts)
-                continue
-            raise
-    # Exhausted retries
-    raise last_err if last_err else RuntimeError('failed to save deck')
+            c = int((it or {}).get('count') or 0)
+        except Exception:
+            c = 0
+        if c <= 0:
+            continue
+        key = nm2.lower()
+        agg[key] = agg.get(key, 0) + c
+
+    def apply(conn: sqlite3.Connection) -> None:
+        did = _get_deck_id(conn, nm)
+        if did is None:
+            did = int(conn.execute("INSERT INTO decks(name) VALUES (?)", (nm,)).lastrowid)
+        # Update deck metadata
+        if deck_type is not None:
+            conn.execute("UPDATE decks SET deck_type=? WHERE id=?", (str(deck_type or ''), did))
+        if deck_colors is not None:
+            try:
+                conn.execute("UPDATE decks SET deck_colors=? WHERE id=?", (json.dumps(deck_colors), did))
+            except Exception:
+                conn.execute("UPDATE decks SET deck_colors=? WHERE id=?", ('[]', did))
+        if commander is not None:
+            conn.execute("UPDATE decks SET commander=? WHERE id=?", (str(commander or ''), did))
+        # Clear previous
+        conn.execute("DELETE FROM deck_cards WHERE deck_id=?", (did,))
+        rows = [(did, k, v) for k, v in agg.items()]
+        if rows:
+            conn.executemany("INSERT INTO deck_cards(deck_id,name,count) VALUES (?,?,?)", rows)
+
+    write(path, apply)
 
 def _is_basic_land(card_name: str) -> bool:
     """Check if a card is a basic land (unlimited in Commander)."""
@@ -361,12 +1872,13 @@ def _is_basic_land(card_name: str) -> bool:
     return str(card_name or '').strip().lower() in basic_lands
 
 def add_to_deck(path: Path, deck_name: str, card_name: str, count: int = 1) -> None:
-    ensure_db(path)
     nm = str(deck_name or '').strip()
     cn = str(card_name or '').strip()
     if not nm or not cn or (count or 0) <= 0:
         return
-    with _open_conn(path) as conn:
+
+    def apply(conn: sqlite3.Connection) -> None:
+        add = int(count)
         did = _get_deck_id(conn, nm)
         if did is None:
             cur = conn.execute("INSERT INTO decks(name) VALUES (?)", (nm,))
@@ -377,7 +1889,7 @@ def add_to_deck(path: Path, deck_name: str, card_name: str, count: int = 1) -> N
         is_commander = deck_info and str(deck_info[0] or '').lower() in ['commander', 'edh']
         
         # Get current count
-        cur = conn.execute("SELECT count FROM deck_cards WHERE deck_id=? AND lower(name)=?", (did, cn.lower()))
+        cur = conn.execute("SELECT count FROM deck_cards WHERE deck_id=? AND name = ? COLLATE NOCASE", (did, cn.lower()))
         row = cur.fetchone()
         current_count = int(row[0]) if row else 0
         
@@ -388,63 +1900,202 @@ def add_to_deck(path: Path, deck_name: str, card_name: str, count: int = 1) -> N
                 # Already at limit, don't add more
                 return
             # Limit addition to reach exactly 1
-            count = min(int(count), 1 - current_count)
-            if count <= 0:
+            add = min(add, 1 - current_count)
+            if add <= 0:
                 return
         
         # Update or insert
         if row:
-            newc = current_count + int(count)
-            conn.execute("UPDATE deck_cards SET count=? WHERE deck_id=? AND lower(name)=?", (newc, did, cn.lower()))
+            newc = current_count + add
+            conn.execute("UPDATE deck_cards SET count=? WHERE deck_id=? AND name = ? COLLATE NOCASE", (newc, did, cn.lower()))
         else:
-            conn.execute("INSERT INTO deck_cards(deck_id,name,count) VALUES (?,?,?)", (did, cn, int(count)))
-        conn.commit()
+            conn.execute("INSERT INTO deck_cards(deck_id,name,count) VALUES (?,?,?)", (did, cn, add))
+
+    write(path, apply)
 
 def remove_from_deck(path: Path, deck_name: str, card_name: str, count: int = 1) -> None:
-    ensure_db(path)
     nm = str(deck_name or '').strip()
     cn = str(card_name or '').strip()
     if not nm or not cn or (count or 0) <= 0:
         return
-    with _open_conn(path) as conn:
+
+    def apply(conn: sqlite3.Connection) -> None:
         did = _get_deck_id(conn, nm)
         if did is None:
             return
-        cur = conn.execute("SELECT count FROM deck_cards WHERE deck_id=? AND lower(name)=?", (did, cn.lower()))
+        cur = conn.execute("SELECT count FROM deck_cards WHERE deck_id=? AND name = ? COLLATE NOCASE", (did, cn.lower()))
         row = cur.fetchone()
         if not row:
             return
         curc = int(row[0]) - int(count)
         if curc > 0:
-            conn.execute("UPDATE deck_cards SET count=? WHERE deck_id=? AND lower(name)=?", (curc, did, cn.lower()))
+            conn.execute("UPDATE deck_cards SET count=? WHERE deck_id=? AND name = ? COLLATE NOCASE", (curc, did, cn.lower()))
         else:
-            conn.execute("DELETE FROM deck_cards WHERE deck_id=? AND lower(name)=?", (did, cn.lower()))
-        conn.commit()
+            conn.execute("DELETE FROM deck_cards WHERE deck_id=? AND name = ? COLLATE NOCASE", (did, cn.lower()))
+
+    write(path, apply)
+
+def _deck_change_counts(items: Iterable[Dict[str, Any]] | None) -> Dict[str, tuple]:
+    """Aggregate [{name, count}] into lower(name) -> (display name, total count), dropping blanks."""
+    out: Dict[str, tuple] = {}
+    for it in (items or []):
+        nm = str((it or {}).get('name') or '').strip()
+        try:
+            cnt = int((it or {}).get('count') or 0)
+        except (TypeError, ValueError):
+            cnt = 0
+        if nm and cnt > 0:
+            prev = out.get(nm.lower())
+            out[nm.lower()] = (prev[0] if prev else nm, (prev[1] if prev else 0) + cnt)
+    return out
+
+
+def apply_deck_changes(path: Path, deck: str, adds: List[Dict[str, Any]] | None = None,
+                       removes: List[Dict[str, Any]] | None = None, metadata: Dict[str, Any] | None = None,
+                       ensure_inventory: bool = True) -> Dict[str, Any]:
+    """Apply a whole deck edit in one transaction and return the resulting deck.
+    `adds`/`removes` are [{name, count}]; `metadata` may set type, colors and commander.
+    The deck is created if missing. Commander/EDH decks reject any non-basic add that would
+    exceed one copy, and then nothing is applied. With ensure_inventory, the collection is
+    topped up so it owns at least as many copies of each added card as all decks use.
+    Returns { ok: True, deck } or { ok: False, error, violations }.
+    """
+    name = str(deck or '').strip()
+    if not name:
+        raise ValueError('Deck name required')
+    add_counts = _deck_change_counts(adds)
+    remove_counts = _deck_change_counts(removes)
+    meta = metadata or {}
+
+    def apply(conn: sqlite3.Connection) -> Dict[str, Any]:
+        row = conn.execute("SELECT id, deck_type FROM decks WHERE name = ? COLLATE NOCASE", (name,)).fetchone()
+        if row is None and not add_counts and not any(v is not None for v in meta.values()):
+            return {'ok': True, 'deck': None}
+        if row is None:
+            did, deck_type = int(conn.execute("INSERT INTO decks(name) VALUES (?)", (name,)).lastrowid), ''
+        else:
+            did, deck_type = int(row[0]), row[1]
+        if meta.get('type') is not None:
+            deck_type = str(meta.get('type') or '')
+        current = {str(r[0]).lower(): (r[0], int(r[1])) for r in conn.execute("SELECT name, count FROM deck_cards WHERE deck_id=?", (did,))}
+
+        if str(deck_type or '').lower() in ('commander', 'edh'):
+            violations = []
+            for key, (nm, cnt) in add_counts.items():
+                if _is_basic_land(nm):
+                    continue
+                have = current.get(key, (nm, 0))[1] - remove_counts.get(key, (nm, 0))[1]
+                if have >= 1:
+                    violations.append(f"'{nm}' already in deck (max 1 copy allowed in Commander)")
+                elif have + cnt > 1:
+                    violations.append(f"Cannot add {cnt} copies of '{nm}' (max 1 copy allowed in Commander)")
+            if violations:
+                return {'ok': False, 'error': 'commander_rules_violation', 'violations': violations}
+
+        sets, args = [], []
+        if meta.get('type') is not None:
+            sets.append('deck_type=?'); args.append(deck_type)
+        if meta.get('colors') is not None:
+            sets.append('deck_colors=?'); args.append(json.dumps(list(meta.get('colors') or [])))
+        if meta.get('commander') is not None:
+            sets.append('commander=?'); args.append(str(meta.get('commander') or ''))
+        if sets:
+            conn.execute(f"UPDATE decks SET {', '.join(sets)} WHERE id=?", (*args, did))
+
+        updates, inserts, deletes = [], [], []
+        for key in set(add_counts) | set(remove_counts):
+            if key in current:
+                stored_name, have = current[key]
+            else:
+                stored_name, have = (add_counts.get(key) or remove_counts[key])[0], 0
+            newc = have + add_counts.get(key, ('', 0))[1] - remove_counts.get(key, ('', 0))[1]
+            if key in current:
+                if newc > 0:
+                    updates.append((newc, did, stored_name))
+                else:
+                    deletes.append((did, stored_name))
+            elif newc > 0:
+                inserts.append((did, stored_name, newc))
+        if deletes:
+            conn.executemany("DELETE FROM deck_cards WHERE deck_id=? AND name=?", deletes)
+        if updates:
+            conn.executemany("UPDATE deck_cards SET count=? WHERE deck_id=? AND name=?", updates)
+        if inserts:
+            conn.executemany("INSERT INTO deck_cards(deck_id,name,count) VALUES (?,?,?)", inserts)
+
+        if ensure_inventory and add_counts:
+            missing = []
+            for key, (nm, _cnt) in add_counts.items():
+                short = used_by_name(conn, nm) - count_by_name(conn, nm)
+                if short > 0:
+                    missing.append(_to_insert_row({'name': nm, 'quantity': short, 'source': 'deck_add'}))
+            if missing:
+                conn.executemany(INSERT_SQL, missing)
+
+        out = _deck_header(conn.execute(_DECK_HEADER_SQL + " WHERE d.id = ?", (did,)).fetchone())
+        out['cards'] = [
+            {'name': r[0], 'count': int(r[1])}
+            for r in conn.execute("SELECT name, count FROM deck_cards WHERE deck_id=? ORDER BY name COLLATE NOCASE", (did,))
+        ]
+        return {'ok': True, 'deck': out}
+
+    return write(path, apply)
+
+
+_DECK_HEADER_SQL = (
+    "SELECT d.id, d.name, d.deck_type, d.deck_colors, d.commander,"
+    " (SELECT IFNULL(SUM(count), 0) FROM deck_cards WHERE deck_id = d.id) AS card_count FROM decks d"
+)
+
+
+def _deck_header(row: sqlite3.Row) -> Dict[str, Any]:
+    try:
+        cols = json.loads(row['deck_colors'] or '[]')
+    except Exception:
+        cols = []
+    return {'name': row['name'], 'type': row['deck_type'] or '', 'colors': cols,
+            'commander': row['commander'] or '', 'card_count': int(row['card_count'] or 0)}
+
+
+def list_deck_headers(path: Path) -> List[Dict[str, Any]]:
+    """Deck name, type, colors, commander and card count, without card lists (one query)."""
+    conn = get_store(path).conn
+    return [_deck_header(r) for r in conn.execute(_DECK_HEADER_SQL + " ORDER BY d.name ASC")]
+
+
+def get_deck(path: Path, name: str) -> Dict[str, Any] | None:
+    """A single deck with its cards, or None if there is no deck by that name."""
+    conn = get_store(path).conn
+    row = conn.execute(_DECK_HEADER_SQL + " WHERE d.name = ? COLLATE NOCASE", (str(name or '').strip(),)).fetchone()
+    if row is None:
+        return None
+    deck = _deck_header(row)
+    deck['cards'] = [
+        {'name': r[0], 'count': int(r[1])}
+        for r in conn.execute("SELECT name, count FROM deck_cards WHERE deck_id=? ORDER BY name COLLATE NOCASE", (row['id'],))
+    ]
+    return deck
+
 
 def get_decks(path: Path) -> List[Dict[str, Any]]:
-    ensure_db(path)
-    with _open_conn(path) as conn:
-        decks = []
-        for d in conn.execute("SELECT id, name, deck_type, deck_colors, commander FROM decks ORDER BY name ASC"):
-            did, nm, dtype, dcols, cmdr = d[0], d[1], d[2], d[3], d[4]
-            cards = []
-            for r in conn.execute("SELECT name, count FROM deck_cards WHERE deck_id=? ORDER BY name ASC", (did,)):
-                cards.append({'name': r[0], 'count': int(r[1])})
-            try:
-                import json as _json
-                cols = _json.loads(dcols or '[]')
-            except Exception:
-                cols = []
-            decks.append({'name': nm, 'type': dtype or '', 'colors': cols, 'commander': cmdr or '', 'cards': cards})
-        return decks
+    """All decks with their card lists: one header query plus one ordered pass over deck_cards."""
+    conn = get_store(path).conn
+    by_id: Dict[int, Dict[str, Any]] = {}
+    decks = []
+    for r in conn.execute(_DECK_HEADER_SQL + " ORDER BY d.name ASC"):
+        deck = _deck_header(r)
+        deck['cards'] = []
+        by_id[r['id']] = deck
+        decks.append(deck)
+    for did, nm, cnt in conn.execute("SELECT deck_id, name, count FROM deck_cards ORDER BY deck_id, name COLLATE NOCASE"):
+        deck = by_id.get(did)
+        if deck is not None:
+            deck['cards'].append({'name': nm, 'count': int(cnt)})
+    return decks
+
 
 def usage_counts_by_name(path: Path) -> Dict[str, int]:
     """Return a mapping of lower(name) -> total count used across all decks"""
-    ensure_db(path)
-    with _open_conn(path) as conn:
-        out: Dict[str, int] = {}
-        for r in conn.execute("SELECT lower(name) as n, SUM(count) FROM deck_cards GROUP BY lower(name)"):
-            if r and r[0]:
-                out[str(r[0])] = int(r[1] or 0)
-        return out
+    conn = get_store(path).conn
+    return {str(r[0]).lower(): int(r[1] or 0) for r in conn.execute("SELECT name, used FROM card_usage") if r[0]}
 
@@ -0,0 +1,193 @@
+# core/precon_catalog.py
+"""In-memory catalog of the preconstructed decks in decklist_cards.db.
+The deck list and card counts are read in one pass and kept until the file changes;
+searches run against an in-memory FTS5 trigram index over deck names and types, and
+a card name -> decks inverted index answers which precons contain a card.
+"""
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+_DECKS_SQL = """
+SELECT d.deck_id, d.deck_name, d.deck_type, IFNULL(c.card_count, 0)
+FROM decks d
+LEFT JOIN (SELECT deck_id, SUM(COALESCE(quantity, 1)) AS card_count FROM cards GROUP BY deck_id) c
+    ON c.deck_id = d.deck_id
+"""
+
+_CARDS_SQL = "SELECT name, deck_id, SUM(COALESCE(quantity, 1)) FROM cards GROUP BY deck_id, name"
+
+
+def _has_deck_id_index(conn: sqlite3.Connection) -> bool:
+    for idx in conn.execute("PRAGMA index_list(cards)").fetchall():
+        first = conn.execute(f"PRAGMA index_info({idx[1]!r})").fetchone()  # seqno, cid, name
+        if first is not None and first[2] == 'deck_id':
+            return True
+    return False
+
+
+def ensure_deck_id_index(path: Path) -> bool:
+    """Make sure cards(deck_id) is indexed, creating the index if the file is writable.
+    Returns True if the index exists afterwards.
+    """
+    conn = sqlite3.connect(str(path), timeout=30)
+    try:
+        if _has_deck_id_index(conn):
+            return True
+        try:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck_id ON cards(deck_id)")
+            conn.commit()
+            return True
+        except sqlite3.Error:
+            return False
+    finally:
+        conn.close()
+
+
+def normalize_card_name(name: str) -> str:
+    """Lookup key for a card name: accents stripped, case-folded, whitespace collapsed."""
+    s = unicodedata.normalize('NFKD', str(name or ''))
+    s = ''.join(ch for ch in s if not unicodedata.combining(ch))
+    return ' '.join(s.casefold().split())
+
+
+def _match_query(words: List[str]) -> str:
+    return " AND ".join('"' + w.replace('"', '""') + '"' for w in words)
+
+
+class PreconCatalog:
+    """Deck list of decklist_cards.db with card counts, reloaded when the file's mtime or size
+    changes. search() keeps the old semantics: every word must occur in 'name type',
+    case-insensitively.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._decks: List[Dict[str, Any]] = []
+        self._fts: sqlite3.Connection | None = None
+        # normalized card name -> hits sorted by deck name; built on first lookup after a load
+        self._by_card: Dict[str, Tuple[Dict[str, Any], ...]] | None = None
+        self.indexed = False
+
+    def _file_stamp(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self) -> None:
+        """Read decks and counts, and rebuild the search index. Call under _lock."""
+        self.indexed = ensure_deck_id_index(self.path)
+        # The index may just have been created: stamp the file as it is after that write
+        stamp = self._file_stamp()
+        conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+        try:
+            rows = conn.execute(_DECKS_SQL).fetchall()
+        finally:
+            conn.close()
+        decks = [
+            {'deck_id': r[0], 'deck_name': str(r[1] or ''), 'deck_type': r[2] or '', 'card_count': int(r[3] or 0)}
+            for r in rows
+        ]
+        decks.sort(key=lambda d: d['deck_name'])
+        fts = sqlite3.connect(':memory:', check_same_thread=False)
+        try:
+            fts.execute("CREATE VIRTUAL TABLE decks_fts USING fts5(deck_name, deck_type, tokenize='trigram')")
+            fts.executemany(
+                "INSERT INTO decks_fts(rowid, deck_name, deck_type) VALUES (?, ?, ?)",
+                ((i, d['deck_name'], d['deck_type']) for i, d in enumerate(decks)),
+            )
+        except sqlite3.OperationalError:
+            # No FTS5 trigram tokenizer (SQLite < 3.34): search() filters the cached list instead
+            fts.close()
+            fts = None
+        if self._fts is not None:
+            self._fts.close()
+        self._decks, self._fts, self._stamp = decks, fts, stamp
+        self._by_card = None
+
+    def _card_index(self) -> Dict[str, Tuple[Dict[str, Any], ...]]:
+        """Build the card -> decks index from one grouped scan of cards. Call under _lock.
+        Hits are materialized and sorted here so lookups only do a dict get.
+        Double-faced 'Front // Back' names are also indexed under each face.
+        """
+        if self._by_card is None:
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+            try:
+                rows = conn.execute(_CARDS_SQL).fetchall()
+            finally:
+                conn.close()
+            deck_by_id = {d['deck_id']: d for d in self._decks}
+            keys_by_name: Dict[str, tuple] = {}
+            index: Dict[str, list] = {}
+            for name, deck_id, qty in rows:
+                d = deck_by_id.get(deck_id)
+                if d is None:
+                    continue
+                keys = keys_by_name.get(name)
+                if keys is None:
+                    full = normalize_card_name(name)
+                    faces = [k.strip() for k in full.split('//') if k.strip()] if '//' in full else []
+                    keys = keys_by_name[name] = tuple(dict.fromkeys([full] + faces))
+                hit = {'deck_id': deck_id, 'deck_name': d['deck_name'], 'deck_type': d['deck_type'], 'quantity': int(qty or 0)}
+                for key in keys:
+                    index.setdefault(key, []).append(hit)
+            self._by_card = {k: tuple(sorted(v, key=lambda h: h['deck_name'])) for k, v in index.items()}
+        return self._by_card
+
+    def _current(self) -> bool:
+        """Reload if the file changed. Returns False if there is no file. Call under _lock."""
+        stamp = self._file_stamp()
+        if stamp is None:
+            self._decks, self._stamp = [], None
+            return False
+        if stamp != self._stamp:
+            self._load()
+        return True
+
+    def decks(self) -> List[Dict[str, Any]]:
+        """Every deck as { deck_id, deck_name, deck_type, card_count }, by name. Treat as read-only."""
+        with self._lock:
+            self._current()
+            return list(self._decks)
+
+    def search(self, query: str | None = None) -> List[Dict[str, Any]]:
+        """Decks whose 'name type' contains every word of query (case-insensitive), by name."""
+        words = [w for w in str(query or '').strip().lower().split() if w]
+        with self._lock:
+            if not self._current():
+                return []
+            if not words:
+                return list(self._decks)
+            decks = self._decks
+            # Trigrams need 3+ characters; shorter words are checked on the candidates
+            long_words = [w for w in words if len(w) >= 3]
+            if self._fts is not None and long_words:
+                ids = self._fts.execute(
+                    "SELECT rowid FROM decks_fts WHERE decks_fts MATCH ? ORDER BY rowid", (_match_query(long_words),)
+                ).fetchall()
+                candidates = [decks[i] for (i,) in ids]
+                words = [w for w in words if len(w) < 3]
+            else:
+                candidates = decks
+        if not words:
+            return candidates
+        return [d for d in candidates if all(w in (d['deck_name'] + ' ' + d['deck_type']).lower() for w in words)]
+
+    def find_card(self, names: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """For each name, the precons containing it as [{ deck_id, deck_name, deck_type, quantity }]
+        ordered by deck name. Names match case- and accent-insensitively, and a single face of
+        a double-faced card matches too.
+        """
+        names = list(names)
+        with self._lock:
+            if not self._current():
+                return {str(n): [] for n in names}
+            index = self._card_index()
+        # The hit dicts are shared with the index: treat them as read-only
+        return {str(n): list(index.get(normalize_card_name(n), ())) for n in names}
@@ -0,0 +1,89 @@
+# core/response_encoding.py
+"""JSON serialization and Content-Encoding negotiation for API responses.
+Uses orjson and brotli when they are installed, stdlib json and gzip otherwise.
+"""
+import gzip
+import json
+from typing import Any, Callable, Dict, Tuple
+
+try:
+    import orjson  # optional
+except Exception:
+    orjson = None
+
+try:
+    import brotli  # optional
+except Exception:
+    brotli = None
+
+# Bodies smaller than this go out uncompressed: the header and CPU cost outweigh the savings
+DEFAULT_MIN_SIZE = 1024
+# Server preference when the client accepts several encodings
+DEFAULT_ENCODINGS = ('br', 'gzip')
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 5
+
+
+def dumps(obj: Any, default: Callable[[Any], Any] | None = None) -> bytes:
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib encoder handles those
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def available_encodings() -> Tuple[str, ...]:
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    """'gzip;q=0.8, br' -> {'gzip': 0.8, 'br': 1.0}"""
+    out: Dict[str, float] = {}
+    for part in str(header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[coding] = q
+    return out
+
+
+def negotiate(accept_encoding: str, encodings: Tuple[str, ...] = DEFAULT_ENCODINGS) -> str | None:
+    """The first of `encodings` that is installed and that the client accepts, or None."""
+    accepted = _parse_accept_encoding(accept_encoding)
+    usable = available_encodings()
+    for coding in encodings:
+        if coding in usable and accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = DEFAULT_GZIP_LEVEL,
+             brotli_quality: int = DEFAULT_BROTLI_QUALITY) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=brotli_quality)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical bodies
+        return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+    raise ValueError(f'unsupported encoding: {encoding}')
+
+
+def encode(body: bytes, accept_encoding: str, encodings: Tuple[str, ...] = DEFAULT_ENCODINGS,
+           min_size: int = DEFAULT_MIN_SIZE, gzip_level: int = DEFAULT_GZIP_LEVEL,
+           brotli_quality: int = DEFAULT_BROTLI_QUALITY) -> Tuple[bytes, str | None]:
+    """Compress `body` for the client's Accept-Encoding. Returns (body, Content-Encoding or None)."""
+    if len(body) < min_size:
+        return body, None
+    encoding = negotiate(accept_encoding, encodings)
+    if encoding is None:
+        return body, None
+    return compress(body, encoding, gzip_level, brotli_quality), encoding
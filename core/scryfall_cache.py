@@ -0,0 +1,91 @@
+# core/scryfall_cache.py
+"""Local cache of Scryfall card objects (scryfall_cache.db), keyed by Scryfall id.
+Card JSON fetched once is kept so repeated imports of the same printings never hit the API.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    set_code TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    number TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+-- Lookups are by id only; set/number resolution goes through the card index (card_index.lookup_by_set_number)
+DROP INDEX IF EXISTS idx_cards_set_number;
+"""
+
+# Bound on ids per IN (...) query, well under SQLite's variable limit
+_CHUNK = 500
+
+_lock = threading.Lock()
+# cache path -> connection; only used under _lock
+_conns: Dict[str, sqlite3.Connection] = {}
+
+
+def _conn(path: Path) -> sqlite3.Connection:
+    """Open (once) the cache connection and create the schema. Call under _lock."""
+    key = str(Path(path).resolve())
+    conn = _conns.get(key)
+    if conn is None:
+        Path(key).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(key, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.executescript(SCHEMA)
+        _conns[key] = conn
+    return conn
+
+
+def get_many(path: Path, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Cached card objects for the given Scryfall ids, as { id: card }. Unknown ids are absent."""
+    ids = list(dict.fromkeys(str(i).lower() for i in ids if i))
+    out: Dict[str, Dict[str, Any]] = {}
+    if not ids:
+        return out
+    with _lock:
+        conn = _conn(path)
+        for i in range(0, len(ids), _CHUNK):
+            chunk = ids[i:i + _CHUNK]
+            marks = ", ".join("?" for _ in chunk)
+            for cid, data in conn.execute(f"SELECT id, data FROM cards WHERE id IN ({marks})", chunk):
+                try:
+                    out[cid] = json.loads(data)
+                except ValueError:
+                    continue
+    return out
+
+
+def put_many(path: Path, cards: Iterable[Dict[str, Any]]) -> int:
+    """Store Scryfall card objects (anything without an 'id' is skipped). Returns rows written."""
+    now = time.time()
+    rows = [
+        (str(c['id']).lower(), str(c.get('set') or ''), str(c.get('collector_number') or ''),
+         json.dumps(c, ensure_ascii=False, separators=(',', ':')), now)
+        for c in cards if isinstance(c, dict) and c.get('id')
+    ]
+    if not rows:
+        return 0
+    with _lock:
+        conn = _conn(path)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO cards(id, set_code, number, data, fetched_at) VALUES (?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def close_caches() -> None:
+    with _lock:
+        conns = list(_conns.values())
+        _conns.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
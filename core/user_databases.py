@@ -0,0 +1,226 @@
+# core/user_databases.py
+"""Per-user collection databases: lazy provisioning from a schema-only template, an
+LRU of open stores with idle eviction and a file-descriptor budget, and an optional
+shared card catalog holding the card metadata for every user."""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, List, Iterator
+
+from core import collection_sql as csql
+
+# Each open SQLite connection in WAL mode holds the db, -wal and -shm files
+FDS_PER_CONNECTION = 3
+
+
+class UserDatabaseManager:
+    """Owns users/user_<id>_collection.db files.
+    New users get a copy of a schema-only template (built once, held in memory), so
+    provisioning is a single small file write. Opened stores are kept in an LRU: the least
+    recently used are closed when more than `max_open` are open, when their connections
+    would exceed `max_fds`, or after `idle_seconds` without use. Stores leased by a running
+    request (see lease) are never evicted; they become candidates once released.
+    With `catalog_path`, every user DB is backed by that shared catalog (see csql.use_catalog)
+    and stores only card identifiers and quantities.
+    """
+
+    def __init__(self, users_dir: Path | str = 'users', max_open: int = 64, max_fds: int = 512,
+                 idle_seconds: float = 600.0, catalog_path: Path | str | None = None):
+        self.users_dir = Path(users_dir)
+        self.catalog_path = Path(catalog_path) if catalog_path else None
+        self.max_open = max(1, int(max_open))
+        self.max_fds = max(FDS_PER_CONNECTION, int(max_fds))
+        self.idle_seconds = float(idle_seconds)
+        self._lock = threading.Lock()
+        self._open: OrderedDict = OrderedDict()  # user key -> (path, last used monotonic time)
+        self._leases: Dict[str, int] = {}  # user key -> requests currently using the store
+        self._template: bytes | None = None
+        self._last_idle_sweep = time.monotonic()
+        self._stats = {'hits': 0, 'misses': 0, 'provisioned': 0, 'evicted_lru': 0, 'evicted_idle': 0}
+
+    def path_for(self, user_id: int | str) -> Path:
+        return self.users_dir / f"user_{user_id}_collection.db"
+
+    # -------------------- Provisioning --------------------
+
+    def _template_bytes(self) -> bytes:
+        """A fully migrated, empty collection DB, built on first use."""
+        if self._template is None:
+            self.users_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.users_dir / f".template_{os.getpid()}_{threading.get_ident()}.db"
+            try:
+                conn = sqlite3.connect(str(tmp))
+                try:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    csql.migrate(conn)
+                finally:
+                    conn.close()
+                self._template = tmp.read_bytes()
+            finally:
+                for suffix in ('', '-wal', '-shm'):
+                    try:
+                        os.remove(str(tmp) + suffix)
+                    except OSError:
+                        pass
+        return self._template
+
+    def provision(self, user_id: int | str) -> bool:
+        """Create the user's DB from the template if it does not exist. Returns True if created."""
+        path = self.path_for(user_id)
+        if path.exists():
+            return False
+        data = self._template_bytes()
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        try:
+            # Another request may have provisioned the same user meanwhile; keep theirs
+            os.link(tmp, path)
+        except FileExistsError:
+            return False
+        finally:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        with self._lock:
+            self._stats['provisioned'] += 1
+        return True
+
+    # -------------------- Store cache --------------------
+
+    def db_path(self, user_id: int | str) -> Path:
+        """Path of the user's DB, provisioned if needed and marked most recently used.
+        Pass it to collection_sql functions; they reuse the cached store.
+        """
+        key = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is not None:
+                self._open.move_to_end(key)
+                self._open[key] = (entry[0], now)
+                self._stats['hits'] += 1
+                path = entry[0]
+            else:
+                self._stats['misses'] += 1
+                path = None
+        if path is None:
+            self.provision(user_id)
+            path = self.path_for(user_id)
+            if self.catalog_path is not None:
+                csql.use_catalog(path, self.catalog_path)
+            with self._lock:
+                self._open[key] = (path, now)
+                self._open.move_to_end(key)
+            self._enforce_limits()
+        if now - self._last_idle_sweep > min(self.idle_seconds, 60.0):
+            self.evict_idle()
+        return path
+
+    @contextmanager
+    def lease(self, user_id: int | str) -> Iterator[Path]:
+        """Yield db_path(user_id) and keep the user's store open until the block exits:
+        eviction skips leased stores, so no other thread closes it mid-request.
+        """
+        key = str(user_id)
+        with self._lock:
+            self._leases[key] = self._leases.get(key, 0) + 1
+        try:
+            yield self.db_path(user_id)
+        finally:
+            with self._lock:
+                left = self._leases[key] - 1
+                if left:
+                    self._leases[key] = left
+                else:
+                    del self._leases[key]
+                entry = self._open.get(key)
+                if entry is not None:
+                    # Idle time counts from the end of the last request
+                    self._open.move_to_end(key)
+                    self._open[key] = (entry[0], time.monotonic())
+
+    def store(self, user_id: int | str) -> csql.CollectionStore:
+        """The user's store. Unless used inside lease(), it may be evicted and closed at any time."""
+        return csql.get_store(self.db_path(user_id))
+
+    def _open_fds(self) -> int:
+        total = 0
+        for path, _used in list(self._open.values()):
+            total += max(1, csql.get_store(path).connection_count()) * FDS_PER_CONNECTION
+        return total
+
+    def _over_limits(self) -> bool:
+        return len(self._open) > 1 and (len(self._open) > self.max_open or self._open_fds() > self.max_fds)
+
+    def _enforce_limits(self) -> None:
+        # Stores are closed under the lock, so a concurrent lease either sees the entry (and the
+        # store stays open) or misses it and reopens a fresh store once this one is closed
+        with self._lock:
+            for key in list(self._open):  # LRU first
+                if not self._over_limits():
+                    break
+                if self._leases.get(key):
+                    continue
+                path, _used = self._open.pop(key)
+                csql.release_store(path)
+                self._stats['evicted_lru'] += 1
+
+    def evict_idle(self) -> int:
+        """Close stores unused for idle_seconds. Returns how many were closed."""
+        cutoff = time.monotonic() - self.idle_seconds
+        closed = 0
+        with self._lock:
+            self._last_idle_sweep = time.monotonic()
+            for key, (path, used) in list(self._open.items()):
+                if self._leases.get(key) or used >= cutoff:
+                    continue
+                del self._open[key]
+                csql.release_store(path)
+                closed += 1
+            self._stats['evicted_idle'] += closed
+        return closed
+
+    def offload_all(self) -> Dict[str, Any]:
+        """Move card metadata from every existing user DB into the catalog (see
+        csql.offload_to_catalog). Returns { databases, moved, bytes_before, bytes_after }.
+        """
+        if self.catalog_path is None:
+            raise ValueError('no catalog configured')
+        out = {'databases': 0, 'moved': 0, 'bytes_before': 0, 'bytes_after': 0}
+        for path in sorted(self.users_dir.glob('user_*_collection.db')):
+            user_id = path.name[len('user_'):-len('_collection.db')]
+            out['bytes_before'] += path.stat().st_size
+            with self.lease(user_id) as db:
+                res = csql.offload_to_catalog(db)
+            out['databases'] += 1
+            out['moved'] += res['moved']
+            out['bytes_after'] += path.stat().st_size
+        return out
+
+    def open_paths(self) -> List[Path]:
+        """Paths of the user DBs currently held open."""
+        with self._lock:
+            return [path for path, _used in self._open.values()]
+
+    def close_all(self) -> None:
+        with self._lock:
+            victims = [path for path, _used in self._open.values()]
+            self._open.clear()
+        for path in victims:
+            csql.release_store(path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+            st['open'] = len(self._open)
+            st['leased'] = len(self._leases)
+            st['open_fds'] = self._open_fds()
+        lookups = st['hits'] + st['misses']
+        st['hit_rate'] = round(st['hits'] / lookups, 4) if lookups else 0.0
+        return st
@@ -1,14 +1,22 @@
 """Application entry point - Flask web server."""
+import hashlib
+import json
 import os
-from flask import Flask, send_from_directory, jsonify, request, session
+from flask import Flask, Response, send_from_directory, jsonify, request, session, stream_with_context
 from werkzeug.utils import secure_filename
 from backend import Api
+from core import response_encoding
 from core.user_auth import UserAuth
 
 app = Flask(__name__, static_folder='web', static_url_path='')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', os.urandom(24).hex())  # For sessions
+# API response compression: encodings in preference order ('' disables), smallest body to compress, levels
+app.config['API_COMPRESS_ENCODINGS'] = tuple(e.strip() for e in os.environ.get('API_COMPRESS_ENCODINGS', 'br,gzip').split(',') if e.strip())
+app.config['API_COMPRESS_MIN_SIZE'] = int(os.environ.get('API_COMPRESS_MIN_SIZE', response_encoding.DEFAULT_MIN_SIZE))
+app.config['API_GZIP_LEVEL'] = int(os.environ.get('API_GZIP_LEVEL', response_encoding.DEFAULT_GZIP_LEVEL))
+app.config['API_BROTLI_QUALITY'] = int(os.environ.get('API_BROTLI_QUALITY', response_encoding.DEFAULT_BROTLI_QUALITY))
 api = Api()
 user_auth = UserAuth()
 
@@ -110,6 +118,60 @@ def upload_csv():
     
     return jsonify({'error': 'Invalid file type'}), 400
 
+# Streaming collection export (chunked; constant memory for any collection size)
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+@app.route('/api/export/collection.<fmt>', methods=['GET'])
+def export_collection(fmt):
+    """Stream the collection as NDJSON or CSV. Query args: name_prefix, set, source, cmc_min, cmc_max,
+    colors and types (comma-separated)."""
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': f'Unsupported export format: {fmt}'}), 404
+    filters = {k: request.args[k] for k in ('name_prefix', 'set', 'source', 'cmc_min', 'cmc_max') if request.args.get(k)}
+    for k in ('colors', 'types'):
+        if request.args.get(k):
+            filters[k] = [v.strip() for v in request.args[k].split(',') if v.strip()]
+    try:
+        chunks = api.export_collection_chunks(fmt, filters)
+        first = next(chunks, '')  # surface bad filters as a 400 before streaming starts
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        yield first
+        yield from chunks
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename=collection.{fmt}', 'X-Accel-Buffering': 'no'},
+    )
+
+def _api_etag(method_name, params, user_id):
+    """ETag for a versioned read: the method, its arguments, the user and the data version."""
+    # Per-user reads may name another user explicitly; version the data actually read
+    version = api.version_token(method_name, (params or {}).get('user_id', user_id))
+    if version is None:
+        return None
+    raw = json.dumps([method_name, params, user_id, version], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _api_response(result, status=200):
+    """JSON response serialized with the fastest available encoder and compressed per Accept-Encoding."""
+    body, encoding = response_encoding.encode(
+        response_encoding.dumps(result),
+        request.headers.get('Accept-Encoding', ''),
+        encodings=app.config['API_COMPRESS_ENCODINGS'],
+        min_size=app.config['API_COMPRESS_MIN_SIZE'],
+        gzip_level=app.config['API_GZIP_LEVEL'],
+        brotli_quality=app.config['API_BROTLI_QUALITY'],
+    )
+    response = Response(body, status=status, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 # API routes - convert all Api methods to Flask endpoints
 @app.route('/api/<method_name>', methods=['GET', 'POST'])
 def api_proxy(method_name):
@@ -135,14 +197,32 @@ def api_proxy(method_name):
     if user_id:
         api._current_user_id = user_id
     
+    method = getattr(api, method_name, None)
+    if method_name.startswith('_') or not callable(method):
+        return jsonify({'error': f'Unknown API method: {method_name}'}), 404
+    if request.method == 'POST':
+        params = request.get_json(silent=True) or {}
+    else:
+        params = request.args.to_dict()
+    
     try:
-        # Call the method with parameters
-        if params:
-            result = method(**params)
+        # Unchanged data: answer 304 from the version token without running the query
+        etag = _api_etag(method_name, params, user_id) if request.method == 'GET' else None
+        if etag and request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
         else:
-            result = method()
-        
-        return jsonify(result)
+            # Call the method with parameters
+            if params:
+                result = method(**params)
+            else:
+                result = method()
+            response = _api_response(result)
+        if etag:
+            # Weak: the gzip, brotli and identity bodies are the same data under one tag
+            response.set_etag(etag, weak=True)
+            # Let browsers keep the body but revalidate on every use
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
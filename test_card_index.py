@@ -0,0 +1,84 @@
+"""Set/number resolution in the AllPrintings card index (core.card_index).
+Run: python test_card_index.py
+"""
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from core import card_index
+
+# Index layout before idx_cards_set_number existed
+OLD_SCHEMA = """
+CREATE TABLE cards (name TEXT, "set" TEXT, number TEXT, colors TEXT, types TEXT, cmc REAL,
+                    power TEXT, toughness TEXT, text TEXT);
+CREATE INDEX idx_cards_name ON cards(name);
+"""
+
+SETS = 20
+PER_SET = 60
+
+
+def _old_index(path: Path) -> None:
+    conn = sqlite3.connect(str(path))
+    conn.executescript(OLD_SCHEMA)
+    conn.executemany(
+        'INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(f'Card {s}-{n}', f'S{s:02d}', str(n), 'G', 'Creature', n % 7, '1', '1', '')
+         for s in range(SETS) for n in range(PER_SET)])
+    # Second face of a printing shares its set and number
+    conn.execute("INSERT INTO cards VALUES ('Back 00-1', 'S00', '1', '', '', 0, '', '', '')")
+    conn.commit()
+    conn.close()
+
+
+def _wanted():
+    # More pairs than one query chunk, in mixed case, with repeats and misses
+    pairs = [(f's{s:02d}' if s % 2 else f'S{s:02d}', str(n)) for s in range(SETS) for n in range(PER_SET)]
+    return pairs + [('s00', '1'), ('S00', '1'), ('zzz', '1'), ('S01', '999'), ('', '3'), ('S01', '')]
+
+
+def _check(hits: dict) -> None:
+    assert len(hits) == SETS * PER_SET, len(hits)
+    assert hits[('s00', '1')]['name'] == 'Card 0-1', hits[('s00', '1')]
+    hit = hits[('s13', '42')]
+    assert (hit['name'], hit['set'], hit['number'], hit['types'], hit['cmc']) == ('Card 13-42', 'S13', '42', ['Creature'], 0.0)
+    assert ('zzz', '1') not in hits and ('s01', '999') not in hits
+
+
+def test_lookup_by_set_number(tmp_path: Path) -> None:
+    path = tmp_path / 'index.db'
+    _old_index(path)
+    # Read-only open of an old index: no set/number index, still resolved (by a scan)
+    ro = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        _check(card_index.lookup_by_set_number(ro, _wanted()))
+    finally:
+        ro.close()
+    # A writable open adds the index, and lookups go through it
+    conn = card_index.open_db(path)
+    try:
+        plan = ' '.join(str(r) for r in conn.execute(
+            'EXPLAIN QUERY PLAN WITH wanted(set_code, number) AS (VALUES (?, ?))'
+            ' SELECT c.name FROM wanted w JOIN cards c ON c."set" = w.set_code COLLATE NOCASE AND c.number = w.number',
+            ('s01', '1')))
+        assert 'idx_cards_set_number' in plan, plan
+        _check(card_index.lookup_by_set_number(conn, _wanted()))
+        assert card_index.lookup_by_set_number(conn, []) == {}
+    finally:
+        conn.close()
+    # Opening again is a no-op
+    card_index.open_db(path).close()
+
+
+TESTS = [
+    test_lookup_by_set_number,
+]
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as td:
+        for i, test in enumerate(TESTS):
+            tmp = Path(td) / str(i)
+            tmp.mkdir()
+            test(tmp)
+            print(f"{test.__name__}: ok")
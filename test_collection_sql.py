@@ -0,0 +1,131 @@
+"""Behaviour checks for core.collection_sql against throwaway DBs.
+Run: python test_collection_sql.py
+"""
+import tempfile
+import threading
+from pathlib import Path
+
+from core import collection_sql as csql
+
+
+def _cards(n: int, **extra):
+    return [dict({'name': f'Card {i}', 'set': 'abc', 'number': str(i), 'types': ['Creature'], 'cmc': i % 5,
+                  'quantity': 1 + i % 3}, **extra) for i in range(n)]
+
+
+def test_list_collection_totals(tmp_path: Path) -> None:
+    path = tmp_path / 'totals.db'
+    csql.insert_stream(path, _cards(30))
+    copies = sum(1 + i % 3 for i in range(30))
+    # Unfiltered: totals come from the trigger-maintained collection_totals row
+    page = csql.list_collection(path, limit=10)
+    assert (page['total'], page['total_copies']) == (30, copies), page
+    assert len(page['items']) == 10 and page['next_cursor']
+    # Later pages carry no totals
+    nxt = csql.list_collection(path, after_cursor=page['next_cursor'], limit=10)
+    assert nxt['total'] is None and nxt['items'][0]['id'] > page['items'][-1]['id']
+    # Filtered: counting is opt-in
+    filters = {'cmc_min': 3}
+    page = csql.list_collection(path, filters=filters, limit=5)
+    assert page['total'] is None and page['total_copies'] is None, page
+    page = csql.list_collection(path, filters=filters, limit=5, with_total=True)
+    expected = [i for i in range(30) if i % 5 >= 3]
+    assert page['total'] == len(expected) and page['total_copies'] == sum(1 + i % 3 for i in expected), page
+    csql.release_store(path)
+
+
+def test_summary_order_and_cmc(tmp_path: Path) -> None:
+    path = tmp_path / 'summary.db'
+    csql.insert_stream(path, [
+        {'name': 'beta', 'set': 'x', 'number': '1', 'cmc': 2, 'quantity': 10},
+        {'name': 'Beta', 'set': 'y', 'number': '1', 'cmc': 4, 'quantity': 1},
+        {'name': 'alpha', 'cmc': 1},
+        {'name': 'Gamma', 'cmc': None},
+        {'name': 'Delta', 'cmc': 3, 'quantity': 4},
+    ])
+    summary = csql.get_collection_summary(path)
+    # Case-insensitive name order, one entry per name
+    assert [s['name'].lower() for s in summary] == ['alpha', 'beta', 'delta', 'gamma'], summary
+    by_name = {s['name'].lower(): s for s in summary}
+    # Average per row, not per copy: (2 + 4) / 2, not (2 * 10 + 4) / 11
+    assert by_name['beta']['cmc'] == 3.0 and by_name['beta']['qty'] == 11
+    assert by_name['delta']['cmc'] == 3.0
+    assert by_name['gamma']['cmc'] is None
+    # Still per row after a quantity-only change
+    conn = csql.get_store(path).conn
+    rid = conn.execute("SELECT id FROM collection WHERE name = 'Beta'").fetchone()[0]
+    csql.execute_write(path, "UPDATE collection SET quantity = 50 WHERE id = ?", (rid,))
+    by_name = {s['name'].lower(): s for s in csql.get_collection_summary(path)}
+    assert by_name['beta']['cmc'] == 3.0 and by_name['beta']['qty'] == 60
+    csql.release_store(path)
+
+
+def test_add_name(tmp_path: Path) -> None:
+    path = tmp_path / 'names.db'
+    csql.insert_stream(path, [{'name': 'Island', 'set': 'c21', 'number': '1', 'quantity': 3}])
+    assert csql.add_name(path, 'Sol Ring', source='manual') is True
+    # Already held, by name in any case and any printing
+    assert csql.add_name(path, 'sol ring') is False
+    assert csql.add_name(path, ' ISLAND ') is False
+    assert csql.add_name(path, '  ') is False
+    # The name list is read from the same table add_name checks
+    assert csql.card_names(path) == ['Island', 'Sol Ring']
+    assert csql.count_items(path) == 4
+    csql.release_store(path)
+
+
+def test_writer_batch_rollback(tmp_path: Path) -> None:
+    path = tmp_path / 'writer.db'
+    csql.ensure_db(path)
+    writer = csql.get_store(path).writer
+    gate = threading.Event()
+
+    def insert(name, fail=False, nested=False):
+        def job(conn):
+            conn.execute("INSERT INTO collection (name) VALUES (?)", (name,))
+            if nested:
+                # Runs inline on the writer thread, inside this job's savepoint
+                csql.add_item(path, f'{name} nested', 1)
+            if fail:
+                raise RuntimeError(f'{name} failed')
+            return name
+        return job
+
+    # Hold the writer on one job so the next ones queue up and commit as one batch
+    blocker = writer.submit(lambda conn: gate.wait(10))
+    futures = [
+        writer.submit(insert('Alpha')),
+        writer.submit(insert('Bravo', fail=True, nested=True)),
+        writer.submit(insert('Charlie', nested=True)),
+    ]
+    gate.set()
+    blocker.result(10)
+    assert futures[0].result(10) == 'Alpha' and futures[2].result(10) == 'Charlie'
+    try:
+        futures[1].result(10)
+        raise AssertionError('failed job reported success')
+    except RuntimeError as e:
+        assert 'Bravo' in str(e)
+    assert writer.metrics()['max_batch'] >= 3, writer.metrics()
+    # The failed job's rows, nested write included, rolled back; its batch-mates committed
+    assert csql.card_names(path) == ['Alpha', 'Charlie', 'Charlie nested'], csql.card_names(path)
+    assert csql.check_counters(path)['ok']
+    csql.release_store(path)
+
+
+TESTS = [
+    test_list_collection_totals,
+    test_summary_order_and_cmc,
+    test_add_name,
+    test_writer_batch_rollback,
+]
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as td:
+        for i, test in enumerate(TESTS):
+            tmp = Path(td) / str(i)
+            tmp.mkdir()
+            test(tmp)
+            print(f"{test.__name__}: ok")
+        csql.close_stores()
@@ -0,0 +1,242 @@
+"""Upgrade collection DBs left by older releases to the current schema.
+Fixtures are generated in a temp dir: an unversioned DB in the oldest known layout (one row per
+copy, no deck metadata), and DBs stopped at every user_version from 1 to SCHEMA_VERSION - 1.
+Run: python test_migrations.py
+"""
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+from core import collection_sql as csql
+
+# Layout of collection.db before schema versioning: no back faces, repair flag or deck metadata
+LEGACY_SCHEMA = """
+CREATE TABLE collection (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    set_code TEXT NOT NULL DEFAULT '',
+    number TEXT NOT NULL DEFAULT '',
+    colors TEXT NOT NULL DEFAULT '[]',
+    types TEXT NOT NULL DEFAULT '[]',
+    cmc REAL,
+    power TEXT,
+    toughness TEXT,
+    text TEXT,
+    image_path TEXT,
+    image_url TEXT,
+    source TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_collection_name ON collection(name);
+CREATE TABLE decks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE deck_cards (
+    deck_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 1
+);
+"""
+
+# Copies as older releases stored them: one row per physical card
+COPIES = [
+    ('Island', 'c21', '1', '[]', '["Land"]', 0),
+    ('Island', 'c21', '1', '[]', '["Land"]', 0),
+    ('island', 'C21', '1', '[]', '["Land"]', 0),
+    ('Sol Ring', 'c21', '263', '[]', '["Artifact"]', 1),
+    ('Sol Ring', 'c21', '263', '[]', '["Artifact"]', 1),
+    ('Llanowar Elves', 'm19', '314', '["G"]', '["Creature"]', 1),
+]
+# name (lower case) -> copies expected after the upgrade
+EXPECTED = {'island': 3, 'sol ring': 2, 'llanowar elves': 1}
+DECK = ('Ramp', [('Sol Ring', 1), ('Llanowar Elves', 1), ('Island', 2)])
+
+
+def _objects(conn: sqlite3.Connection) -> set:
+    return set(conn.execute(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'index', 'trigger') AND name NOT LIKE 'sqlite_%'"
+    ).fetchall())
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _fill(conn: sqlite3.Connection) -> None:
+    """Write the COPIES and DECK fixture data in whatever layout the DB currently has."""
+    has_quantity = 'quantity' in _columns(conn, 'collection')
+    if has_quantity:
+        merged = {}
+        for name, sc, no, colors, types, cmc in COPIES:
+            key = (name.lower(), sc.lower(), no)
+            if key in merged:
+                merged[key][-1] += 1
+            else:
+                merged[key] = [name, sc, no, colors, types, cmc, 1]
+        conn.executemany(
+            "INSERT INTO collection(name, set_code, number, colors, types, cmc, quantity) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [tuple(v) for v in merged.values()])
+    else:
+        conn.executemany(
+            "INSERT INTO collection(name, set_code, number, colors, types, cmc) VALUES (?, ?, ?, ?, ?, ?)", COPIES)
+    deck_id = conn.execute("INSERT INTO decks(name) VALUES (?)", (DECK[0],)).lastrowid
+    conn.executemany("INSERT INTO deck_cards(deck_id, name, count) VALUES (?, ?, ?)",
+                     [(deck_id, n, c) for n, c in DECK[1]])
+    conn.commit()
+
+
+def _check(path: Path, reference: set) -> None:
+    conn = sqlite3.connect(str(path))
+    try:
+        assert csql.migrate(conn) == csql.SCHEMA_VERSION
+        assert csql.get_schema_version(conn) == csql.SCHEMA_VERSION
+        # Same tables, indexes and triggers as a DB created at the current version
+        objects = _objects(conn)
+        assert objects == reference, f"missing {reference - objects}, unexpected {objects - reference}"
+        for col in ('quantity', 'condition', 'repaired', 'scryfall_id', 'oracle_text', 'back_name', 'user_id'):
+            assert col in _columns(conn, 'collection'), col
+        for col in ('deck_type', 'deck_colors', 'commander', 'user_id'):
+            assert col in _columns(conn, 'decks'), col
+        # Duplicate copies collapsed into one holding per printing, quantities summed
+        rows = conn.execute("SELECT lower(name), COUNT(*), SUM(quantity) FROM collection GROUP BY lower(name)").fetchall()
+        assert {n: q for n, _c, q in rows} == EXPECTED, rows
+        assert all(c == 1 for _n, c, _q in rows), rows
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+    finally:
+        conn.close()
+    # Trigger-maintained summary, usage and totals match a recount of the migrated data
+    counters = csql.check_counters(path)
+    assert counters['ok'], counters
+    summary = {s['name'].lower(): s for s in csql.get_collection_summary(path)}
+    assert {n: s['qty'] for n, s in summary.items()} == EXPECTED, summary
+    csql.release_store(path)
+
+
+def _reference(tmp_path: Path) -> set:
+    ref_conn = sqlite3.connect(str(tmp_path / 'reference.db'))
+    csql.migrate(ref_conn)
+    reference = _objects(ref_conn)
+    ref_conn.close()
+    return reference
+
+
+def test_migrations(tmp_path: Path) -> None:
+    reference = _reference(tmp_path)
+
+    # Unversioned DB from before migrations existed
+    legacy = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(str(legacy))
+    conn.executescript(LEGACY_SCHEMA)
+    _fill(conn)
+    conn.close()
+    _check(legacy, reference)
+    print(f"user_version 0 (legacy layout) -> {csql.SCHEMA_VERSION}: ok")
+
+    # DBs as each intermediate release left them
+    for version in range(1, csql.SCHEMA_VERSION):
+        path = tmp_path / f'v{version}.db'
+        conn = sqlite3.connect(str(path))
+        assert csql.migrate(conn, target=version) == version
+        _fill(conn)
+        conn.close()
+        _check(path, reference)
+        print(f"user_version {version} -> {csql.SCHEMA_VERSION}: ok")
+
+
+def _snapshot(path: Path) -> tuple:
+    conn = sqlite3.connect(str(path))
+    try:
+        rows = conn.execute("SELECT * FROM collection ORDER BY id").fetchall()
+        return csql.get_schema_version(conn), _objects(conn), rows
+    finally:
+        conn.close()
+
+
+def _fail_during(version: int, tmp_path: Path, reference: set) -> None:
+    """Make migration `version` -> version + 1 fail after all of its statements ran, then check
+    the DB is untouched and a retry succeeds.
+    """
+    path = tmp_path / f'fail_v{version}.db'
+    conn = sqlite3.connect(str(path))
+    csql.migrate(conn, target=version)
+    _fill(conn)
+    conn.close()
+    before = _snapshot(path)
+
+    original = csql.MIGRATIONS[version]
+
+    def boom(conn):
+        original(conn)
+        raise RuntimeError('injected failure')
+
+    csql.MIGRATIONS[version] = boom
+    try:
+        conn = sqlite3.connect(str(path))
+        try:
+            csql.migrate(conn)
+            raise AssertionError('migration should have failed')
+        except RuntimeError as e:
+            assert 'injected failure' in str(e)
+        finally:
+            conn.close()
+    finally:
+        csql.MIGRATIONS[version] = original
+    # Nothing of the failed migration is left behind
+    assert _snapshot(path) == before, f'failed migration {version + 1} left changes behind'
+    _check(path, reference)
+
+
+def test_failed_migration_rolls_back(tmp_path: Path) -> None:
+    reference = _reference(tmp_path)
+    # Every migration is atomic: DDL included (8 and 9 create tables and triggers)
+    for version in range(1, csql.SCHEMA_VERSION):
+        _fail_during(version, tmp_path, reference)
+        print(f"failure in migration {version + 1} rolled back, retry ok")
+
+
+def test_concurrent_migrations(tmp_path: Path) -> None:
+    reference = _reference(tmp_path)
+    for version in (0, csql.SCHEMA_VERSION - 1):
+        path = tmp_path / f'concurrent_v{version}.db'
+        conn = sqlite3.connect(str(path))
+        if version:
+            csql.migrate(conn, target=version)
+        else:
+            conn.executescript(LEGACY_SCHEMA)
+        _fill(conn)
+        conn.close()
+        # Several processes' worth of connections upgrading the same file at once
+        barrier = threading.Barrier(6)
+        results, errors = [], []
+
+        def upgrade():
+            c = sqlite3.connect(str(path), timeout=30)
+            try:
+                barrier.wait()
+                results.append(csql.migrate(c))
+            except Exception as e:
+                errors.append(repr(e))
+            finally:
+                c.close()
+
+        threads = [threading.Thread(target=upgrade) for _ in range(barrier.parties)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert results == [csql.SCHEMA_VERSION] * barrier.parties, results
+        _check(path, reference)
+        print(f"concurrent upgrades from user_version {version}: ok")
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as td:
+        test_migrations(Path(td))
+        for test in (test_failed_migration_rolls_back, test_concurrent_migrations):
+            (Path(td) / test.__name__).mkdir()
+            test(Path(td) / test.__name__)
+        csql.close_stores()
@@ -0,0 +1,164 @@
+"""Per-user DB manager under concurrent use: leased stores survive eviction pressure and
+every DB keeps a single writer.
+Run: python test_user_databases.py
+"""
+import random
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+from core import card_catalog
+from core import collection_sql as csql
+from core.user_databases import UserDatabaseManager
+
+USERS = 6
+THREADS = 8
+ROUNDS = 40
+
+
+def _writer_threads() -> list:
+    return [t.name for t in threading.enumerate() if t.name.startswith('csql-writer:')]
+
+
+def test_eviction_under_load(tmp_path: Path) -> None:
+    # Room for two open stores: nearly every lease of another user evicts someone
+    mgr = UserDatabaseManager(tmp_path / 'users', max_open=2, idle_seconds=0.0)
+    errors, added = [], [0] * USERS
+    added_lock = threading.Lock()
+    stop = threading.Event()
+    duplicate_writers = []
+
+    def watch():
+        while not stop.is_set():
+            names = _writer_threads()
+            if len(names) != len(set(names)):
+                duplicate_writers.append(names)
+
+    def work(seed):
+        rng = random.Random(seed)
+        for _ in range(ROUNDS):
+            uid = rng.randrange(USERS)
+            try:
+                with mgr.lease(uid) as path:
+                    csql.add_item(path, f'Card {uid}', 1)
+                    with added_lock:
+                        added[uid] += 1
+                    csql.count_items(path)
+                    csql.list_collection(path, limit=5)
+                # Idle sweep runs on every lookup: evicts whatever is not leased
+                mgr.evict_idle()
+            except Exception as e:
+                errors.append(repr(e))
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(THREADS)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    stop.set()
+    watcher.join()
+
+    assert not errors, errors[:5]
+    assert not duplicate_writers, duplicate_writers[:3]
+    st = mgr.stats()
+    assert st['evicted_lru'] + st['evicted_idle'] > 0, st
+    assert st['leased'] == 0, st
+    # No write was lost to a store closed under it
+    for uid in range(USERS):
+        with mgr.lease(uid) as path:
+            assert csql.count_items(path) == added[uid], (uid, added[uid])
+    mgr.close_all()
+
+
+def test_closed_store_is_retired(tmp_path: Path) -> None:
+    path = tmp_path / 'retired.db'
+    store = csql.get_store(path)
+    csql.add_item(path, 'Island', 2)
+    csql.release_store(path)
+    # A stale reference neither reconnects nor starts a second writer
+    for use in (lambda: store.conn, lambda: store.write(lambda conn: None)):
+        try:
+            use()
+            raise AssertionError('closed store was used')
+        except sqlite3.ProgrammingError:
+            pass
+    assert not [n for n in _writer_threads() if n == f'csql-writer:{path.name}']
+    # The registry hands out a fresh store
+    assert csql.get_store(path) is not store and csql.count_items(path) == 2
+    csql.release_store(path)
+
+
+def _card(name: str, number: str, **extra) -> dict:
+    return dict({'name': name, 'set': 'abc', 'number': number, 'types': ['Creature'], 'cmc': 2}, **extra)
+
+
+def test_catalog_token(tmp_path: Path) -> None:
+    mgr = UserDatabaseManager(tmp_path / 'users', catalog_path=tmp_path / 'card_catalog.db')
+
+    def token(uid):
+        # The per-user part of Api.version_token
+        with mgr.lease(uid) as path:
+            return csql.change_token(path), csql.catalog_token(path)
+
+    with mgr.lease('a') as path:
+        csql.insert_stream(path, [_card('Bear', '1'), _card('Wolf', '2')])
+    before = token('a')
+    assert token('a') == before
+    # Another user's import of new printings, and of a printing A holds with nothing new to add
+    with mgr.lease('b') as path:
+        csql.insert_stream(path, [_card('Elk', '3'), _card('Bear', '1')])
+    assert token('a') == before, (token('a'), before)
+    # A field A's printing was missing is filled in: what A reads changed
+    with mgr.lease('b') as path:
+        csql.insert_stream(path, [_card('Wolf', '2', text='Trample')])
+    after = token('a')
+    assert after[0] == before[0] and after[1] != before[1], (before, after)
+    with mgr.lease('a') as path:
+        assert [it['text'] for it in csql.load_all(path) if it['name'] == 'Wolf'] == ['Trample']
+        # A's own change moves the change-log part
+        csql.add_item(path, 'Bear', 1)
+    assert token('a')[0] != after[0]
+    mgr.close_all()
+    card_catalog.close_catalogs()
+
+
+def test_catalog_versioning_upgrade(tmp_path: Path) -> None:
+    path = tmp_path / 'card_catalog.db'
+    conn = sqlite3.connect(str(path))
+    # A catalog created before rows carried changed_seq
+    conn.executescript(card_catalog.CATALOG_SCHEMA.replace("    changed_seq INTEGER NOT NULL DEFAULT 0,\n", ""))
+    card_catalog._create_fts(conn)
+    conn.execute("INSERT INTO cards (name, set_code, number, types) VALUES ('Bear', 'abc', '1', '[\"Creature\"]')")
+    conn.commit()
+    conn.close()
+    card_catalog.ensure_catalog(path)
+    card_catalog.upsert_cards(path, [('Elk', 'abc', '3') + (None,) * len(card_catalog.CATALOG_COLUMNS)])
+    conn = sqlite3.connect(str(path))
+    try:
+        # Existing rows count as unchanged since seq 0; new ones are stamped
+        assert conn.execute("SELECT name, changed_seq FROM cards ORDER BY name").fetchall() == [('Bear', 0), ('Elk', 1)]
+        assert card_catalog.state(conn, 'main') == (1, 0)
+    finally:
+        conn.close()
+    card_catalog.close_catalogs()
+
+
+TESTS = [
+    test_eviction_under_load,
+    test_closed_store_is_retired,
+    test_catalog_token,
+    test_catalog_versioning_upgrade,
+]
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as td:
+        for i, test in enumerate(TESTS):
+            tmp = Path(td) / str(i)
+            tmp.mkdir()
+            test(tmp)
+            print(f"{test.__name__}: ok")
+        csql.close_stores()